@@ -0,0 +1,93 @@
+#Almacén de audios direccionado por contenido.
+#   - Cada audio se guarda como {clave}.mp3, siendo la clave el hash de (texto, voz, modelo, formato): el mismo texto con la
+#     misma voz nunca se sintetiza dos veces y dos peticiones simultáneas nunca se pisan el fichero.
+#   - Los documentos referencian sus audios con un alias propio ({documento}_{número}), que se enlaza con la clave en cuanto
+#     el audio está generado (el texto se redacta en segundo plano, así que la clave no se conoce al construir el HTML).
+
+#Se cargan las librerías:
+import os
+import re
+import hashlib
+import threading
+from pathlib import Path
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+AUDIOS_FOLDER_NAME = os.getenv("AUDIOS_FOLDER_NAME", "audios")
+#Origen absoluto del servicio, que se antepone a las URLs de los audios que se codifican en los QR:
+AUDIOS_URL_BASE = os.getenv("AUDIOS_URL_BASE", "http://127.0.0.1:8000")
+
+PATRON_CLAVE = re.compile(r"[0-9a-f]{64}")
+PATRON_ALIAS = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+#Se escribe un fichero de forma atómica (en un temporal que luego se mueve a su ruta final):
+def escribir(ruta, datos):
+    tmp = ruta.with_name(f"{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        if isinstance(datos, (bytes, bytearray)):
+            f.write(datos)
+        else:
+            for chunk in datos:
+                f.write(chunk)
+    os.replace(tmp, ruta)
+    return ruta
+
+class AlmacenAudios:
+
+    def __init__(self, voz, modelo, formato, carpeta=AUDIOS_FOLDER_NAME, url_base=AUDIOS_URL_BASE):
+        self.voz = voz
+        self.modelo = modelo
+        self.formato = formato
+        self.url_base = url_base.rstrip("/")
+        self.carpeta = Path(carpeta).resolve()
+        self.carpeta_alias = self.carpeta / "alias"
+        self.carpeta_alias.mkdir(parents=True, exist_ok=True)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def clave(self, texto):
+        return hashlib.sha256(f"{texto}\0{self.voz}\0{self.modelo}\0{self.formato}".encode("utf-8")).hexdigest()
+
+    def ruta(self, clave):
+        return self.carpeta / f"{clave}.mp3"
+
+    #Se obtiene la ruta del audio de un texto, sintetizándolo solo si no está ya en el almacén. Si se indica un alias, se enlaza con él.
+    #Devuelve (ruta, reutilizado):
+    def obtener(self, texto, sintetizar, alias=None):
+        clave = self.clave(texto)
+        ruta = self.ruta(clave)
+        with self._lock:
+            lock = self._locks.setdefault(clave, threading.Lock())
+        #Si dos trabajos piden el mismo texto a la vez, el segundo espera al primero en lugar de sintetizarlo de nuevo.
+        #El lock de la clave se elimina también si la síntesis falla:
+        try:
+            with lock:
+                reutilizado = ruta.exists()
+                if not reutilizado:
+                    escribir(ruta, sintetizar(texto))
+        finally:
+            with self._lock:
+                self._locks.pop(clave, None)
+        if alias is not None:
+            self.enlazar(alias, clave)
+        return ruta, reutilizado
+
+    #Se obtiene la URL absoluta del audio de un alias (la que se codifica en los QR):
+    def url(self, alias):
+        return f"{self.url_base}/audios/{alias}.mp3"
+
+    def enlazar(self, alias, clave):
+        if not PATRON_ALIAS.fullmatch(alias):
+            raise ValueError(f"Alias de audio no válido: {alias}")
+        escribir(self.carpeta_alias / f"{alias}.txt", clave.encode("ascii"))
+
+    #Se resuelve un identificador (clave o alias, con o sin extensión .mp3) a la ruta de su audio. Devuelve None si no existe:
+    def resolver(self, audio_id):
+        audio_id = audio_id[:-4] if audio_id.lower().endswith(".mp3") else audio_id
+        if PATRON_CLAVE.fullmatch(audio_id):
+            clave = audio_id
+        elif PATRON_ALIAS.fullmatch(audio_id) and (self.carpeta_alias / f"{audio_id}.txt").exists():
+            clave = (self.carpeta_alias / f"{audio_id}.txt").read_text(encoding="ascii").strip()
+        else:
+            return None
+        ruta = self.ruta(clave)
+        return ruta if ruta.exists() else None
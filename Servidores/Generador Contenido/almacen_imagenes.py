@@ -0,0 +1,56 @@
+#Almacén de imágenes (assets) direccionado por contenido.
+#Cada imagen generada se guarda una sola vez como {sha256}.png y los documentos la referencian por URL (/assets/{sha256}),
+#en lugar de incrustarla en base64 en el HTML. Como el contenido de un asset nunca cambia, se puede cachear indefinidamente.
+
+#Se cargan las librerías:
+import os
+import re
+import hashlib
+import threading
+from pathlib import Path
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+ASSETS_FOLDER_NAME = os.getenv("ASSETS_FOLDER_NAME", "assets")
+#Origen absoluto del servicio, que se antepone a las URLs de los assets en el HTML. Debe ser absoluto: la App abre los documentos
+#como ficheros estáticos (y se pueden descargar), así que una ruta relativa (/assets/...) no llegaría al servicio:
+ASSETS_URL_BASE = os.getenv("ASSETS_URL_BASE", "http://127.0.0.1:8000")
+
+PATRON_CLAVE = re.compile(r"[0-9a-f]{64}")
+
+class AlmacenImagenes:
+
+    def __init__(self, carpeta=ASSETS_FOLDER_NAME, url_base=ASSETS_URL_BASE):
+        self.carpeta = Path(carpeta).resolve()
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        self.url_base = url_base.rstrip("/")
+        if not self.url_base:
+            raise ValueError("ASSETS_URL_BASE no puede estar vacío: las imágenes de los documentos necesitan una URL absoluta.")
+
+    def ruta(self, clave):
+        return self.carpeta / f"{clave}.png"
+
+    #Se guarda una imagen PNG (si no estaba ya) y se devuelve su clave:
+    def guardar(self, datos):
+        clave = hashlib.sha256(datos).hexdigest()
+        ruta = self.ruta(clave)
+        if not ruta.exists():
+            tmp = ruta.with_name(f"{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(datos)
+            os.replace(tmp, ruta)
+        return clave
+
+    def url(self, clave):
+        return f"{self.url_base}/assets/{clave}"
+
+    #Se comprueba si la cabecera If-None-Match (lista de ETags separadas por comas, o "*") incluye el ETag de un asset:
+    @staticmethod
+    def coincide_etag(if_none_match, clave):
+        etags = [etag.strip() for etag in if_none_match.split(",")]
+        return "*" in etags or any(etag.removeprefix("W/") == f'"{clave}"' for etag in etags)
+
+    #Se resuelve una clave a la ruta de su imagen. Devuelve None si la clave no es válida o no existe:
+    def resolver(self, clave):
+        if not PATRON_CLAVE.fullmatch(clave):
+            return None
+        ruta = self.ruta(clave)
+        return ruta if ruta.exists() else None
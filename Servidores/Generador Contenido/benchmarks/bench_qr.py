@@ -0,0 +1,68 @@
+#Micro-benchmark de la generación de códigos QR (codigos_qr.py) frente a la implementación anterior (transparencia píxel a píxel).
+#Uso (desde la carpeta del servicio):
+#   python benchmarks/bench_qr.py
+#   python benchmarks/bench_qr.py --qrs 40 --repeticiones 20
+#Se simula un documento con --qrs códigos QR, cada uno apuntando a un audio distinto.
+
+#Se cargan las librerías:
+import sys
+import argparse
+import base64
+import statistics
+import time
+from io import BytesIO
+from pathlib import Path
+
+import qrcode
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from codigos_qr import generar_qr
+
+#Implementación anterior (copiada de main.py):
+def legacy_qr(url):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M,box_size=10,border=4,)
+    qr.add_data(url)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white").convert("RGBA")
+    pixels = img.getdata()
+    new_pixels = []
+    for r, g, b, a in pixels:
+        if (r, g, b) == (255, 255, 255):
+            new_pixels.append((255, 255, 255, 0))
+        else:
+            new_pixels.append((r, g, b, 255))
+    img.putdata(new_pixels)
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("utf-8")
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1000, resultado
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark de la generación de códigos QR.")
+    parser.add_argument("--qrs", default=20, type=int)
+    parser.add_argument("--repeticiones", default=5, type=int)
+    args = parser.parse_args()
+
+    urls = [f"http://127.0.0.1:8000/audios/1234567_{i + 1}.mp3" for i in range(args.qrs)]
+
+    casos = [
+        ("Anterior (píxel a píxel)", lambda: [legacy_qr(url) for url in urls]),
+        ("codigos_qr.py", lambda: [generar_qr(url) for url in urls]),
+    ]
+
+    print(f"{'Implementación':<30}{'QRs':>6}{'Tiempo (ms)':>14}{'Mejora':>12}")
+    ms_anterior, referencia = None, None
+    for nombre, funcion in casos:
+        ms, resultado = medir(funcion, args.repeticiones)
+        #Se comprueba que todas las implementaciones generan exactamente los mismos PNG:
+        if referencia is None:
+            ms_anterior, referencia = ms, resultado
+        assert resultado == referencia, f"{nombre} no genera los mismos QR que la implementación anterior"
+        print(f"{nombre:<30}{len(urls):>6}{ms:>14.2f}{ms_anterior/ms:>11.1f}x")
@@ -0,0 +1,25 @@
+#Generación de los códigos QR (PNG con fondo transparente, en base64) que enlazan con los audios de los documentos.
+#   - La transparencia se aplica sobre toda la imagen de una vez (con operaciones de Pillow implementadas en C) en lugar de
+#     recorrer los píxeles uno a uno en Python.
+#No se cachean: cada QR apunta al alias de un audio de un documento o batería de ejercicios concreto, así que su URL no se repite.
+#Este módulo está duplicado en cada generador porque cada servicio se construye con su propia carpeta como contexto de Docker.
+
+#Se cargan las librerías:
+import base64
+from io import BytesIO
+
+import qrcode
+from PIL import ImageChops
+
+#Se genera el QR que apunta a la URL indicada; los píxeles blancos pasan a ser transparentes y el resto, opacos:
+def generar_qr(url):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M,box_size=10,border=4,)
+    qr.add_data(url)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white").convert("RGBA")
+    r, g, b, _ = img.split()
+    minimo = ImageChops.darker(ImageChops.darker(r, g), b)
+    img.putalpha(minimo.point(lambda v: 0 if v == 255 else 255))
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("utf-8")
@@ -0,0 +1,97 @@
+#Contexto acotado de lo ya redactado, que se envía a Gemini al redactar cada página.
+#En lugar de reconstruir (y enviar) el texto completo de todas las páginas anteriores, se mantiene de forma incremental:
+#   - El texto completo de solo las últimas CONTEXTO_MAX_PAGINAS páginas de cada sección.
+#   - Un resumen breve (extractivo: las primeras frases de cada página) de las páginas anteriores de la sección que ya no se
+#     envían completas, de tamaño máximo acotado.
+#   - Un resumen de las últimas CONTEXTO_MAX_SECCIONES_ANTERIORES secciones anteriores, extraído de su contenido en el temario.
+#Así el tamaño del prompt no crece con el número de páginas del documento. Lo redactado que se envía depende solo de las páginas
+#anteriores de su propia sección, que el planificador redacta en orden: como las secciones se redactan en paralelo, incluir las
+#secciones que ya hubieran terminado haría que el mismo temario generase prompts (y contenidos) distintos en cada ejecución.
+#Por eso las secciones anteriores se resumen a partir del temario, que se conoce antes de empezar a redactar.
+
+#Se cargan las librerías:
+import os
+import re
+import threading
+from collections import deque
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+CONTEXTO_MAX_PAGINAS = int(os.getenv("CONTEXTO_MAX_PAGINAS", "2"))
+CONTEXTO_CARACTERES_RESUMEN_PAGINA = int(os.getenv("CONTEXTO_CARACTERES_RESUMEN_PAGINA", "300"))
+CONTEXTO_MAX_CARACTERES_RESUMEN = int(os.getenv("CONTEXTO_MAX_CARACTERES_RESUMEN", "1200"))
+CONTEXTO_MAX_SECCIONES_ANTERIORES = int(os.getenv("CONTEXTO_MAX_SECCIONES_ANTERIORES", "3"))
+CONTEXTO_CARACTERES_RESUMEN_SECCION = int(os.getenv("CONTEXTO_CARACTERES_RESUMEN_SECCION", "300"))
+
+#Se extraen las primeras frases de un texto sin superar max_caracteres (si la primera frase ya los supera, se corta):
+def resumir(texto, max_caracteres):
+    texto = " ".join(str(texto).split())
+    if len(texto) <= max_caracteres:
+        return texto
+    resumen = ""
+    for frase in re.split(r"(?<=[.!?])\s+", texto):
+        if len(resumen) + len(frase) + 1 > max_caracteres:
+            break
+        resumen = f"{resumen} {frase}".strip()
+    return resumen or texto[:max_caracteres].rstrip() + "…"
+
+class ContextoRedaccion:
+
+    #secciones es la lista ordenada del temario [((unidad, capítulo, sección), contenido), ...]:
+    def __init__(self, secciones=(), max_paginas=CONTEXTO_MAX_PAGINAS, max_secciones_anteriores=CONTEXTO_MAX_SECCIONES_ANTERIORES):
+        self.max_paginas = max_paginas
+        self.max_secciones_anteriores = max_secciones_anteriores
+        self._secciones = list(dict(secciones).items())
+        self._paginas = {}
+        self._resumenes = {}
+        self._lock = threading.Lock()
+
+    #Se añade una página redactada: se guarda su texto y, si con ello se descarta el de la página más antigua de la sección, esa
+    #página pasa al resumen (las páginas que se envían completas no se resumen):
+    def registrar(self, seccion, pagina, contenido):
+        with self._lock:
+            paginas = self._paginas.setdefault(seccion, deque(maxlen=max(self.max_paginas, 0)))
+            descartada = None
+            if paginas.maxlen == 0:
+                descartada = contenido
+            elif len(paginas) == paginas.maxlen:
+                descartada = paginas[0][1]
+            paginas.append((pagina, contenido))
+            resumen = self._resumenes.get(seccion, "")
+            if descartada is not None and len(resumen) < CONTEXTO_MAX_CARACTERES_RESUMEN:
+                resumen = f"{resumen} {resumir(descartada, CONTEXTO_CARACTERES_RESUMEN_PAGINA)}".strip()
+                self._resumenes[seccion] = resumir(resumen, CONTEXTO_MAX_CARACTERES_RESUMEN)
+        return contenido
+
+    #Se resumen, a partir del temario, las últimas secciones anteriores a una sección (vacío si es la primera):
+    def secciones_anteriores(self, seccion):
+        claves = [clave for clave, _ in self._secciones]
+        if seccion not in claves or self.max_secciones_anteriores <= 0:
+            return ""
+        posicion = claves.index(seccion)
+        contexto = ""
+        for (unidad, capitulo, nombre), contenido in self._secciones[max(posicion - self.max_secciones_anteriores, 0):posicion]:
+            contexto+= f"\n\t- Unidad: {unidad}"
+            contexto+= f"\n\t\t- Capitulo: {capitulo}"
+            contexto+= f"\n\t\t\t- Sección: {nombre}"
+            contexto+= f"\n\t\t\t\t- Resumen: {resumir(contenido, CONTEXTO_CARACTERES_RESUMEN_SECCION)}"
+        return contexto.strip("\n")
+
+    #Se construye el contexto de una página con lo redactado de su propia sección: el resumen de las páginas anteriores que ya no
+    #se envían completas (si las hay) y el texto completo de las últimas:
+    def texto(self, seccion):
+        with self._lock:
+            resumen_actual = self._resumenes.get(seccion, "")
+            paginas = list(self._paginas.get(seccion, []))
+
+        contexto = ""
+        if paginas:
+            unidad, capitulo, nombre = seccion
+            contexto+= f"\t- Unidad: {unidad}"
+            contexto+= f"\n\t\t- Capitulo: {capitulo}"
+            contexto+= f"\n\t\t\t- Sección: {nombre}"
+            if resumen_actual:
+                contexto+= f"\n\t\t\t\t- Resumen de las páginas anteriores: {resumen_actual}"
+            for pagina, contenido in paginas:
+                contexto+= f"\n\t\t\t\t- Página: {pagina}"
+                contexto+= f"\n\t\t\t\t- contenido: {contenido}"
+        return contexto.strip("\n")
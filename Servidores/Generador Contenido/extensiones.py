@@ -0,0 +1,184 @@
+#Estimación, mediante la IA, de la extensión (número de páginas) de las secciones del temario que el profesor no ha indicado.
+#   - Modo "lote" (por defecto): se estiman todas las secciones pendientes en una única llamada, con una respuesta estructurada
+#     (una lista de {fila, extension}). Las filas que falten o no sean válidas en la respuesta se estiman de forma individual.
+#   - Modo "individual": una llamada por sección, en paralelo (como máximo EXTENSIONES_MAX_CONCURRENCIA a la vez).
+
+#Se cargan las librerías:
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+EXTENSIONES_MODO = os.getenv("EXTENSIONES_MODO", "lote")
+EXTENSIONES_MAX_CONCURRENCIA = int(os.getenv("EXTENSIONES_MAX_CONCURRENCIA", "4"))
+EXTENSIONES_REINTENTOS = int(os.getenv("EXTENSIONES_REINTENTOS", "3"))
+
+MODEL = "gemini-2.5-flash"
+SAFETY_SETTINGS = [
+    types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
+    types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
+    types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
+    types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
+]
+
+#Se describe una sección del temario (con su contenido y, si se conoce, su extensión):
+def describir_seccion(rowi, con_extension=True):
+    texto = ""
+    texto += "\t-Unidad: " + str(rowi["Unidad"])
+    texto += "\n\t\t-Capítulo: " + str(rowi["Capítulo"])
+    texto += "\n\t\t-Sección: " + str(rowi["Sección"])
+    texto += "\n\t\t\t-Contenido: " + str(rowi["Contenido"])
+    if con_extension:
+        extension = "por determinar" if pd.isna(rowi["Extensión"]) else str(rowi["Extensión"])
+        texto += "\n\t\t\t-Extensión (Páginas): " + extension
+    return texto
+
+#Se valida una extensión devuelta por el modelo (número entero de páginas mayor que 0):
+def extension_valida(extension):
+    try:
+        extension = int(extension)
+    except (TypeError, ValueError):
+        return None
+    return extension if extension > 0 else None
+
+#Se estima en una única llamada la extensión de todas las filas pendientes. Devuelve {fila: extension} con las filas válidas:
+def estimar_en_lote(client, temario, pendientes, nivel_academico):
+    estructura = ""
+    for idx, rowi in temario.iterrows():
+        estructura += f"- Fila {idx}:\n" + describir_seccion(rowi) + "\n"
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text=f"Eres un editor de contenido formativo para alumnos de {nivel_academico}."),
+                types.Part.from_text(text="El contenido formativo se encuentra estructurado en unidades, capítulos y secciones."),
+                types.Part.from_text(text="Tu trabajo es indicarles a tus compañeros de edición el número de páginas que cada sección tendrá en base a su contenido."),
+                types.Part.from_text(text="El contenido formativo tiene la siguiente estructura (unidades, capítulos, sección y contenido) y extensiones (número de páginas), identificando cada sección por su número de fila:"),
+                types.Part.from_text(text=estructura),
+                types.Part.from_text(text="Tu tarea:"),
+                types.Part.from_text(text="Determina la extensión (número de páginas) de cada una de las secciones cuya extensión está por determinar, de forma coherente con el resto de secciones."),
+                types.Part.from_text(text="Importante:"),
+                types.Part.from_text(text=f"\tFormato de respuesta: Por favor, proporciona, para cada fila por determinar ({', '.join(str(idx) for idx in pendientes)}), solo su número de fila y el número de páginas que consideras debería tener dicha sección sabiendo que se trata de un documento educativo orientado a alumnos de {nivel_academico} pero que a la vez debe ser académico y formal."),
+            ]
+        )
+    ]
+
+    generate_content_config = types.GenerateContentConfig(
+        temperature = 1,
+        top_p = 0.95,
+        seed = 0,
+        max_output_tokens = 65535,
+        safety_settings = SAFETY_SETTINGS,
+        response_mime_type = "application/json",
+        response_schema = {"type":"OBJECT","properties":{"extensiones":{"type":"ARRAY","items":{"type":"OBJECT","properties":{"fila":{"type":"INTEGER","description":"Número de fila de la sección."},"extension":{"type":"INTEGER","description":"Número de páginas que debe tener la sección."}},"required":["fila","extension"]}}},"required":["extensiones"]},
+    )
+
+    response = client.models.generate_content(
+        model=MODEL,
+        contents=contents,
+        config=generate_content_config
+    )
+
+    output = json.loads(response.candidates[0].content.parts[0].text)
+    extensiones = {}
+    for item in output.get("extensiones") or []:
+        fila, extension = item.get("fila"), extension_valida(item.get("extension"))
+        if fila in pendientes and extension is not None:
+            extensiones[fila] = extension
+    return extensiones
+
+#Se estima la extensión de una sola sección, dada la estructura (y extensiones conocidas) de las secciones anteriores.
+#Si el modelo no devuelve una extensión válida se repite la llamada (como máximo reintentos veces) y, si no, se lanza un error:
+def estimar_seccion(client, rowi, previous_extensions, nivel_academico, reintentos=EXTENSIONES_REINTENTOS):
+
+    current_content = ""
+    current_content += "\t-Unidad: " + str(rowi["Unidad"])
+    current_content += "\n\t\t-Capítulo: " + str(rowi["Capítulo"])
+    current_content += "\n\t\t-Sección: " + str(rowi["Sección"])
+
+    parts=[
+        types.Part.from_text(text=f"Eres un editor de contenido formativo para alumnos de {nivel_academico}."),
+        types.Part.from_text(text="El contenido formativo se encuentra estructurado en unidades, capítulos y secciones."),
+        types.Part.from_text(text="Tu trabajo es ir sección por sección indicándoles a tus compañeros de edición el número de páginas que cada sección tendrá en base a su contenido."),
+    ]
+    if previous_extensions != "":
+        parts+=[
+            types.Part.from_text(text="Por el momento, el contenido formativo que se ha ido redactando tiene la siguiente estructura (unidades, capítulos, sección y contenido) y extensiones (número de páginas)"),
+            types.Part.from_text(text=previous_extensions),
+        ]
+    parts+=[
+        types.Part.from_text(text="La siguiente sobre la cual debes indicar la extensión (númeor de páginas) es la siguiente:"),
+        types.Part.from_text(text=current_content),
+        types.Part.from_text(text="La temática sobre la que tratará dicha sección es la siguiente:"),
+        types.Part.from_text(text=rowi["Contenido"]),
+        types.Part.from_text(text="Tu tarea:"),
+        types.Part.from_text(text="Determina la extensión de dicha sección (número de páginas)"),
+        types.Part.from_text(text="Importante:"),
+        types.Part.from_text(text=f"\tFormato de respuesta: Por favor, porciona solo el número de páginas que consideras debería tener dicha sección sabiendo que se trata de un documento educativo orientado a alumnos de {nivel_academico} pero que a la vez debe ser académico y formal."),
+    ]
+
+    generate_content_config = types.GenerateContentConfig(
+        temperature = 1,
+        top_p = 0.95,
+        seed = 0,
+        max_output_tokens = 65535,
+        safety_settings = SAFETY_SETTINGS,
+        response_mime_type = "application/json",
+        response_schema = {"type":"OBJECT","properties":{"extension":{"type":"INTEGER","description":"Número de páginas que debe tener la sección a realizar."}},"required":["extension"]},
+    )
+
+    for intento in range(1, reintentos + 1):
+        response = client.models.generate_content(
+            model=MODEL,
+            contents=[types.Content(role="user", parts=parts)],
+            config=generate_content_config
+        )
+        try:
+            extension = extension_valida(json.loads(response.candidates[0].content.parts[0].text).get("extension"))
+        except (ValueError, AttributeError, TypeError, IndexError):
+            extension = None
+        if extension is not None:
+            return extension
+        logger.warning("Extensión no válida para la sección %s (intento %d de %d)", rowi["Sección"], intento, reintentos)
+    raise ValueError(f"El modelo no ha devuelto una extensión válida para la sección {rowi['Sección']}")
+
+#Se estiman en paralelo (una llamada por sección) las filas pendientes. El contexto de cada sección son las secciones anteriores
+#con la extensión que indicó el profesor (se construye de forma incremental en una sola pasada por el temario):
+def estimar_individualmente(client, temario, pendientes, nivel_academico, max_workers=EXTENSIONES_MAX_CONCURRENCIA):
+    previas = {}
+    previous_extensions = ""
+    for idx, rowi in temario.iterrows():
+        previas[idx] = previous_extensions
+        previous_extensions += ("\n" if previous_extensions else "") + describir_seccion(rowi)
+
+    filas = list(pendientes)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(filas) or 1))) as executor:
+        extensiones = list(executor.map(lambda idx: estimar_seccion(client, temario.loc[idx], previas[idx], nivel_academico), filas))
+    return dict(zip(filas, extensiones))
+
+#Se estiman las extensiones de todas las secciones sin extensión. Devuelve {fila: extension}:
+def estimar_extensiones(client, temario, nivel_academico, modo=EXTENSIONES_MODO):
+    pendientes = [idx for idx, rowi in temario.iterrows() if pd.isna(rowi["Extensión"])]
+    if not pendientes:
+        return {}
+
+    extensiones = {}
+    if modo == "lote":
+        try:
+            extensiones = estimar_en_lote(client, temario, pendientes, nivel_academico)
+        except Exception:
+            logger.exception("No se han podido estimar las extensiones en lote; se estiman de forma individual")
+
+    restantes = [idx for idx in pendientes if idx not in extensiones]
+    if restantes:
+        if modo == "lote":
+            logger.warning("Se estiman de forma individual %d de %d extensiones", len(restantes), len(pendientes))
+        extensiones.update(estimar_individualmente(client, temario, restantes, nivel_academico))
+    return extensiones
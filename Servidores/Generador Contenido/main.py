@@ -1,7 +1,7 @@
 #Se cargan las librerías:
 import os
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Response
 from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
 
 from pydantic import BaseModel, Field
@@ -10,17 +10,26 @@ from google import genai
 import json
 from pathlib import Path
 from google.genai import types
-import base64
 import time
-import qrcode
 from bs4 import BeautifulSoup
-from io import BytesIO
 from elevenlabs.client import ElevenLabs
 import random
+from concurrent.futures import as_completed
 
 #Se lee el fichero .env:
 load_dotenv()
 
+#Se cargan los módulos propios del servicio (leen su configuración del .env al importarse):
+from planificador import PlanificadorTareas, IMAGENES_MAX_CONCURRENCIA
+from contexto import ContextoRedaccion
+from extensiones import estimar_extensiones
+from registro_plantillas import RegistroPlantillas
+from selector_plantillas import SelectorPlantillas
+from cola_audios import ColaAudios
+from almacen_audios import AlmacenAudios
+from almacen_imagenes import AlmacenImagenes
+from codigos_qr import generar_qr
+
 #Se inicializa FastAPI:
 app = FastAPI(title="Mi API")
 
@@ -52,6 +61,8 @@ IMAGE_PROMPTING= os.getenv("IMAGE_PROMPTING")
 ADDITIONAL_SECTION_PAGES= int(os.getenv("ADDITIONAL_SECTION_PAGES"))
 TEMARIO_FOLDER_NAME= os.getenv("TEMARIO_FOLDER_NAME")
 TEMPLATES_FOLDER_NAME= os.getenv("TEMPLATES_FOLDER_NAME")
+AUDIO_OUTPUT_FORMAT = "mp3_44100_128"
+REDACCION_REINTENTOS = int(os.getenv("REDACCION_REINTENTOS", "5"))
 
 #Se cargan los diferentes JSON de configuración:
 with open("config/html.json", "r", encoding="utf-8") as f:
@@ -65,50 +76,74 @@ with open("config/style.css", "r", encoding="utf-8") as f:
     CSS_RULES = f.read()
 CSS_RULES = F'<style>{CSS_RULES}</style>'
 
+#Se cargan en memoria (una sola vez) las imágenes de las plantillas:
+REGISTRO_PLANTILLAS = RegistroPlantillas(TEMPLATES_FOLDER_NAME)
+
+#Se inicializa el selector local de plantillas (la IA solo se consulta cuando la selección local no es fiable):
+SELECTOR_PLANTILLAS = SelectorPlantillas(HTML_JSON, HTML_COMPONENTS, REGISTRO_PLANTILLAS.nombres)
+
 #Se establece la conexión con ElevenLabs:
 elevenLabclient = ElevenLabs(api_key=ELEVENLABS_API_KEY)
 
 #Se establece la conexión con VertexAI (Google Cloud Platform):
 client = genai.Client(vertexai=True,api_key=GOOGLE_CLOUD_GEMINI_API_KEY)
 
-#Creamos una variable con el Path de la carpetya de audios:
-AUDIO_DIR = Path(f"{AUDIOS_FOLDER_NAME}").resolve()
+#Se inicializa el almacén de audios (direccionado por el hash del texto, la voz, el modelo y el formato):
+ALMACEN_AUDIOS = AlmacenAudios(ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL_ID, AUDIO_OUTPUT_FORMAT, AUDIOS_FOLDER_NAME)
+
+#Se inicializa el almacén de imágenes (los documentos las referencian por URL en lugar de incrustarlas en base64):
+ALMACEN_IMAGENES = AlmacenImagenes()
+
+#Se inicializa la cola de audios, que se generan en segundo plano (la petición no espera a que terminen):
+COLA_AUDIOS = ColaAudios(lambda texto: generar_audio(texto), ALMACEN_AUDIOS)
 
 #Se realiza la llamada para descargar archivos:
 @app.get("/audios/{audio_id}")
 def descargar_audio(audio_id: str):
-    audio_name =  f"Audio_{audio_id}.mp3"
-    file_path = (AUDIO_DIR / audio_name).resolve()
+    #El identificador puede ser el alias del audio en un documento ({document_id}_{número}) o su clave en el almacén:
+    file_path = ALMACEN_AUDIOS.resolver(audio_id)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="El audio no existe o todavía se está generando.")
     return FileResponse(
         path=str(file_path),
         media_type="application/octet-stream",
         filename=file_path.name,
     )
 
+#Las imágenes de los documentos se sirven por su hash: su contenido nunca cambia, así que se pueden cachear indefinidamente:
+@app.get("/assets/{asset_id}")
+def descargar_asset(asset_id: str, if_none_match: str | None = Header(default=None)):
+    file_path = ALMACEN_IMAGENES.resolver(asset_id)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="El asset no existe.")
+    headers = {"ETag": f'"{asset_id}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if if_none_match and ALMACEN_IMAGENES.coincide_etag(if_none_match, asset_id):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path=str(file_path), media_type="image/png", headers=headers)
+
 @app.get("/documents/{document_id}",response_class=HTMLResponse)
 def descargar_documento(document_id: str):
     document_name =  f"Document_{document_id}.html"
     file_path = (Path(DOCUMENTS_FOLDER_NAME) / document_name)
     return file_path.read_text(encoding="utf-8")
 
-# Se realiza la llamada principal
-@app.post("/generar_contenido")
-def generar_contenido(req: ContentRequest):
-     
-     #Se pasan las variables:
-    NIVEL_ACADEMICO = req.nivel_academico
-    ASIGNATURA = req.asignatura
+#Se consulta el estado de los audios (explicaciones de los QR) de un documento:
+@app.get("/documents/{document_id}/audios")
+def estado_audios(document_id: int):
+    estado = COLA_AUDIOS.estado(document_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="No hay audios en curso para ese documento.")
+    return JSONResponse(content={"document_id": document_id, **estado})
 
-    #Cargamos el temario (que ahora es insertado a modo de XLSX peor a futuro tendrá que venir desde la llamada a la API):
-    document_name = f"{TEMARIO_FOLDER_NAME}/Temario.xlsx"
-    sheet_name="Hoja1"
-    document = Path(document_name)
-    if not document.exists():
-        raise FileNotFoundError(f"No existe el archivo: {document.resolve()}")
-    temario = pd.read_excel(document, sheet_name=sheet_name, engine="openpyxl")
+#Se redacta el contenido completo de una página (texto base a partir del cual se construirán sus bloques):
+def redactar_pagina(rowi, temario, all_content, old_content, nivel_academico, previous_sections=""):
+
+    model = "gemini-2.5-pro"
+
+    tools = [
+        types.Tool(google_search=types.GoogleSearch()),
+    ]
 
-    #Calculamos la extensión de las secciones mediante la IA y si no ha sido especificado por el profesor:
-    model = "gemini-2.5-flash"
     generate_content_config = types.GenerateContentConfig(
         temperature = 1,
         top_p = 0.95,
@@ -120,68 +155,79 @@ def generar_contenido(req: ContentRequest):
             types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
             types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
         ],
+        tools = tools,
+        thinking_config=types.ThinkingConfig(thinking_budget=-1),
         response_mime_type = "application/json",
-        response_schema = {"type":"OBJECT","properties":{"extension":{"type":"INTEGER","description":"Número de páginas que debe tener la sección a realizar."}},"required":["extension"]},
+        response_schema = {"type":"OBJECT","properties":{"content":{"type":"STRING","description":"Contenido de la página actual."}},"required":["content"]},
     )
-    for idx, rowi in temario.iterrows():
-    
-        if pd.isna(rowi['Extensión']):
-
-            current_content = ""
-            current_content += "\t-Unidad: " + str(rowi["Unidad"])
-            current_content += "\n\t\t-Capítulo: " + str(rowi["Capítulo"])
-            current_content += "\n\t\t-Sección: " + str(rowi["Sección"])
-
-            previous_extensions = ""
-            for jdx, rowj in temario.iterrows():
-                if jdx < idx:
-                    previous_extensions += "\t-Unidad: " + str(rowj["Unidad"])
-                    previous_extensions += "\n\t\t-Capítulo: " + str(rowj["Capítulo"])
-                    previous_extensions += "\n\t\t-Sección: " + str(rowj["Sección"])
-                    previous_extensions += "\n\t\t\t-Contenido: " + str(rowj["Contenido"])
-                    previous_extensions += "\n\t\t\t-Extensión (Páginas): " + str(rowj["Extensión"])
-
-            if previous_extensions == "":
-                contents = [
-                    types.Content(
-                        role="user",
-                        parts=[
-                            types.Part.from_text(text=f"Eres un editor de contenido formativo para alumnos de {NIVEL_ACADEMICO}."),
-                            types.Part.from_text(text="El contenido formativo se encuentra estructurado en unidades, capítulos y secciones."),
-                            types.Part.from_text(text="Tu trabajo es ir sección por sección indicándoles a tus compañeros de edición el número de páginas que cada sección tendrá en base a su contenido."),
-                            types.Part.from_text(text="La siguiente sobre la cual debes indicar la extensión (númeor de páginas) es la siguiente:"),
-                            types.Part.from_text(text=current_content),
-                            types.Part.from_text(text="La temática sobre la que tratará dicha sección es la siguiente:"),
-                            types.Part.from_text(text=rowi["Contenido"]),
-                            types.Part.from_text(text="Tu tarea:"),
-                            types.Part.from_text(text="Determina la extensión de dicha sección (número de páginas)"),
-                            types.Part.from_text(text="Importante:"),
-                            types.Part.from_text(text=f"\tFormato de respuesta: Por favor, porciona solo el número de páginas que consideras debería tener dicha sección sabiendo que se trata de un documento educativo orientado a alumnos de {NIVEL_ACADEMICO} pero que a la vez debe ser académico y formal."),
-                        ]
-                    )
-                ]
-            else:
-                contents = [
-                    types.Content(
-                        role="user",
-                        parts=[
-                            types.Part.from_text(text=f"Eres un editor de contenido formativo para alumnos de {NIVEL_ACADEMICO}."),
-                            types.Part.from_text(text="El contenido formativo se encuentra estructurado en unidades, capítulos y secciones."),
-                            types.Part.from_text(text="Tu trabajo es ir sección por sección indicándoles a tus compañeros de edición el número de páginas que cada sección tendrá en base a su contenido."),
-                            types.Part.from_text(text="Por el momento, el contenido formativo que se ha ido redactando tiene la siguiente estructura (unidades, capítulos, sección y contenido) y extensiones (número de páginas)"),
-                            types.Part.from_text(text=previous_extensions),
-                            types.Part.from_text(text="La siguiente sobre la cual debes indicar la extensión (númeor de páginas) es la siguiente:"),
-                            types.Part.from_text(text=current_content),
-                            types.Part.from_text(text="La temática sobre la que tratará dicha sección es la siguiente:"),
-                            types.Part.from_text(text=rowi["Contenido"]),
-                            types.Part.from_text(text="Tu tarea:"),
-                            types.Part.from_text(text="Determina la extensión de dicha sección (número de páginas)"),
-                            types.Part.from_text(text="Importante:"),
-                            types.Part.from_text(text=f"\tFormato de respuesta: Por favor, porciona solo el número de páginas que consideras debería tener dicha sección sabiendo que se trata de un documento educativo orientado a alumnos de {NIVEL_ACADEMICO} pero que a la vez debe ser académico y formal."),
-                        ]
-                    )
-                ]
 
+    current_content = ""
+    unidad = rowi["Unidad"]
+    capitulo = rowi["Capítulo"]
+    seccion = rowi["Sección"]
+    pagina = rowi["Página"]
+    seccion_no_pages = rowi["Extensión Sección"]
+    seccion_page = rowi["Página Sección"]
+
+    current_content+= f"\t- Unidad: {unidad}"
+    current_content+= f"\n\t\t- Capitulo: {capitulo}"
+    current_content+= f"\n\t\t\t- Sección: {seccion}"
+    current_content+= f"\n\t\t\t\t- Página: {pagina}"
+
+    temario_filtered = temario[(temario["Unidad"] == unidad) & (temario["Capítulo"] == capitulo) & (temario["Sección"] == seccion)]
+    temario_filtered=temario_filtered.reset_index(drop=True)
+    contenido = temario_filtered.at[0, "Contenido"]
+
+    parts =[]
+    parts+=[
+        types.Part.from_text(text="Eres un trabajador en una editorial encargado de redactar el documento de las diferentes páginas de un documento educativo."),
+        types.Part.from_text(text="Tienes que redactar un documento educativo y sabes que la estructura y contenido de todo el documento es el siguiente:"),
+        types.Part.from_text(text=all_content),
+    ]
+
+    if previous_sections != "":
+        parts+=[
+            types.Part.from_text(text="Las secciones inmediatamente anteriores a la que pertenece la página tratan sobre lo siguiente (resumen a partir del temario):"),
+            types.Part.from_text(text=previous_sections),
+        ]
+
+    if old_content == "":
+        parts+=[
+            types.Part.from_text(text="Por el momento no has redactado ninguna página de la sección a la que pertenece la página.")
+        ]
+    else:
+        parts+=[
+            types.Part.from_text(text="Por el momento, el contenido que has redactado de la sección a la que pertenece la página es el siguiente (sus últimas páginas completas y, si las hay, un resumen de las anteriores):"),
+            types.Part.from_text(text=old_content),
+        ]
+
+    parts+=[
+        types.Part.from_text(text=f"Te dispones a redactar la siguiente página:"),
+        types.Part.from_text(text=current_content),
+        types.Part.from_text(text=f"Sabes que esa sección la componen {seccion_no_pages} páginas y la que vas a redactar es la número {seccion_page} dentor de dicha sección."),
+        types.Part.from_text(text="Tu tarea:"),
+        types.Part.from_text(text="\t 1. Analiza con detalle todo el contenido sobre el que tiene que tratar el documento educativo."),
+        types.Part.from_text(text="\t 2. Observa el resumen de las secciones anteriores y lo que has redactado hasta ahora de la sección (si aplica)."),
+        types.Part.from_text(text="\t 3. Analiza el contenido de la sección que vas a redactar."),
+        types.Part.from_text(text="\t 4. Redacta el contenido de la página."),
+        types.Part.from_text(text="Importante:"),
+        types.Part.from_text(text=f"\t El contenido educativo va destinado a alumnos de {nivel_academico} con lo que el contenido que refleje debe adaptarse a dicha audiencia en cuanto a nivel de profundidad pero debe ser un texto académico, formal y en un solo bloque de información."),
+        types.Part.from_text(text=f"\t Procura enlazar el contenido de una página con el de las secciones anteriores para que la narrativa tenga continuidad."),
+        types.Part.from_text(text="Muy importante:"),
+        types.Part.from_text(text=f"\t El contenido de cada hoja debe tener entre 1000 y 2000 palabras."),
+        types.Part.from_text(text=f"\t El contenido no debe contener títulos de secciones ni subsecciones, debe ser directamente el contenido.")
+    ]
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=parts
+        )
+    ]
+
+    #Los reintentos están acotados: la página se redacta en un worker del planificador y un error permanente no debe ocuparlo indefinidamente:
+    for intento in range(1, REDACCION_REINTENTOS + 1):
+        try:
             if "3.0" in model:
                 time.sleep(60)
             response = client.models.generate_content(
@@ -189,11 +235,451 @@ def generar_contenido(req: ContentRequest):
                 contents=contents,
                 config=generate_content_config
             )
-
             output=response.candidates[0].content.parts[0].text
-            output = json.loads(output)
-            extension = output.get("extension")
-            temario.at[idx, 'Extensión'] = str(extension + ADDITIONAL_SECTION_PAGES)
+            content = json.loads(output)
+            content = content['content']
+            break
+        except Exception as e:
+            if intento == REDACCION_REINTENTOS:
+                raise
+    return str(content)
+
+#Se escoge la mejor plantilla para una página (este proceso debería automatizarse y quitar la dependencia con respecto a PowerPoint):
+def escoger_plantilla(tipo_plantilla, contenido, nivel_academico, usar_cache=True):
+
+    model = "gemini-2.5-pro"
+
+    plantillas = REGISTRO_PLANTILLAS.nombres(tipo_plantilla)
+    #Las imágenes de las plantillas se referencian desde la caché de Gemini (si está disponible) en lugar de enviarse en cada llamada:
+    cache = REGISTRO_PLANTILLAS.cache(client, model, tipo_plantilla) if usar_cache else None
+
+    parts=[]
+
+    parts+=[
+        types.Part.from_text(text="Eres un ilustrador en una editorial que tiene que escoger la plantilla adecuada para una página de un documento educativo."),
+        types.Part.from_text(text="Te han dicho que el contenido de dicha página será el siguiente:"),
+        types.Part.from_text(text=contenido),
+        ]
+
+    if cache:
+        parts+=[
+            types.Part.from_text(text="Puedes escoger entre las plantillas del listado que te he adjuntado previamente."),
+        ]
+    else:
+        parts+=[
+            types.Part.from_text(text="A continuación adjunto el listado de plantillas de entre las que puedes escoger:"),
+            *REGISTRO_PLANTILLAS.partes(tipo_plantilla),
+        ]
+
+    parts+=[
+        types.Part.from_text(text="Tu tarea:"),
+        types.Part.from_text(text="\t1. Debes analizar al detalle el contenido de cada plantilla sabiendo que:"),
+        types.Part.from_text(text="\t\t  - El texto en color negro con el Lorem Ipsum es un texto de relleno que posteriromente será reemplazado con el contenido real de la página."),
+        types.Part.from_text(text="\t\t  - El texto en color azul con el Lorem Ipsum es un texto de relleno que posteriromente será reemplazado con ejemplos relacionados al contenido de la página."),
+        types.Part.from_text(text="\t\t  - El texto en color verde será posteriormente reemplazado con información sobre la sección, el capítulo, etc."),
+        types.Part.from_text(text="\t\t  - Las posibles imágenes en el cuerpo principal del documento proporcionan información serán posteriormente reemplazadas pro imágenes relacionadas con el contenido explicado."),
+        types.Part.from_text(text="\t 2. Debes revisar el contenido sobre el que se quiere profundizar en la página."),
+        types.Part.from_text(text="\t 3. Debes identificar la plantilla que mejor se ajuste al futuro contenido de la página."),
+        types.Part.from_text(text="Importante:"),
+        types.Part.from_text(text=f"\t El contenido educativo va destinado a alumnos de {nivel_academico}. Ten en cuenta esto a la hora de escoger la plantilla."),
+        types.Part.from_text(text=f"\t Proporciona el nombre de la plantilla que mejor se ajuste."),
+    ]
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=parts
+        )
+    ]
+
+    generate_content_config = types.GenerateContentConfig(
+        temperature = 1,
+        top_p = 0.95,
+        seed = 0,
+        max_output_tokens = 65535,
+        safety_settings = [
+            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
+        ],
+        response_mime_type = "application/json",
+        response_schema = {"type":"OBJECT","properties":{"template":{"type":"STRING","description":"Nombre de la plantilla que mejor se ajusta al contenido de la página.","enum": plantillas}},"required":["template"]},
+        cached_content = cache,
+    )
+
+    if "3.0" in model:
+        time.sleep(60)
+    try:
+        response = client.models.generate_content(
+            model=model,
+            contents=contents,
+            config=generate_content_config
+        )
+    except Exception:
+        if not cache:
+            raise
+        #Si la caché ya no es válida, se descarta (se volverá a crear en la siguiente página) y se repite la llamada enviando las imágenes:
+        REGISTRO_PLANTILLAS.descartar(model, tipo_plantilla)
+        return escoger_plantilla(tipo_plantilla, contenido, nivel_academico, usar_cache=False)
+
+    output=response.candidates[0].content.parts[0].text
+    output = json.loads(output)
+    template = output.get("template")
+    return str(template)
+
+#Se obtienen los componentes HTML de la plantilla escogida para una página:
+def componentes_plantilla(tipo_plantilla, template):
+    diapositiva = template.lower().replace("diapositiva","").replace(".jpg","")
+    return HTML_JSON[tipo_plantilla][diapositiva]
+
+#Se redactan los bloques de texto de una página (uno por cada componente de texto de su plantilla):
+def redactar_bloques(contenido, html_components, nivel_academico):
+    length=[]
+    for component in html_components:
+        #Lo primero que hacemos es generar el contenido en formato texto para dicha diapositiva:
+        if "texto" in component:
+            for text_length in HTML_COMPONENTS[component]["text_lengths"]:
+                length.append(text_length)
+    #Una vez sabemos el texto, lo que hacemos es pedirle a Gemini que genere el contenido de dichos fragmentos:
+    properties_schema_json={}
+    required_schema_json=[]
+    for jdx, text_item in enumerate(length):
+        properties_schema_json[f"text{jdx+1}"] = {"type":"STRING","description":f"Contenido del bloque de texto #{jdx+1}."}
+        required_schema_json.append(f"text{jdx+1}")
+
+    model = "gemini-2.5-pro"
+
+    generate_content_config = types.GenerateContentConfig(
+        temperature = 1,
+        top_p = 0.95,
+        seed = 0,
+        max_output_tokens = 65535,
+        safety_settings = [
+            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
+        ],
+        thinking_config=types.ThinkingConfig(thinking_budget=-1),
+        response_mime_type = "application/json",
+        response_schema = {"type":"OBJECT","properties":properties_schema_json,"required":required_schema_json},
+    )
+
+    parts=[
+        types.Part.from_text(text=f"Eres un editor de contenido formativo para alumnos de {nivel_academico}."),
+        types.Part.from_text(text="Te han encomentado la tarea de redactar el contenido de una página que trata sobre lo siguiente:"),
+        types.Part.from_text(text=contenido),
+        types.Part.from_text(text="A continuación te indico el número de bloques de texto que debes redactar y el tamaño, en caracteres, de cada uno de ellos:"),
+    ]
+
+    for jdx, len_item in enumerate(length):
+        parts+=[
+            types.Part.from_text(text=f"\t Bloque # {jdx+1}"),
+            types.Part.from_text(text=f"\t\t Longitud aproximada:  {len_item} caracteres.")
+        ]
+
+    parts+=[
+        types.Part.from_text(text="El contenido debe estar redactado en formato html puro sin reglas CSS ni estilos adicionales."),
+        types.Part.from_text(text="Únicamente podrás redactar con las etiquetas HTML que te indique a continuación: <p>, <ul>, <li>, <ol>, <b>, <i>"),
+        types.Part.from_text(text="Tu tarea:"),
+        types.Part.from_text(text=f"Redacta el contenido de los {len(length)} bloques de texto en formato html siguiendo las instrucciones anteriormente indicadas"),
+    ]
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=parts
+        )
+    ]
+
+    if "3.0" in model:
+        time.sleep(60)
+    response = client.models.generate_content(
+        model=model,
+        contents=contents,
+        config=generate_content_config
+    )
+
+    output=response.candidates[0].content.parts[0].text
+    output = json.loads(output)
+
+    text_content=[]
+    for jdx, text_item in enumerate(length):
+        text_content.append(output.get("text"+str(jdx+1)))
+    return text_content
+
+#Se obtiene, para cada ejemplo de la página, el texto que se ha redactado antes que él (los ejemplos no dependen unos de otros):
+def textos_para_ejemplos(html_components, text_content):
+    texto_component_index=0
+    written_text=""
+    textos=[]
+    for component in html_components:
+        if "texto" in component:
+            written_text += text_content[texto_component_index]   
+            texto_component_index+=1
+        elif "ejemplo" in component:
+            soup = BeautifulSoup(written_text, "html.parser")
+            written_text = soup.get_text(" ", strip=True)
+            textos.append(written_text)
+    return textos
+
+#Se redacta un ejemplo que ayude a entender el texto indicado:
+def redactar_ejemplo(written_text, nivel_academico):
+
+    model = "gemini-2.5-pro"
+
+    generate_content_config = types.GenerateContentConfig(
+        temperature = 1,
+        top_p = 0.95,
+        seed = 0,
+        max_output_tokens = 65535,
+        safety_settings = [
+            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
+        ],
+        thinking_config=types.ThinkingConfig(thinking_budget=-1),
+        response_mime_type = "application/json",
+        response_schema = {"type":"OBJECT","properties":{"ejemplo":{"type":"STRING","description":"Ejemplo que se incluirá en el documento formativo."}},"required":["ejemplo"]},
+    )
+
+    parts=[
+        types.Part.from_text(text=f"Eres un editor de contenido formativo para alumnos de {nivel_academico}."),
+        types.Part.from_text(text="Te han encomentado la tarea de redactar un ejemplo que permita a los alumnos entender los siguientes fragmentos que aparecen en el contenido formativo principal:"),
+        types.Part.from_text(text=written_text),
+        types.Part.from_text(text="El contenido debe estar redactado en formato html puro sin reglas CSS ni estilos adicionales."),
+        types.Part.from_text(text="Únicamente podrás redactar con las etiquetas HTML que te indique a continuación: <p>, <ul>, <li>, <ol>, <b>, <i>"),
+        types.Part.from_text(text="Tu tarea:"),
+        types.Part.from_text(text=f"Redacta el contenido del ejemplo en base al contenido principal deltexto en formato html siguiendo las instrucciones anteriormente indicadas")
+    ]
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=parts
+        )
+    ]
+
+    if "3.0" in model:
+        time.sleep(60)
+    response = client.models.generate_content(
+        model=model,
+        contents=contents,
+        config=generate_content_config
+    )
+
+    output=response.candidates[0].content.parts[0].text
+    output = json.loads(output)
+    return output.get("ejemplo")
+
+#Se redacta la explicación (locutada) de los bloques de texto anteriores a un QR:
+def redactar_explicacion(keep_content, nivel_academico):
+
+    soup = BeautifulSoup(keep_content, "html.parser")
+    keep_content = soup.get_text(" ", strip=True)
+
+    model = "gemini-2.5-pro"
+
+    generate_content_config = types.GenerateContentConfig(
+        temperature = 1,
+        top_p = 0.95,
+        seed = 0,
+        max_output_tokens = 65535,
+        safety_settings = [
+            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
+        ],
+        thinking_config=types.ThinkingConfig(thinking_budget=-1),
+        response_mime_type = "application/json",
+        response_schema = {"type":"OBJECT","properties":{"explicacion":{"type":"STRING","description":"Explicación del contenido del bloque formativo"}},"required":["explicacion"]},
+    )
+
+    parts=[
+        types.Part.from_text(text=f"Eres un locutor de contenido formativo para alumnos de {nivel_academico} llamado Luca."),
+        types.Part.from_text(text="Te han encomentado la tarea de exlicar el siguiente fragmento de texto a un alumno para que lo comprenda:"),
+        types.Part.from_text(text=keep_content),
+        types.Part.from_text(text="Tu tarea:"),
+        types.Part.from_text(text=f"Proporciona una explicación breve pero cocisa sobre el contenido formativo anteriormente indicado para que un alumno de {nivel_academico} pueda comprenderlo mejor."),
+        types.Part.from_text(text="Importante:"),
+        types.Part.from_text(text="DEBES explicar todo el contenido relevante del bloque formativo sin dejarte información."),
+    ]
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=parts
+        )
+    ]
+
+    if "3.0" in model:
+        time.sleep(60)
+    response = client.models.generate_content(
+        model=model,
+        contents=contents,
+        config=generate_content_config
+    )
+
+    output=response.candidates[0].content.parts[0].text
+    output = json.loads(output)
+    return output.get("explicacion")
+
+#Se convierte la explicación en audio (ElevenLabs); la cola de audios se encarga de guardarlo:
+def generar_audio(explicacion):
+
+    return elevenLabclient.text_to_speech.convert(
+        text=explicacion,
+        voice_id=ELEVENLABS_VOICE_ID,
+        model_id=ELEVENLABS_MODEL_ID,
+        output_format=AUDIO_OUTPUT_FORMAT,
+        language_code = "es"
+    )
+
+#Se obtiene, para cada imagen de la página, el texto que debe ilustrar:
+def textos_para_imagenes(html_components, text_content, sample_content):
+    texto_component_index=0
+    sample_component_index=0
+    written_text=""
+    textos=[]
+    for component in html_components:
+        if "texto" in component and not "imagen" in component:
+            written_text+=text_content[texto_component_index]
+            texto_component_index+=1
+        elif "ejemplo" in component and not "imagen" in component:
+            written_text+=sample_content[sample_component_index]
+            sample_component_index+=1
+        elif component == "imagen_texto" or component == "texto_imagen":
+            written_text=text_content[texto_component_index]
+            texto_component_index+=1
+        elif component == "imagen_ejemplo" or component == "ejemplo_imagen":
+            written_text=sample_content[sample_component_index]
+            sample_component_index+=1
+        
+        if "imagen" in component:
+            soup = BeautifulSoup(written_text, "html.parser")
+            textos.append((component, soup.get_text(" ", strip=True)))
+            written_text = ""
+    return textos
+
+#Se genera una imagen (PNG) que ilustre el texto indicado; se guarda en el almacén de imágenes y se devuelve su clave:
+def generar_imagen(component, written_text, nivel_academico):
+
+    model = "gemini-2.5-flash-image"
+
+    parts=[
+        types.Part.from_text(text=f"Eres un editor gráfico que elabora ilustraciones para contenido formativo para alumnos de {nivel_academico}."),
+        types.Part.from_text(text="Te han encomentado la tarea de ilustrar una imagen relacionada con el siguiente bloque de texto de una unidad formativa:"),
+        types.Part.from_text(text=written_text),
+        types.Part.from_text(text="Para llevar esta tarea a cabo tomas como referencia las siguientes instrucciones gráficas:"),
+        types.Part.from_text(text=IMAGE_PROMPTING),
+    ]
+
+    parts+=[
+        types.Part.from_text(text="Muy importante:"),
+        types.Part.from_text(text="- El contenido de la imagen generada NO debe contener letras ni números. Si tiene un solo carácter alfanumérico."),
+        types.Part.from_text(text="Repito, NADA de letras o números en la imagen."),
+    ]
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=parts
+        )
+    ]
+
+    if component == "imagen":
+        aspect_ratio = "16:9"
+    else:
+        aspect_ratio = "1:1"
+
+    generate_content_config = types.GenerateContentConfig(
+        temperature = 1,
+        top_p = 0.95,
+        max_output_tokens = 32768,
+        response_modalities = ["IMAGE"],
+        safety_settings = [
+            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
+        ],
+        image_config=types.ImageConfig(aspect_ratio=aspect_ratio,image_size="1K",output_mime_type="image/png",),
+    )
+
+    if "3.0" in model:
+        time.sleep(60)
+    response = client.models.generate_content(
+        model=model,
+        contents=contents,
+        config=generate_content_config
+    )
+
+    output=response.candidates[0].content.parts[0].inline_data
+    return ALMACEN_IMAGENES.guardar(output.data)
+
+#Se transcribe una página a HTML a partir de su plantilla y de los textos, ejemplos e imágenes ya generados (audio_ids son los
+#identificadores de los audios de sus QR):
+def componer_pagina(rowi, html_components, text_content, sample_content, image_content, audio_ids, asignatura, nivel_academico):
+    html_content=""
+    texto_component_index=0
+    sample_component_index=0
+    image_component_index=0
+    qr_component_index=0
+    for component in html_components:
+        if component == "cabecera":
+            html_content+=HTML_COMPONENTS[component]["html"].replace("#asignatura#",asignatura).replace("#nivel_academico#",nivel_academico)
+        elif component == "unidad":
+            html_content+=HTML_COMPONENTS[component]["html"].replace("#content#",rowi["Unidad"])
+        elif component == "capitulo":
+            html_content+=HTML_COMPONENTS[component]["html"].replace("#content#",rowi["Capítulo"])
+        elif component == "seccion":
+            html_content+=HTML_COMPONENTS[component]["html"].replace("#content#",rowi["Sección"])
+        elif component == "texto":
+            html_content+=HTML_COMPONENTS[component]["html"].replace("#content#",text_content[texto_component_index])
+            texto_component_index+=1
+        elif component == "ejemplo":
+            html_content+=HTML_COMPONENTS[component]["html"].replace("#content#",sample_content[sample_component_index])
+            sample_component_index+=1
+        elif component == "imagen":
+            html_content+=HTML_COMPONENTS[component]["html"].replace("#image_url#",ALMACEN_IMAGENES.url(image_content[image_component_index]))
+            image_component_index+=1
+        elif component == "imagen_texto" or component == "texto_imagen":
+            html_content+=HTML_COMPONENTS[component]["html"].replace("#image_url#",ALMACEN_IMAGENES.url(image_content[image_component_index])).replace("#content#",text_content[texto_component_index])
+            texto_component_index+=1
+            image_component_index+=1
+        elif component == "imagen_ejemplo" or component == "ejemplo_imagen":
+            html_content+=HTML_COMPONENTS[component]["html"].replace("#image_url#",ALMACEN_IMAGENES.url(image_content[image_component_index])).replace("#content#",sample_content[sample_component_index])
+            sample_component_index+=1
+            image_component_index+=1
+        elif component == "qr":
+            url = ALMACEN_AUDIOS.url(audio_ids[qr_component_index])
+            qr_component_index+=1
+            html_content+=HTML_COMPONENTS[component]["html"].replace("#qr_image#",generar_qr(url))
+    return html_content
+
+# Se realiza la llamada principal
+@app.post("/generar_contenido")
+def generar_contenido(req: ContentRequest):
+     
+     #Se pasan las variables:
+    NIVEL_ACADEMICO = req.nivel_academico
+    ASIGNATURA = req.asignatura
+    document_id = random.randint(1, 10000000)
+
+    #Cargamos el temario (que ahora es insertado a modo de XLSX peor a futuro tendrá que venir desde la llamada a la API):
+    document_name = f"{TEMARIO_FOLDER_NAME}/Temario.xlsx"
+    sheet_name="Hoja1"
+    document = Path(document_name)
+    if not document.exists():
+        raise FileNotFoundError(f"No existe el archivo: {document.resolve()}")
+    temario = pd.read_excel(document, sheet_name=sheet_name, engine="openpyxl")
+
+    #Calculamos la extensión de las secciones mediante la IA y si no ha sido especificado por el profesor (en una única llamada, ver extensiones.py):
+    for idx, extension in estimar_extensiones(client, temario, NIVEL_ACADEMICO).items():
+        temario.at[idx, 'Extensión'] = str(extension + ADDITIONAL_SECTION_PAGES)
 
     #Identificamos, la tipología de cada hoja (Inicio, Cierre, Continuación, ...):
     temario_plantillas = pd.DataFrame()
@@ -269,29 +755,6 @@ def generar_contenido(req: ContentRequest):
     temario_plantillas=temario_plantillas.reset_index(drop=True)
 
     #A continuación se define el contenido de cada plantilla utilizando de nuevo la IA:
-    model = "gemini-2.5-pro"
-
-    tools = [
-        types.Tool(google_search=types.GoogleSearch()),
-    ]
-
-    generate_content_config = types.GenerateContentConfig(
-        temperature = 1,
-        top_p = 0.95,
-        seed = 0,
-        max_output_tokens = 65535,
-        safety_settings = [
-            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
-        ],
-        tools = tools,
-        thinking_config=types.ThinkingConfig(thinking_budget=-1),
-        response_mime_type = "application/json",
-        response_schema = {"type":"OBJECT","properties":{"content":{"type":"STRING","description":"Contenido de la página actual."}},"required":["content"]},
-    )
-
     all_content=""
     for idx, rowi in temario.iterrows():
         unidad = rowi["Unidad"]
@@ -303,541 +766,131 @@ def generar_contenido(req: ContentRequest):
         all_content+= f"\n\t\t\t- Sección: {seccion}"
         all_content+= f"\n\t\t\t\t- Contenido: {contenido}"
 
-    temario_plantillas["Contenido"] = ""
-    for idx, rowi in temario_plantillas.iterrows():
-        
-        old_content = ""
-        for jdx, rowj in temario_plantillas.iterrows():
-            if jdx < idx :
-                if jdx == 0:
-                    unidad = temario_plantillas.at[jdx, "Unidad"]
-                    capitulo = temario_plantillas.at[jdx, "Capítulo"]
-                    seccion = temario_plantillas.at[jdx, "Sección"]
-                    old_content+= f"\t- Unidad: {unidad}"
-                    old_content+= f"\n\t\t- Capitulo: {capitulo}"
-                    old_content+= f"\n\t\t\t- Sección: {seccion}"
-                else:
-                    if temario_plantillas.at[jdx-1, "Unidad"] != temario_plantillas.at[jdx, "Unidad"]:
-                        unidad = temario_plantillas.at[jdx, "Unidad"]
-                        capitulo = temario_plantillas.at[jdx, "Capítulo"]
-                        seccion = temario_plantillas.at[jdx, "Sección"]
-                        old_content+= f"\t- Unidad: {unidad}"
-                        old_content+= f"\n\t\t- Capitulo: {capitulo}"
-                        old_content+= f"\n\t\t\t- Sección: {seccion}"
-                    elif temario_plantillas.at[jdx-1, "Capítulo"] != temario_plantillas.at[jdx, "Capítulo"]:
-                        capitulo = temario_plantillas.at[jdx, "Capítulo"]
-                        seccion = temario_plantillas.at[jdx, "Sección"]
-                        old_content+= f"\n\t\t- Capitulo: {capitulo}"
-                        old_content+= f"\n\t\t\t- Sección: {seccion}"
-                    elif temario_plantillas.at[jdx-1, "Sección"] != temario_plantillas.at[jdx, "Sección"]:
-                        seccion = temario_plantillas.at[jdx, "Sección"]
-                        old_content+= f"\n\t\t\t- Sección: {seccion}"
-                pagina = temario_plantillas.at[jdx, "Página"]
-                contenido = temario_plantillas.at[jdx, "Contenido"]
-                old_content+= f"\n\t\t\t\t- Página: {pagina}"
-                old_content+= f"\n\t\t\t\t- contenido: {contenido}"
-
-        current_content = ""
-        unidad = rowi["Unidad"]
-        capitulo = rowi["Capítulo"]
-        seccion = rowi["Sección"]
-        pagina = rowi["Página"]
-        seccion_no_pages = rowi["Extensión Sección"]
-        seccion_page = rowi["Página Sección"]
-
-        current_content+= f"\t- Unidad: {unidad}"
-        current_content+= f"\n\t\t- Capitulo: {capitulo}"
-        current_content+= f"\n\t\t\t- Sección: {seccion}"
-        current_content+= f"\n\t\t\t\t- Página: {pagina}"
-
-        temario_filtered = temario[(temario["Unidad"] == unidad) & (temario["Capítulo"] == capitulo) & (temario["Sección"] == seccion)]
-        temario_filtered=temario_filtered.reset_index(drop=True)
-        contenido = temario_filtered.at[0, "Contenido"]
-
-        parts =[]
-        parts+=[
-            types.Part.from_text(text="Eres un trabajador en una editorial encargado de redactar el documento de las diferentes páginas de un documento educativo."),
-            types.Part.from_text(text="Tienes que redactar un documento educativo y sabes que la estructura y contenido de todo el documento es el siguiente:"),
-            types.Part.from_text(text=all_content),
-        ]
-        
-        if old_content == "":
-            parts+=[
-                types.Part.from_text(text="Por el momento no has redactado ninguna página del documento educativo.")
-            ]
-        else:
-            if old_content == "":
-                parts+=[
-                    types.Part.from_text(text="Por el momento, el contenido que has redactado del documento educativo es el siguiente"),
-                    types.Part.from_text(text=old_content),
-                ]
-
-        parts+=[
-            types.Part.from_text(text=f"Te dispones a redactar la siguiente página:"),
-            types.Part.from_text(text=current_content),
-            types.Part.from_text(text=f"Sabes que esa sección la componen {seccion_no_pages} páginas y la que vas a redactar es la número {seccion_page} dentor de dicha sección."),
-            types.Part.from_text(text="Tu tarea:"),
-            types.Part.from_text(text="\t 1. Analiza con detalle todo el contenido sobre el que tiene que tratar el documento educativo."),
-            types.Part.from_text(text="\t 2. Observa todas las secciones que se han redactado hasta ahora (si aplica)."),
-            types.Part.from_text(text="\t 3. Analiza el contenido de la sección que vas a redactar."),
-            types.Part.from_text(text="\t 4. Redacta el contenido de la página."),
-            types.Part.from_text(text="Importante:"),
-            types.Part.from_text(text=f"\t El contenido educativo va destinado a alumnos de {NIVEL_ACADEMICO} con lo que el contenido que refleje debe adaptarse a dicha audiencia en cuanto a nivel de profundidad pero debe ser un texto académico, formal y en un solo bloque de información."),
-            types.Part.from_text(text=f"\t Procura enlazar el contenido de una página con el de las secciones anteriores para que la narrativa tenga continuidad."),
-            types.Part.from_text(text="Muy importante:"),
-            types.Part.from_text(text=f"\t El contenido de cada hoja debe tener entre 1000 y 2000 palabras."),
-            types.Part.from_text(text=f"\t El contenido no debe contener títulos de secciones ni subsecciones, debe ser directamente el contenido.")
-        ]
-
-        contents = [
-            types.Content(
-                role="user",
-                parts=parts
+    #Las páginas se generan con un planificador de tareas (DAG): cada etapa se lanza en cuanto terminan sus dependencias y el
+    #número total de llamadas simultáneas está limitado por CONTENIDO_MAX_CONCURRENCIA. Las dependencias son:
+    #   - El contenido de una página depende de la página anterior de su misma sección (las secciones se redactan en paralelo).
+    #     Como contexto se envía el texto completo de solo las últimas páginas de la sección, un resumen de sus páginas anteriores y
+    #     un resumen (a partir del temario) de las secciones anteriores (ver contexto.py).
+    #   - La plantilla depende del contenido de la página (se escoge localmente y, si no es fiable, con la IA) y los bloques de texto, de la plantilla.
+    #   - Los ejemplos dependen de los bloques de texto de su página y cada imagen, de los bloques y de los ejemplos de su página
+    #     anteriores a ella. Las imágenes se generan en su propio pool (IMAGENES_MAX_CONCURRENCIA), en paralelo con los textos.
+    #   - Cada explicación (QR) depende de los bloques de texto redactados desde el QR anterior. La explicación y su audio se
+    #     generan en la cola de audios, en segundo plano: el documento se devuelve sin esperar a que terminen.
+    filas = [rowi for _, rowi in temario_plantillas.iterrows()]
+    secciones = [(rowi["Unidad"], rowi["Capítulo"], rowi["Sección"]) for rowi in filas]
+    contexto = ContextoRedaccion([((rowi["Unidad"], rowi["Capítulo"], rowi["Sección"]), rowi["Contenido"]) for _, rowi in temario.iterrows()])
+    with PlanificadorTareas() as planificador, PlanificadorTareas(IMAGENES_MAX_CONCURRENCIA, nombre="imagenes") as planificador_imagenes:
+
+        paginas=[]
+        plantillas=[]
+        bloques=[]
+        ultima_pagina_seccion={}
+        for idx, rowi in enumerate(filas):
+            anterior = ultima_pagina_seccion.get(secciones[idx])
+            contenido = planificador.tarea(
+                lambda *_, rowi=rowi, seccion=secciones[idx]: contexto.registrar(seccion, rowi["Página"], redactar_pagina(rowi, temario, all_content, contexto.texto(seccion), NIVEL_ACADEMICO, contexto.secciones_anteriores(seccion))),
+                *([paginas[anterior]] if anterior is not None else []),
+                nombre=f"contenido página {rowi['Página']}",
             )
-        ]
-
-        grounded_answer = False
-        while not grounded_answer:
-            try:
-                if "3.0" in model:
-                    time.sleep(60)
-                response = client.models.generate_content(
-                    model=model,
-                    contents=contents,
-                    config=generate_content_config
-                )
-                output=response.candidates[0].content.parts[0].text
-                content = json.loads(output)
-                content = content['content']   
-                grounded_answer = True   
-            except Exception as e:
-                pass 
-        temario_plantillas.at[idx, 'Contenido'] = str(content)
-
-    #Se escoge la mejor plantilla para cada página (este proceso debería automatizarse y quitar la dependencia con respecto a PowerPoint):
-    model = "gemini-2.5-pro"
-
-    temario_plantillas["Diapositiva"] = ""
-    for idx, rowi in temario_plantillas.iterrows():
-
-        carpeta = Path(f"{TEMPLATES_FOLDER_NAME}/{rowi['Tipo Plantilla']}/")
-        plantillas = sorted(p.name for p in carpeta.iterdir() if p.is_file() and p.suffix.lower() == ".jpg")
-
-        parts=[]
-
-        parts+=[
-            types.Part.from_text(text="Eres un ilustrador en una editorial que tiene que escoger la plantilla adecuada para una página de un documento educativo."),
-            types.Part.from_text(text="Te han dicho que el contenido de dicha página será el siguiente:"),
-            types.Part.from_text(text=rowi["Contenido"]),
-            types.Part.from_text(text="A continuación adjunto el listado de plantillas de entre las que puedes escoger:"),
-            ]
-
-        for plantilla in plantillas:
-            fichero = Path(f"{TEMPLATES_FOLDER_NAME}/{rowi['Tipo Plantilla']}/{plantilla}")
-            b64_string = base64.b64encode(fichero.read_bytes()).decode("utf-8")
-            parts+=[
-                types.Part.from_text(text=f"{plantilla}:"),
-                types.Part.from_bytes(data=base64.b64decode(b64_string),mime_type="image/jpg")
-            ]
-
-        parts+=[
-            types.Part.from_text(text="Tu tarea:"),
-            types.Part.from_text(text="\t1. Debes analizar al detalle el contenido de cada plantilla sabiendo que:"),
-            types.Part.from_text(text="\t\t  - El texto en color negro con el Lorem Ipsum es un texto de relleno que posteriromente será reemplazado con el contenido real de la página."),
-            types.Part.from_text(text="\t\t  - El texto en color azul con el Lorem Ipsum es un texto de relleno que posteriromente será reemplazado con ejemplos relacionados al contenido de la página."),
-            types.Part.from_text(text="\t\t  - El texto en color verde será posteriormente reemplazado con información sobre la sección, el capítulo, etc."),
-            types.Part.from_text(text="\t\t  - Las posibles imágenes en el cuerpo principal del documento proporcionan información serán posteriormente reemplazadas pro imágenes relacionadas con el contenido explicado."),
-            types.Part.from_text(text="\t 2. Debes revisar el contenido sobre el que se quiere profundizar en la página."),
-            types.Part.from_text(text="\t 3. Debes identificar la plantilla que mejor se ajuste al futuro contenido de la página."),
-            types.Part.from_text(text="Importante:"),
-            types.Part.from_text(text=f"\t El contenido educativo va destinado a alumnos de {NIVEL_ACADEMICO}. Ten en cuenta esto a la hora de escoger la plantilla."),
-            types.Part.from_text(text=f"\t Proporciona el nombre de la plantilla que mejor se ajuste."),
-        ]
-
-        contents = [
-            types.Content(
-                role="user",
-                parts=parts
+            plantilla = planificador.tarea(
+                lambda contenido, rowi=rowi: SELECTOR_PLANTILLAS.escoger(rowi["Tipo Plantilla"], contenido, lambda: escoger_plantilla(rowi["Tipo Plantilla"], contenido, NIVEL_ACADEMICO)),
+                contenido,
+                nombre=f"plantilla página {rowi['Página']}",
             )
-        ]
-
-        generate_content_config = types.GenerateContentConfig(
-            temperature = 1,
-            top_p = 0.95,
-            seed = 0,
-            max_output_tokens = 65535,
-            safety_settings = [
-                types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
-            ],
-            response_mime_type = "application/json",
-            response_schema = {"type":"OBJECT","properties":{"template":{"type":"STRING","description":"Nombre de la plantilla que mejor se ajusta al contenido de la página.","enum": plantillas}},"required":["template"]},
-        )
-
-        if "3.0" in model:
-            time.sleep(60)
-        response = client.models.generate_content(
-            model=model,
-            contents=contents,
-            config=generate_content_config
-        )
-
-        output=response.candidates[0].content.parts[0].text
-        output = json.loads(output)
-        template = output.get("template")
-        temario_plantillas.at[idx, 'Diapositiva'] = str(template)
-
-    #Se genera el contenido HTML:
-    html_content=F"<!doctype html><html lang=\"es\"><head>{CSS_RULES}</head><body><div class=\"dina4\">"
-    qr_count=0
-    keep_content = ""
-    for idx, rowi in temario_plantillas.iterrows():
-        diapositiva = rowi["Diapositiva"].lower().replace("diapositiva","").replace(".jpg","")
-        html_components = HTML_JSON[rowi["Tipo Plantilla"]][diapositiva]
-        length=[]
-        for component in html_components:
-            #Lo primero que hacemos es generar el contenido en formato texto para dicha diapositiva:
-            if "texto" in component:
-                for text_length in HTML_COMPONENTS[component]["text_lengths"]:
-                    length.append(text_length)
-        #Una vez sabemos el texto, lo que hacemos es pedirle a Gemini que genere el contenido de dichos fragmentos:
-        properties_schema_json={}
-        required_schema_json=[]
-        for jdx, text_item in enumerate(length):
-            properties_schema_json[f"text{jdx+1}"] = {"type":"STRING","description":f"Contenido del bloque de texto #{jdx+1}."}
-            required_schema_json.append(f"text{jdx+1}")
-
-        model = "gemini-2.5-pro"
-
-        generate_content_config = types.GenerateContentConfig(
-            temperature = 1,
-            top_p = 0.95,
-            seed = 0,
-            max_output_tokens = 65535,
-            safety_settings = [
-                types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
-            ],
-            thinking_config=types.ThinkingConfig(thinking_budget=-1),
-            response_mime_type = "application/json",
-            response_schema = {"type":"OBJECT","properties":properties_schema_json,"required":required_schema_json},
-        )
-
-        parts=[
-            types.Part.from_text(text=f"Eres un editor de contenido formativo para alumnos de {NIVEL_ACADEMICO}."),
-            types.Part.from_text(text="Te han encomentado la tarea de redactar el contenido de una página que trata sobre lo siguiente:"),
-            types.Part.from_text(text=rowi["Contenido"]),
-            types.Part.from_text(text="A continuación te indico el número de bloques de texto que debes redactar y el tamaño, en caracteres, de cada uno de ellos:"),
-        ]
-
-        for jdx, len_item in enumerate(length):
-            parts+=[
-                types.Part.from_text(text=f"\t Bloque # {jdx+1}"),
-                types.Part.from_text(text=f"\t\t Longitud aproximada:  {len_item} caracteres.")
+            bloques.append(planificador.tarea(
+                lambda contenido, template, rowi=rowi: redactar_bloques(contenido, componentes_plantilla(rowi["Tipo Plantilla"], template), NIVEL_ACADEMICO),
+                contenido,
+                plantilla,
+                nombre=f"bloques página {rowi['Página']}",
+            ))
+            ultima_pagina_seccion[secciones[idx]] = idx
+            paginas.append(contenido)
+            plantillas.append(plantilla)
+
+        #Los ejemplos e imágenes de una página dependen de los componentes de su plantilla, así que se registran en cuanto se
+        #conoce su plantilla (mientras tanto, el planificador sigue redactando los bloques de texto de las páginas ya resueltas):
+        html_components=[None]*len(filas)
+        ejemplos=[None]*len(filas)
+        imagenes=[None]*len(filas)
+        indices = {plantilla: idx for idx, plantilla in enumerate(plantillas)}
+        for plantilla in as_completed(plantillas):
+            idx = indices[plantilla]
+            rowi = filas[idx]
+            html_components[idx] = componentes_plantilla(rowi["Tipo Plantilla"], plantilla.result())
+            no_ejemplos = sum(1 for component in html_components[idx] if "ejemplo" in component)
+            ejemplos[idx] = [
+                planificador.tarea(
+                    lambda text_content, idx=idx, kdx=kdx: redactar_ejemplo(textos_para_ejemplos(html_components[idx], text_content)[kdx], NIVEL_ACADEMICO),
+                    bloques[idx],
+                    nombre=f"ejemplo {kdx+1} página {rowi['Página']}",
+                )
+                for kdx in range(no_ejemplos)
             ]
-
-        parts+=[
-            types.Part.from_text(text="El contenido debe estar redactado en formato html puro sin reglas CSS ni estilos adicionales."),
-            types.Part.from_text(text="Únicamente podrás redactar con las etiquetas HTML que te indique a continuación: <p>, <ul>, <li>, <ol>, <b>, <i>"),
-            types.Part.from_text(text="Tu tarea:"),
-            types.Part.from_text(text=f"Redacta el contenido de los {len(length)} bloques de texto en formato html siguiendo las instrucciones anteriormente indicadas"),
-        ]
-
-        contents = [
-            types.Content(
-                role="user",
-                parts=parts
+            #Cada imagen solo espera a los ejemplos que aparecen antes que ella (o junto a ella) en la plantilla:
+            imagenes[idx]=[]
+            for posicion, component in enumerate(html_components[idx]):
+                if "imagen" in component:
+                    anteriores = html_components[idx][:posicion+1]
+                    no_ejemplos_anteriores = sum(1 for c in anteriores if "ejemplo" in c)
+                    imagenes[idx].append(planificador_imagenes.tarea(
+                        lambda text_content, *sample_content, anteriores=anteriores: generar_imagen(*textos_para_imagenes(anteriores, text_content, list(sample_content))[-1], NIVEL_ACADEMICO),
+                        bloques[idx],
+                        *ejemplos[idx][:no_ejemplos_anteriores],
+                        nombre=f"imagen {len(imagenes[idx])+1} página {rowi['Página']}",
+                    ))
+        templates = [plantilla.result() for plantilla in plantillas]
+
+        #Cada QR explica todos los bloques de texto redactados desde el QR anterior (aunque pertenezcan a páginas distintas).
+        #En cuanto están sus bloques, se encola el trabajo que redacta la explicación y genera su audio:
+        qr_count=0
+        keep_content=[]
+        audio_ids=[[] for _ in filas]
+        audios_encolados=[]
+        for idx, rowi in enumerate(filas):
+            texto_component_index=0
+            for component in html_components[idx]:
+                if "texto" in component:
+                    keep_content.append((idx, texto_component_index))
+                    texto_component_index+=1
+                elif component == "qr":
+                    qr_count+=1
+                    audio_ids[idx].append(f"{document_id}_{qr_count}")
+                    paginas_qr = list(dict.fromkeys(jdx for jdx, _ in keep_content))
+                    audios_encolados.append(planificador.tarea(
+                        lambda *text_contents, paginas_qr=paginas_qr, keep_content=keep_content, numero=qr_count: COLA_AUDIOS.encolar(
+                            document_id,
+                            numero,
+                            f"{document_id}_{numero}",
+                            lambda: redactar_explicacion("".join(dict(zip(paginas_qr, text_contents))[jdx][kdx] for jdx, kdx in keep_content), NIVEL_ACADEMICO),
+                        ),
+                        *[bloques[jdx] for jdx in paginas_qr],
+                        nombre=f"audio QR {qr_count}",
+                    ))
+                    keep_content=[]
+
+        #Se genera el contenido HTML (esperando, página a página, a que estén listos sus textos, ejemplos e imágenes):
+        html_content=F"<!doctype html><html lang=\"es\"><head>{CSS_RULES}</head><body><div class=\"dina4\">"
+        for idx, rowi in enumerate(filas):
+            html_content+=componer_pagina(
+                rowi,
+                html_components[idx],
+                bloques[idx].result(),
+                [ejemplo.result() for ejemplo in ejemplos[idx]],
+                [imagen.result() for imagen in imagenes[idx]],
+                audio_ids[idx],
+                ASIGNATURA,
+                NIVEL_ACADEMICO,
             )
-        ]
-
-        if "3.0" in model:
-            time.sleep(60)
-        response = client.models.generate_content(
-            model=model,
-            contents=contents,
-            config=generate_content_config
-        )
-
-        output=response.candidates[0].content.parts[0].text
-        output = json.loads(output)
-
-        text_content=[]
-        for jdx, text_item in enumerate(length):
-            text_content.append(output.get("text"+str(jdx+1)))
-
-        #Lo siguiente que hacemos es redactar los ejemplos y para ello tenemos que saber lo que se ha hablado anteriormente:
-        texto_component_index=0
-        written_text=""
-        sample_content=[]
-        for component in html_components:
-            if "texto" in component:
-                written_text += text_content[texto_component_index]   
-                keep_content += text_content[texto_component_index]
-                texto_component_index+=1
-            elif "ejemplo" in component:
-
-                soup = BeautifulSoup(written_text, "html.parser")
-                written_text = soup.get_text(" ", strip=True)
-
-                model = "gemini-2.5-pro"
-
-                generate_content_config = types.GenerateContentConfig(
-                    temperature = 1,
-                    top_p = 0.95,
-                    seed = 0,
-                    max_output_tokens = 65535,
-                    safety_settings = [
-                        types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
-                        types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
-                        types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
-                        types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
-                    ],
-                    thinking_config=types.ThinkingConfig(thinking_budget=-1),
-                    response_mime_type = "application/json",
-                    response_schema = {"type":"OBJECT","properties":{"ejemplo":{"type":"STRING","description":"Ejemplo que se incluirá en el documento formativo."}},"required":["ejemplo"]},
-                )
+        html_content+="</div></body></html>"
 
-                parts=[
-                    types.Part.from_text(text=f"Eres un editor de contenido formativo para alumnos de {NIVEL_ACADEMICO}."),
-                    types.Part.from_text(text="Te han encomentado la tarea de redactar un ejemplo que permita a los alumnos entender los siguientes fragmentos que aparecen en el contenido formativo principal:"),
-                    types.Part.from_text(text=written_text),
-                    types.Part.from_text(text="El contenido debe estar redactado en formato html puro sin reglas CSS ni estilos adicionales."),
-                    types.Part.from_text(text="Únicamente podrás redactar con las etiquetas HTML que te indique a continuación: <p>, <ul>, <li>, <ol>, <b>, <i>"),
-                    types.Part.from_text(text="Tu tarea:"),
-                    types.Part.from_text(text=f"Redacta el contenido del ejemplo en base al contenido principal deltexto en formato html siguiendo las instrucciones anteriormente indicadas")
-                ]
-
-                contents = [
-                    types.Content(
-                        role="user",
-                        parts=parts
-                    )
-                ]
-
-                if "3.0" in model:
-                    time.sleep(60)
-                response = client.models.generate_content(
-                    model=model,
-                    contents=contents,
-                    config=generate_content_config
-                )
+        #Antes de cerrar el planificador se espera a que estén encolados todos los audios (no a que se generen): la tarea que los
+        #encola se lanza desde el callback de sus bloques, que puede ejecutarse después de que componer_pagina haya obtenido su resultado:
+        for audio_encolado in audios_encolados:
+            audio_encolado.result()
 
-                output=response.candidates[0].content.parts[0].text
-                output = json.loads(output)
-                sample_content.append(output.get("ejemplo"))
-                written_text+=""
-
-            elif component == "qr":
-
-                soup = BeautifulSoup(keep_content, "html.parser")
-                keep_content = soup.get_text(" ", strip=True)
-
-                model = "gemini-2.5-pro"
-
-                generate_content_config = types.GenerateContentConfig(
-                    temperature = 1,
-                    top_p = 0.95,
-                    seed = 0,
-                    max_output_tokens = 65535,
-                    safety_settings = [
-                        types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
-                        types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
-                        types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
-                        types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
-                    ],
-                    thinking_config=types.ThinkingConfig(thinking_budget=-1),
-                    response_mime_type = "application/json",
-                    response_schema = {"type":"OBJECT","properties":{"explicacion":{"type":"STRING","description":"Explicación del contenido del bloque formativo"}},"required":["explicacion"]},
-                )
-
-                parts=[
-                    types.Part.from_text(text=f"Eres un locutor de contenido formativo para alumnos de {NIVEL_ACADEMICO} llamado Luca."),
-                    types.Part.from_text(text="Te han encomentado la tarea de exlicar el siguiente fragmento de texto a un alumno para que lo comprenda:"),
-                    types.Part.from_text(text=keep_content),
-                    types.Part.from_text(text="Tu tarea:"),
-                    types.Part.from_text(text=f"Proporciona una explicación breve pero cocisa sobre el contenido formativo anteriormente indicado para que un alumno de {NIVEL_ACADEMICO} pueda comprenderlo mejor."),
-                    types.Part.from_text(text="Importante:"),
-                    types.Part.from_text(text="DEBES explicar todo el contenido relevante del bloque formativo sin dejarte información."),
-                ]
-
-                contents = [
-                    types.Content(
-                        role="user",
-                        parts=parts
-                    )
-                ]
-
-                if "3.0" in model:
-                    time.sleep(60)
-                response = client.models.generate_content(
-                    model=model,
-                    contents=contents,
-                    config=generate_content_config
-                )
+    temario_plantillas["Contenido"] = [pagina.result() for pagina in paginas]
+    temario_plantillas["Diapositiva"] = templates
 
-                output=response.candidates[0].content.parts[0].text
-                output = json.loads(output)
-                explicacion= output.get("explicacion")
-
-            
-                audio = elevenLabclient.text_to_speech.convert(
-                    text=explicacion,
-                    voice_id=ELEVENLABS_VOICE_ID,
-                    model_id=ELEVENLABS_MODEL_ID,
-                    output_format="mp3_44100_128",
-                    language_code = "es"
-                )
-
-                qr_count+=1
-                audio_document = Path(f"{AUDIOS_FOLDER_NAME}/Audio_{qr_count}.mp3")
-                if audio_document.exists():
-                        audio_document.unlink(missing_ok=True)
-                with open(f"{AUDIOS_FOLDER_NAME}/Audio_{qr_count}.mp3", "wb") as f:
-                    if isinstance(audio, (bytes, bytearray)):
-                        f.write(audio)
-                    else:
-                        for chunk in audio:
-                            f.write(chunk)
-
-                keep_content = ""
-
-
-        #Por último se generarán las imágenes necesarias, y para ello:
-        texto_component_index=0
-        sample_component_index=0
-        written_text=""
-        image_content=[]
-        for component in html_components:
-            if "texto" in component and not "imagen" in component:
-                written_text+=text_content[texto_component_index]
-                texto_component_index+=1
-            elif "ejemplo" in component and not "imagen" in component:
-                written_text+=sample_content[sample_component_index]
-                sample_component_index+=1
-            elif component == "imagen_texto" or component == "texto_imagen":
-                written_text=text_content[texto_component_index]
-                texto_component_index+=1
-            elif component == "imagen_ejemplo" or component == "ejemplo_imagen":
-                written_text=sample_content[sample_component_index]
-                sample_component_index+=1
-            
-            if "imagen" in component:
-
-                soup = BeautifulSoup(written_text, "html.parser")
-                written_text = soup.get_text(" ", strip=True)
-
-                model = "gemini-2.5-flash-image"
-
-                parts=[
-                    types.Part.from_text(text=f"Eres un editor gráfico que elabora ilustraciones para contenido formativo para alumnos de {NIVEL_ACADEMICO}."),
-                    types.Part.from_text(text="Te han encomentado la tarea de ilustrar una imagen relacionada con el siguiente bloque de texto de una unidad formativa:"),
-                    types.Part.from_text(text=written_text),
-                    types.Part.from_text(text="Para llevar esta tarea a cabo tomas como referencia las siguientes instrucciones gráficas:"),
-                    types.Part.from_text(text=IMAGE_PROMPTING),
-                ]
-            
-                parts+=[
-                    types.Part.from_text(text="Muy importante:"),
-                    types.Part.from_text(text="- El contenido de la imagen generada NO debe contener letras ni números. Si tiene un solo carácter alfanumérico."),
-                    types.Part.from_text(text="Repito, NADA de letras o números en la imagen."),
-                ]
-
-                contents = [
-                    types.Content(
-                        role="user",
-                        parts=parts
-                    )
-                ]
-
-                if component == "imagen":
-                    aspect_ratio = "16:9"
-                else:
-                    aspect_ratio = "1:1"
-
-                generate_content_config = types.GenerateContentConfig(
-                    temperature = 1,
-                    top_p = 0.95,
-                    max_output_tokens = 32768,
-                    response_modalities = ["IMAGE"],
-                    safety_settings = [
-                        types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
-                        types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
-                        types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
-                        types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
-                    ],
-                    image_config=types.ImageConfig(aspect_ratio=aspect_ratio,image_size="1K",output_mime_type="image/png",),
-                )
-
-                if "3.0" in model:
-                    time.sleep(60)
-                response = client.models.generate_content(
-                    model=model,
-                    contents=contents,
-                    config=generate_content_config
-                )
-
-                output=response.candidates[0].content.parts[0].inline_data
-                b64_string = base64.b64encode(output.data).decode("ascii")
-                image_content.append(b64_string)
-                written_text = ""
-
-        #Lo siguiente será transcribirlo:
-        texto_component_index=0
-        sample_component_index=0
-        image_component_index=0
-        qr_component_index=0
-        for component in html_components:
-            if component == "cabecera":
-                html_content+=HTML_COMPONENTS[component]["html"].replace("#asignatura#",ASIGNATURA).replace("#nivel_academico#",NIVEL_ACADEMICO)
-            elif component == "unidad":
-                html_content+=HTML_COMPONENTS[component]["html"].replace("#content#",rowi["Unidad"])
-            elif component == "capitulo":
-                html_content+=HTML_COMPONENTS[component]["html"].replace("#content#",rowi["Capítulo"])
-            elif component == "seccion":
-                html_content+=HTML_COMPONENTS[component]["html"].replace("#content#",rowi["Sección"])
-            elif component == "texto":
-                html_content+=HTML_COMPONENTS[component]["html"].replace("#content#",text_content[texto_component_index])
-                texto_component_index+=1
-            elif component == "ejemplo":
-                html_content+=HTML_COMPONENTS[component]["html"].replace("#content#",sample_content[sample_component_index])
-                sample_component_index+=1
-            elif component == "imagen":
-                html_content+=HTML_COMPONENTS[component]["html"].replace("#base64_image#",str(image_content[image_component_index]))
-                image_component_index+=1
-            elif component == "imagen_texto" or component == "texto_imagen":
-                html_content+=HTML_COMPONENTS[component]["html"].replace("#base64_image#",str(image_content[image_component_index])).replace("#content#",text_content[texto_component_index])
-                texto_component_index+=1
-                image_component_index+=1
-            elif component == "imagen_ejemplo" or component == "ejemplo_imagen":
-                html_content+=HTML_COMPONENTS[component]["html"].replace("#base64_image#",str(image_content[image_component_index])).replace("#content#",sample_content[sample_component_index])
-                sample_component_index+=1
-                image_component_index+=1
-            elif component == "qr":
-                qr_component_index+=1
-                url = "https://127.0.0.1/audios/" + str(qr_component_index) + ".mp3"
-                qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M,box_size=10,border=4,)
-                qr.add_data(url)
-                qr.make(fit=True)
-                img = qr.make_image(fill_color="black", back_color="white").convert("RGBA")
-                pixels = img.getdata()
-                new_pixels = []
-                for r, g, b, a in pixels:
-                    if (r, g, b) == (255, 255, 255):
-                        new_pixels.append((255, 255, 255, 0))
-                    else:
-                        new_pixels.append((r, g, b, 255))
-                img.putdata(new_pixels)
-                buf = BytesIO()
-                img.save(buf, format="PNG")
-                b64_string = base64.b64encode(buf.getvalue()).decode("utf-8")
-                html_content+=HTML_COMPONENTS[component]["html"].replace("#qr_image#",b64_string)
-    html_content+="</div></body></html>"
-
-    document_id = random.randint(1, 10000000)
     with open(f"{DOCUMENTS_FOLDER_NAME}/Document_{document_id}.html", "w", encoding="utf-8") as f:
         f.write(html_content)
 
@@ -0,0 +1,96 @@
+#Planificador de tareas con dependencias (DAG) para la generación de contenido.
+#Cada tarea se lanza en cuanto terminan todas sus dependencias y recibe sus resultados como argumentos (en el mismo orden).
+#Los planificadores con el mismo nombre comparten un único ThreadPoolExecutor para todo el proceso, de forma que el número de
+#llamadas simultáneas (Gemini, ElevenLabs, ...) nunca supera su max_workers aunque se atiendan varias peticiones a la vez.
+#Una tarea puede depender de futuros de otro planificador, lo que permite tener etapas con su propio pool (por ejemplo, la
+#generación de imágenes, limitada por IMAGENES_MAX_CONCURRENCIA).
+
+#Se cargan las librerías:
+import os
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+CONTENIDO_MAX_CONCURRENCIA = int(os.getenv("CONTENIDO_MAX_CONCURRENCIA", "8"))
+IMAGENES_MAX_CONCURRENCIA = int(os.getenv("IMAGENES_MAX_CONCURRENCIA", "4"))
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+#Se obtiene el pool compartido de un nombre (se crea con max_workers la primera vez que se pide):
+def executor_compartido(nombre, max_workers):
+    with _executors_lock:
+        if nombre not in _executors:
+            _executors[nombre] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=nombre)
+        return _executors[nombre]
+
+class PlanificadorTareas:
+
+    def __init__(self, max_workers=CONTENIDO_MAX_CONCURRENCIA, nombre="contenido"):
+        self._executor = executor_compartido(nombre, max_workers)
+        self._futuros = []
+        self._cerrado = False
+
+    #Se registra una tarea que se ejecutará cuando terminen sus dependencias (futuros de otras tareas).
+    #Si alguna dependencia falla, la tarea no se ejecuta y su futuro recibe la misma excepción:
+    def tarea(self, funcion, *dependencias, nombre=None):
+        futuro = Future()
+        pendientes = [len(dependencias)]
+        lock = threading.Lock()
+
+        def ejecutar(argumentos):
+            if not futuro.set_running_or_notify_cancel():
+                return
+            try:
+                futuro.set_result(funcion(*argumentos))
+            except BaseException as e:
+                logger.exception("Error en la tarea %s", nombre or getattr(funcion, "__name__", funcion))
+                futuro.set_exception(e)
+
+        def lanzar():
+            try:
+                argumentos = [dependencia.result() for dependencia in dependencias]
+            except BaseException as e:
+                if futuro.set_running_or_notify_cancel():
+                    futuro.set_exception(e)
+                return
+            #El planificador ya se ha cerrado (por ejemplo, tras un error en otra tarea):
+            if self._cerrado:
+                if futuro.set_running_or_notify_cancel():
+                    futuro.set_exception(RuntimeError("El planificador de tareas está cerrado"))
+                return
+            self._executor.submit(ejecutar, argumentos)
+
+        def dependencia_terminada(_):
+            with lock:
+                pendientes[0] -= 1
+                listo = pendientes[0] == 0
+            if listo:
+                lanzar()
+
+        self._futuros.append(futuro)
+        if not dependencias:
+            lanzar()
+        for dependencia in dependencias:
+            dependencia.add_done_callback(dependencia_terminada)
+        return futuro
+
+    #Se cierra el planificador (el pool compartido sigue abierto para el resto de peticiones). Si cancelar es True se descartan
+    #sus tareas que todavía no han empezado; si no, se espera a que terminen todas:
+    def cerrar(self, cancelar=False):
+        if cancelar:
+            self._cerrado = True
+            for futuro in self._futuros:
+                futuro.cancel()
+        else:
+            wait(self._futuros)
+            self._cerrado = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar(cancelar=tipo is not None)
@@ -0,0 +1,91 @@
+#Registro en memoria (de solo lectura) de las imágenes de las plantillas, que se usan para escoger la plantilla de cada página.
+#   - Las imágenes se leen de disco una sola vez, al arrancar el servicio, y las partes del prompt se construyen también una sola vez.
+#   - Si PLANTILLAS_CACHE_MODELO está activo, las imágenes de cada tipo de plantilla se registran una única vez como contexto
+#     en caché de Gemini (client.caches) y las llamadas posteriores solo envían su referencia (cached_content). Si la caché no
+#     se puede crear (por ejemplo, por no alcanzar el mínimo de tokens del modelo), se envían las partes en memoria.
+
+#Se cargan las librerías:
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from types import MappingProxyType
+
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+TEMPLATES_FOLDER_NAME = os.getenv("TEMPLATES_FOLDER_NAME", "plantillas")
+PLANTILLAS_CACHE_MODELO = os.getenv("PLANTILLAS_CACHE_MODELO", "true").lower() == "true"
+PLANTILLAS_CACHE_TTL_MINUTOS = int(os.getenv("PLANTILLAS_CACHE_TTL_MINUTOS", "60"))
+
+#Se leen de disco las imágenes de todas las plantillas: {tipo de plantilla: ((nombre, bytes), ...)}:
+def cargar_plantillas(carpeta=TEMPLATES_FOLDER_NAME):
+    plantillas = {}
+    for tipo in sorted(p for p in Path(carpeta).iterdir() if p.is_dir()):
+        ficheros = sorted(p for p in tipo.iterdir() if p.is_file() and p.suffix.lower() == ".jpg")
+        plantillas[tipo.name] = tuple((fichero.name, fichero.read_bytes()) for fichero in ficheros)
+    return MappingProxyType(plantillas)
+
+class RegistroPlantillas:
+
+    def __init__(self, carpeta=TEMPLATES_FOLDER_NAME, usar_cache=PLANTILLAS_CACHE_MODELO, ttl_minutos=PLANTILLAS_CACHE_TTL_MINUTOS):
+        self.plantillas = cargar_plantillas(carpeta)
+        self.usar_cache = usar_cache
+        self.ttl_minutos = ttl_minutos
+        self._partes = MappingProxyType({
+            tipo: tuple(
+                parte
+                for nombre, imagen in imagenes
+                for parte in (types.Part.from_text(text=f"{nombre}:"), types.Part.from_bytes(data=imagen, mime_type="image/jpg"))
+            )
+            for tipo, imagenes in self.plantillas.items()
+        })
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    #Se obtienen los nombres de las plantillas de un tipo:
+    def nombres(self, tipo):
+        return [nombre for nombre, _ in self.plantillas[tipo]]
+
+    #Se obtienen las partes del prompt con el nombre y la imagen de cada plantilla de un tipo:
+    def partes(self, tipo):
+        return list(self._partes[tipo])
+
+    #Se obtiene el nombre de la caché de Gemini con las plantillas de un tipo (creándola si no existe o ha caducado).
+    #Devuelve None si la caché está desactivada o no se ha podido crear (en cuyo caso no se vuelve a intentar):
+    def cache(self, client, modelo, tipo):
+        if not self.usar_cache:
+            return None
+        with self._lock:
+            nombre, caduca = self._caches.get((modelo, tipo), (None, 0))
+            if nombre is False:
+                return None
+            if nombre and caduca > time.time():
+                return nombre
+            try:
+                cache = client.caches.create(
+                    model=modelo,
+                    config=types.CreateCachedContentConfig(
+                        display_name=f"plantillas {tipo}",
+                        contents=[types.Content(role="user", parts=[
+                            types.Part.from_text(text="Listado de plantillas de entre las que se puede escoger (cada imagen va precedida del nombre de su plantilla):"),
+                            *self._partes[tipo],
+                        ])],
+                        ttl=f"{self.ttl_minutos * 60}s",
+                    ),
+                )
+            except Exception as e:
+                logger.warning("No se ha podido crear la caché de las plantillas %s (%s); se enviarán las imágenes en cada llamada", tipo, e)
+                self._caches[(modelo, tipo)] = (False, 0)
+                return None
+            #Se renueva un minuto antes de que caduque para no referenciar una caché ya eliminada:
+            self._caches[(modelo, tipo)] = (cache.name, time.time() + self.ttl_minutos * 60 - 60)
+            return cache.name
+
+    #Se descarta la caché de un tipo (por ejemplo, si una llamada que la referencia falla):
+    def descartar(self, modelo, tipo):
+        with self._lock:
+            self._caches.pop((modelo, tipo), None)
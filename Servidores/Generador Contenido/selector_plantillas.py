@@ -0,0 +1,131 @@
+#Selección local (determinista) de la plantilla de cada página, con la IA como respaldo.
+#Cada diseño de config/html.json se puntúa frente a unas características sencillas del contenido de la página:
+#   - Su extensión, comparada con la capacidad de texto del diseño (suma de text_lengths de sus componentes de texto).
+#   - Si el contenido se presta a una imagen (estructuras, procesos, partes, ...) y si el diseño tiene imagen.
+#   - Si el contenido se presta a un ejemplo (casos, aplicaciones, cálculos, ...) y si el diseño tiene ejemplo.
+#Si la diferencia entre los dos mejores diseños es menor que SELECTOR_PLANTILLAS_CONFIANZA_MINIMA se consulta a la IA.
+#Las decisiones (locales o de la IA) se memorizan por el hash del contenido.
+
+#Se cargan las librerías:
+import os
+import re
+import math
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+#"local": selección local y la IA solo si la confianza es baja; "ia": siempre la IA:
+SELECTOR_PLANTILLAS_MODO = os.getenv("SELECTOR_PLANTILLAS_MODO", "local")
+SELECTOR_PLANTILLAS_CONFIANZA_MINIMA = float(os.getenv("SELECTOR_PLANTILLAS_CONFIANZA_MINIMA", "0.1"))
+SELECTOR_PLANTILLAS_MAX_ENTRADAS = int(os.getenv("SELECTOR_PLANTILLAS_MAX_ENTRADAS", "1024"))
+
+#Extensión (en caracteres) a partir de la cual se considera que una página tiene el máximo de contenido:
+CARACTERES_PAGINA_MAX = 12000
+#Número de indicios (por cada 1000 palabras) a partir del cual se considera seguro que el contenido necesita imagen o ejemplo:
+INDICIOS_SATURACION = 6
+PESOS = {"extension": 1.0, "imagen": 1.0, "ejemplo": 1.0}
+
+INDICIOS_IMAGEN = [
+    "estructura", "partes", "parte", "forma", "formas", "esquema", "diagrama", "ciclo", "proceso", "fases", "etapas",
+    "anatomia", "organo", "organos", "aspecto", "color", "colores", "tamano", "mapa", "figura", "ilustracion",
+    "representa", "capas", "cuerpo", "observa", "observar", "grafico", "apariencia", "esqueleto",
+]
+INDICIOS_EJEMPLO = [
+    "por ejemplo", "ejemplo", "ejemplos", "caso", "casos", "imagina", "supongamos", "vida cotidiana", "ejercicio",
+    "calculo", "aplicacion", "aplicaciones", "practica", "como el", "como la", "como los", "como las",
+]
+
+#Se normaliza un texto (minúsculas y sin tildes) para buscar los indicios:
+def normalizar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+#Se estima (de 0 a 1) cuánto se presta un texto a un tipo de componente, por la densidad de indicios en él:
+def probabilidad_indicios(texto, indicios):
+    palabras = max(len(texto.split()), 1)
+    ocurrencias = sum(len(re.findall(rf"\b{re.escape(indicio)}\b", texto)) for indicio in indicios)
+    return min(1.0, ocurrencias * 1000 / palabras / INDICIOS_SATURACION)
+
+#Se extraen las características del contenido de una página:
+def caracteristicas_contenido(contenido):
+    texto = normalizar(contenido)
+    return {
+        "extension": min(1.0, len(" ".join(texto.split())) / CARACTERES_PAGINA_MAX),
+        "imagen": probabilidad_indicios(texto, INDICIOS_IMAGEN),
+        "ejemplo": probabilidad_indicios(texto, INDICIOS_EJEMPLO),
+    }
+
+class SelectorPlantillas:
+
+    #nombres(tipo) devuelve los nombres de las plantillas disponibles de un tipo (DiapositivaN.JPG):
+    def __init__(self, html_json, html_components, nombres, modo=SELECTOR_PLANTILLAS_MODO, confianza_minima=SELECTOR_PLANTILLAS_CONFIANZA_MINIMA, max_entradas=SELECTOR_PLANTILLAS_MAX_ENTRADAS):
+        self.html_json = html_json
+        self.html_components = html_components
+        self.nombres = nombres
+        self.modo = modo
+        self.confianza_minima = confianza_minima
+        self.max_entradas = max_entradas
+        self._decisiones = OrderedDict()
+        self._estadisticas = {"locales": 0, "ia": 0, "memorizadas": 0}
+        self._lock = threading.Lock()
+
+    #Se obtienen las características de cada diseño de un tipo de plantilla: {nombre: (capacidad, imagen, ejemplo)}:
+    def disenos(self, tipo):
+        disenos = {}
+        for nombre in self.nombres(tipo):
+            componentes = self.html_json[tipo][nombre.lower().replace("diapositiva","").replace(".jpg","")]
+            capacidad = sum(sum(self.html_components[c].get("text_lengths", [])) for c in componentes if "texto" in c)
+            disenos[nombre] = (capacidad, any("imagen" in c for c in componentes), any("ejemplo" in c for c in componentes))
+        return disenos
+
+    #Se puntúan los diseños de un tipo de plantilla frente al contenido. Devuelve [(puntuación, nombre)] de mayor a menor:
+    def puntuar(self, tipo, contenido):
+        caracteristicas = caracteristicas_contenido(contenido)
+        disenos = self.disenos(tipo)
+        capacidad_max = max((capacidad for capacidad, _, _ in disenos.values()), default=0) or 1
+        puntuaciones = []
+        for nombre, (capacidad, imagen, ejemplo) in disenos.items():
+            puntuacion = PESOS["extension"] * (1 - abs(capacidad / capacidad_max - caracteristicas["extension"]))
+            puntuacion += PESOS["imagen"] * (1 - abs(float(imagen) - caracteristicas["imagen"]))
+            puntuacion += PESOS["ejemplo"] * (1 - abs(float(ejemplo) - caracteristicas["ejemplo"]))
+            puntuaciones.append((puntuacion / sum(PESOS.values()), nombre))
+        #En caso de empate se prefiere la primera plantilla (orden de los ficheros), para que la selección sea determinista:
+        orden = {nombre: i for i, nombre in enumerate(disenos)}
+        return sorted(puntuaciones, key=lambda p: (-p[0], orden[p[1]]))
+
+    #Se escoge la plantilla de una página; escoger_con_ia() se llama solo si la selección local no es suficientemente fiable:
+    def escoger(self, tipo, contenido, escoger_con_ia):
+        clave = hashlib.sha256(f"{tipo}\n{contenido}".encode("utf-8")).hexdigest()
+        with self._lock:
+            if clave in self._decisiones:
+                self._decisiones.move_to_end(clave)
+                self._estadisticas["memorizadas"] += 1
+                return self._decisiones[clave]
+
+        plantilla = None
+        if self.modo == "local":
+            puntuaciones = self.puntuar(tipo, contenido)
+            confianza = puntuaciones[0][0] - puntuaciones[1][0] if len(puntuaciones) > 1 else math.inf
+            if confianza >= self.confianza_minima:
+                plantilla = puntuaciones[0][1]
+            else:
+                logger.info("Plantilla %s: confianza local %.3f insuficiente, se consulta a la IA", tipo, confianza)
+        origen = "locales" if plantilla else "ia"
+        if plantilla is None:
+            plantilla = escoger_con_ia()
+
+        with self._lock:
+            self._estadisticas[origen] += 1
+            self._decisiones[clave] = plantilla
+            while len(self._decisiones) > self.max_entradas:
+                self._decisiones.popitem(last=False)
+        return plantilla
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self._estadisticas)
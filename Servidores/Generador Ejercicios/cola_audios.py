@@ -0,0 +1,84 @@
+#Cola de trabajos de audio (ElevenLabs) que se ejecutan en segundo plano.
+#   - Las peticiones devuelven su identificador en cuanto el HTML está listo; los audios se terminan de generar después.
+#   - Como máximo se generan TTS_MAX_CONCURRENCIA audios a la vez y cada trabajo se reintenta hasta TTS_REINTENTOS veces.
+#   - El estado de los audios de cada lote (documento o batería de ejercicios) se puede consultar mientras tanto.
+#   - Los audios se guardan en el almacén de audios (almacen_audios.py), que evita sintetizar dos veces el mismo texto.
+
+#Se cargan las librerías:
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+TTS_MAX_CONCURRENCIA = int(os.getenv("TTS_MAX_CONCURRENCIA", "2"))
+TTS_REINTENTOS = int(os.getenv("TTS_REINTENTOS", "3"))
+TTS_ESPERA_REINTENTO_SEGUNDOS = float(os.getenv("TTS_ESPERA_REINTENTO_SEGUNDOS", "2"))
+TTS_MAX_LOTES = int(os.getenv("TTS_MAX_LOTES", "256"))
+
+class ColaAudios:
+
+    #sintetizar(texto) devuelve el audio (bytes o iterable de fragmentos) generado con ElevenLabs:
+    def __init__(self, sintetizar, almacen, max_workers=TTS_MAX_CONCURRENCIA, reintentos=TTS_REINTENTOS, espera=TTS_ESPERA_REINTENTO_SEGUNDOS, max_lotes=TTS_MAX_LOTES):
+        self.sintetizar = sintetizar
+        self.almacen = almacen
+        self.reintentos = reintentos
+        self.espera = espera
+        self.max_lotes = max_lotes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+        self._lotes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _actualizar(self, lote, clave, **estado):
+        with self._lock:
+            if lote in self._lotes:
+                self._lotes[lote].setdefault(clave, {}).update(estado)
+
+    def _procesar(self, lote, clave, alias, texto):
+        contenido = None
+        for intento in range(1, self.reintentos + 1):
+            self._actualizar(lote, clave, estado="generando", intentos=intento)
+            try:
+                #El texto puede indicarse como una función (por ejemplo, una llamada a Gemini) que se ejecuta dentro del trabajo.
+                #Se genera una sola vez: si falla la síntesis o el guardado, los reintentos reutilizan el mismo texto:
+                if contenido is None:
+                    contenido = texto() if callable(texto) else texto
+                ruta, reutilizado = self.almacen.obtener(contenido, self.sintetizar, alias)
+            except Exception as e:
+                logger.warning("Error generando el audio %s del lote %s (intento %d de %d): %s", clave, lote, intento, self.reintentos, e)
+                if intento == self.reintentos:
+                    self._actualizar(lote, clave, estado="error", error=str(e))
+                    raise
+                time.sleep(self.espera * 2 ** (intento - 1))
+            else:
+                self._actualizar(lote, clave, estado="completado", reutilizado=reutilizado)
+                return ruta
+
+    #Se encola la generación de un audio, que quedará accesible por su alias. Devuelve un futuro con la ruta del fichero:
+    def encolar(self, lote, clave, alias, texto):
+        with self._lock:
+            self._lotes.setdefault(lote, OrderedDict())[clave] = {"audio_id": alias, "estado": "pendiente", "intentos": 0}
+            self._lotes.move_to_end(lote)
+            while len(self._lotes) > self.max_lotes:
+                self._lotes.popitem(last=False)
+        return self._executor.submit(self._procesar, lote, clave, alias, texto)
+
+    #Se obtiene el estado de los audios de un lote (None si no se conoce):
+    def estado(self, lote):
+        with self._lock:
+            if lote not in self._lotes:
+                return None
+            audios = {str(clave): dict(estado) for clave, estado in self._lotes[lote].items()}
+        completados = sum(1 for estado in audios.values() if estado["estado"] == "completado")
+        errores = sum(1 for estado in audios.values() if estado["estado"] == "error")
+        return {
+            "audios": audios,
+            "total": len(audios),
+            "completados": completados,
+            "errores": errores,
+            "terminado": completados + errores == len(audios),
+        }
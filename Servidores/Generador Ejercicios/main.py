@@ -5,22 +5,24 @@ from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
 
 from pydantic import BaseModel, Field
-import pandas as pd
 from google import genai
 import json
 from pathlib import Path
 from google.genai import types
 import base64
 import time
-import qrcode
 from bs4 import BeautifulSoup
-from io import BytesIO
 from elevenlabs.client import ElevenLabs
 import random
 
 #Se lee el fichero .env:
 load_dotenv()
 
+#Se cargan los módulos propios del servicio (leen su configuración del .env al importarse):
+from cola_audios import ColaAudios
+from almacen_audios import AlmacenAudios
+from codigos_qr import generar_qr
+
 #Se inicializa FastAPI:
 app = FastAPI(title="Mi API")
 
@@ -56,6 +58,7 @@ ELEVENLABS_MODEL_ID=os.getenv("ELEVENLABS_MODEL_ID")
 AUDIOS_FOLDER_NAME=os.getenv("AUDIOS_FOLDER_NAME")
 EXERCISES_FOLDER_NAME = os.getenv("EXERCISES_FOLDER_NAME")
 DOCUMENTS_FOLDER_NAME = os.getenv("DOCUMENTS_FOLDER_NAME")
+AUDIO_OUTPUT_FORMAT = "mp3_44100_128"
 
 #Se cargan los diferentes JSON de configuración:
 with open("config/html_components.json", "r", encoding="utf-8") as f:
@@ -72,14 +75,19 @@ elevenLabclient = ElevenLabs(api_key=ELEVENLABS_API_KEY)
 #Se establece la conexión con VertexAI (Google Cloud Platform):
 client = genai.Client(vertexai=True,api_key=GOOGLE_CLOUD_GEMINI_API_KEY)
 
-#Creamos una variable con el Path de la carpetya de audios:
-AUDIO_DIR = Path(f"{AUDIOS_FOLDER_NAME}").resolve()
+#Se inicializa el almacén de audios (direccionado por el hash del texto, la voz, el modelo y el formato):
+ALMACEN_AUDIOS = AlmacenAudios(ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL_ID, AUDIO_OUTPUT_FORMAT, AUDIOS_FOLDER_NAME)
+
+#Se inicializa la cola de audios, que se generan en segundo plano (la petición no espera a que terminen):
+COLA_AUDIOS = ColaAudios(lambda texto: generar_audio(texto), ALMACEN_AUDIOS)
 
 #Se realiza la llamada para descargar archivos:
 @app.get("/audios/{audio_id}")
 def descargar_audio(audio_id: str):
-    audio_name =  f"Audio_{audio_id}.mp3"
-    file_path = (AUDIO_DIR / audio_name).resolve()
+    #El identificador puede ser el alias del audio en una batería de ejercicios ({exercise_id}_{número}) o su clave en el almacén:
+    file_path = ALMACEN_AUDIOS.resolver(audio_id)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="El audio no existe o todavía se está generando.")
     return FileResponse(
         path=str(file_path),
         media_type="application/octet-stream",
@@ -92,6 +100,75 @@ def descargar_ejercicio(exercise_id: str):
     file_path = (Path(EXERCISES_FOLDER_NAME) / exercise_name)
     return file_path.read_text(encoding="utf-8")
 
+#Se consulta el estado de los audios (pistas de los QR) de una batería de ejercicios:
+@app.get("/exercises/{exercise_id}/audios")
+def estado_audios(exercise_id: int):
+    estado = COLA_AUDIOS.estado(exercise_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="No hay audios en curso para esos ejercicios.")
+    return JSONResponse(content={"exercise_id": exercise_id, **estado})
+
+#Se genera, con Gemini, una pista para resolver el ejercicio indicado:
+def generar_pista(ejercicio_txt, nivel_academico, document_base64):
+
+    model = "gemini-2.5-flash"
+    generate_content_config = types.GenerateContentConfig(
+        temperature = 1,
+        top_p = 0.95,
+        seed = 0,
+        max_output_tokens = 65535,
+        safety_settings = [
+            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
+        ],
+        response_mime_type = "application/json",
+        response_schema = {"type":"OBJECT","properties":{"hint":{"type":"STRING","description":"Pista para la resolución del ejercicio planteado al alumno."}},"required":["hint"]},
+    )
+
+    parts=[
+            types.Part.from_text(text=f"Eres Luca, una profesora en educación secundaria que está ayudando a un alumno de {nivel_academico} a resolver el siguiente ejercicio."),
+            types.Part.from_text(text=ejercicio_txt),
+            types.Part.from_text(text=f"La respuesta a dicho ejercicio debería encontrarse en el siguiente documento PDF (contenido formativo):"),
+            types.Part.from_bytes(data=base64.b64decode(document_base64),mime_type="application/pdf"),
+            types.Part.from_text(text="Tu tarea"),
+            types.Part.from_text(text="- Presentate al usuario como su profesora, Luca."),
+            types.Part.from_text(text="- Proporciona una pista breve y concisa que ayude al alumno a resolver el ejercicio."),
+            types.Part.from_text(text="Importante"),
+            types.Part.from_text(text="- La pista debe hacer reflexionar al alumno hasta encontrar la respuesta por sus propios medios."),
+    ]
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=parts
+        )
+    ]
+
+    if "3.0" in model:
+        time.sleep(60)
+    response = client.models.generate_content(
+        model=model,
+        contents=contents,
+        config=generate_content_config
+    )
+
+    output=response.candidates[0].content.parts[0].text
+    output = json.loads(output)
+    return output.get("hint")
+
+#Se convierte la pista en audio (ElevenLabs); la cola de audios se encarga de guardarlo:
+def generar_audio(hint):
+
+    return elevenLabclient.text_to_speech.convert(
+        text=hint,
+        voice_id=ELEVENLABS_VOICE_ID,
+        model_id=ELEVENLABS_MODEL_ID,
+        output_format=AUDIO_OUTPUT_FORMAT,
+        language_code = "es"
+    )
+
 # Se realiza la llamada principal
 @app.post("/generar_ejercicios")
 def generar_ejercicios(req: ExercisesRequest):
@@ -103,6 +180,7 @@ def generar_ejercicios(req: ExercisesRequest):
     UNIDAD = req.unidad
     INTERESES_ALUMNO = req.intereses
     DOCUMENT_ID = req.document_id
+    exercise_id = random.randint(1, 10000000)
 
     #Cragamos el documento especificado:
     document_pdf_path = Path(f"{DOCUMENTS_FOLDER_NAME}/Documento_{DOCUMENT_ID}.pdf")
@@ -184,73 +262,15 @@ def generar_ejercicios(req: ExercisesRequest):
         ejercicios.append(exercise)
         ejercicios_txt.append(exercise_text)
     
-    #A continuación generamos unas pistas en formato audio con Gemini-2.5-Flash e ElevenLabs:
-    model = "gemini-2.5-flash"
-    generate_content_config = types.GenerateContentConfig(
-        temperature = 1,
-        top_p = 0.95,
-        seed = 0,
-        max_output_tokens = 65535,
-        safety_settings = [
-            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
-        ],
-        response_mime_type = "application/json",
-        response_schema = {"type":"OBJECT","properties":{"hint":{"type":"STRING","description":"Pista para la resolución del ejercicio planteado al alumno."}},"required":["hint"]},
-    )
-
+    #A continuación generamos unas pistas en formato audio con Gemini-2.5-Flash e ElevenLabs (en segundo plano, en la cola de audios):
     for idx, ejercicio_txt in enumerate(ejercicios_txt):
-        parts=[
-                types.Part.from_text(text=f"Eres Luca, una profesora en educación secundaria que está ayudando a un alumno de {NIVEL_ACADEMICO} a resolver el siguiente ejercicio."),
-                types.Part.from_text(text=ejercicio_txt),
-                types.Part.from_text(text=f"La respuesta a dicho ejercicio debería encontrarse en el siguiente documento PDF (contenido formativo):"),
-                types.Part.from_bytes(data=base64.b64decode(DOCUMENT_BASE64),mime_type="application/pdf"),
-                types.Part.from_text(text="Tu tarea"),
-                types.Part.from_text(text="- Presentate al usuario como su profesora, Luca."),
-                types.Part.from_text(text="- Proporciona una pista breve y concisa que ayude al alumno a resolver el ejercicio."),
-                types.Part.from_text(text="Importante"),
-                types.Part.from_text(text="- La pista debe hacer reflexionar al alumno hasta encontrar la respuesta por sus propios medios."),
-        ]
-
-        contents = [
-            types.Content(
-                role="user",
-                parts=parts
-            )
-        ]
-
-        if "3.0" in model:
-            time.sleep(60)
-        response = client.models.generate_content(
-            model=model,
-            contents=contents,
-            config=generate_content_config
-        )
-
-        output=response.candidates[0].content.parts[0].text
-        output = json.loads(output)
-        hint = output.get("hint")
-        
-        audio = elevenLabclient.text_to_speech.convert(
-            text=hint,
-            voice_id=ELEVENLABS_VOICE_ID,
-            model_id=ELEVENLABS_MODEL_ID,
-            output_format="mp3_44100_128",
-            language_code = "es"
+        COLA_AUDIOS.encolar(
+            exercise_id,
+            idx+1,
+            f"{exercise_id}_{idx+1}",
+            lambda ejercicio_txt=ejercicio_txt: generar_pista(ejercicio_txt, NIVEL_ACADEMICO, DOCUMENT_BASE64),
         )
 
-        audio_document = Path(f"{AUDIOS_FOLDER_NAME}/Audio_{idx+1}.mp3")
-        if audio_document.exists():
-                audio_document.unlink(missing_ok=True)
-        with open(f"{AUDIOS_FOLDER_NAME}/Audio_{idx+1}.mp3", "wb") as f:
-            if isinstance(audio, (bytes, bytearray)):
-                f.write(audio)
-            else:
-                for chunk in audio:
-                    f.write(chunk)
-
     #Tras esto lo que hacemos es generar el contenido html:
     html_content=f"<!doctype html><html lang=\"es\"><head>{CSS_RULES}</head><body><div class=\"dina4\">"
     exercise_component_index = 0
@@ -267,25 +287,9 @@ def generar_ejercicios(req: ExercisesRequest):
             html_content+=HTML_COMPONENTS[component]["html"].replace("#content#",ejercicios[exercise_component_index])
             exercise_component_index+=1
         elif component == "qr":
-                url = f"http://127.0.0.1:8000/{AUDIOS_FOLDER_NAME}/" + str(exercise_component_index) + ".mp3"
-                qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M,box_size=10,border=4,)
-                qr.add_data(url)
-                qr.make(fit=True)
-                img = qr.make_image(fill_color="black", back_color="white").convert("RGBA")
-                pixels = img.getdata()
-                new_pixels = []
-                for r, g, b, a in pixels:
-                    if (r, g, b) == (255, 255, 255):
-                        new_pixels.append((255, 255, 255, 0))
-                    else:
-                        new_pixels.append((r, g, b, 255))
-                img.putdata(new_pixels)
-                buf = BytesIO()
-                img.save(buf, format="PNG")
-                b64_string = base64.b64encode(buf.getvalue()).decode("utf-8")
-                html_content+=HTML_COMPONENTS[component]["html"].replace("#qr_image#",b64_string)
+                url = ALMACEN_AUDIOS.url(f"{exercise_id}_{exercise_component_index}")
+                html_content+=HTML_COMPONENTS[component]["html"].replace("#qr_image#",generar_qr(url))
     html_content+="</div></body></html>"
-    exercise_id = random.randint(1, 10000000)
     with open(f"{EXERCISES_FOLDER_NAME}/Exercise_{exercise_id}.html", "w", encoding="utf-8") as f:
         f.write(html_content)
 
@@ -0,0 +1,75 @@
+#Se cargan las librerías:
+import json
+from google.genai import types
+
+from concurrencia import llamar_gemini, mapear_en_paralelo, comprobar_cancelacion
+
+#Se evalua, mediante Inteligencia Artificial, el potencial interés que podría tener un grado (su PDF de perfiles profesionales) para el usuario:
+def puntuar_perfil(client, limitador, almacen, intereses, perfil_profesional):
+
+    model = "gemini-2.5-flash"
+
+    document = almacen.parte(perfil_profesional)
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text="Actúa como un orientador vocacional experto en formación profesional y análisis de perfiles laborales."),
+                types.Part.from_text(text="Mi perfil: Soy un estudiante con los siguientes intereses y habilidades:"),
+                types.Part.from_text(text=intereses),
+                types.Part.from_text(text="Tu tarea:"),
+                types.Part.from_text(text="\t 1. Accede y analiza el contenido del siguiente documento sobre las salidas profesionales de un Grado Formativo:"),
+                document,
+                types.Part.from_text(text="\t 2. Comparte una puntuación de 0 a 100 que represente el nivel de afinidad entre mis intereses y lo que este grado ofrece profesionalmente."),
+                types.Part.from_text(text="Para tu análisis, utiliza estos criterios:"),
+                types.Part.from_text(text="\t · Afinidad Directa: ¿Las tareas del trabajo coinciden con lo que me gusta hacer?"),
+                types.Part.from_text(text="\t · Proyección de Futuro: ¿Este perfil profesional me permitirá desarrollar mis intereses a largo plazo?"),
+                types.Part.from_text(text="\t · Puntos de Fricción: Identifica qué partes del perfil profesional podrían NO gustarme según mis intereses."),
+                types.Part.from_text(text="Formato de respuesta: Por favor, y muy importante, proporciona solo la puntuación (número entero del 0 a 100)."),
+            ]
+        )
+    ]
+
+    generate_content_config = types.GenerateContentConfig(
+        temperature = 1,
+        top_p = 0.95,
+        seed = 0,
+        max_output_tokens = 65535,
+        safety_settings = [
+            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
+        ],
+        #thinking_config=types.ThinkingConfig(thinking_level="HIGH"),
+        response_mime_type = "application/json",
+        response_schema = {"type":"OBJECT","properties":{"puntuacion_afinidad":{"type":"INTEGER","description":"Un valor entero de 0 a 100 que representa el grado de coincidencia entre los intereses del usuario y los perfiles profesionales del grado."}},"required":["puntuacion_afinidad"]},
+    )
+
+    response = llamar_gemini(
+        client,
+        limitador,
+        model=model,
+        contents=contents,
+        config=generate_content_config
+    )
+
+    output=response.candidates[0].content.parts[0].text
+    output = json.loads(output)
+    return output.get("puntuacion_afinidad")
+
+#Se puntúan varios perfiles en paralelo; las puntuaciones se devuelven en el mismo orden que los perfiles.
+#Si se indica al_puntuar(perfil, puntuacion), se llama en cuanto termina cada evaluación (desde el hilo que la ha realizado).
+#Si se activa cancelado (threading.Event), los perfiles que todavía no se han evaluado no llegan a llamar a Gemini:
+def puntuar_perfiles(client, limitador, almacen, intereses, perfiles_profesionales, max_workers, al_puntuar=None, cancelado=None):
+    almacen.precargar(perfiles_profesionales)
+
+    def puntuar(perfil):
+        comprobar_cancelacion(cancelado)
+        puntuacion = puntuar_perfil(client, limitador, almacen, intereses, perfil)
+        if al_puntuar:
+            al_puntuar(perfil, puntuacion)
+        return puntuacion
+
+    return mapear_en_paralelo(puntuar, perfiles_profesionales, max_workers)
@@ -0,0 +1,149 @@
+#Micro-benchmark del parser de tablas de www.todofp.es (todofp.py) frente a la implementación anterior (BeautifulSoup + pd.concat fila a fila).
+#Uso (desde la carpeta del servicio):
+#   python benchmarks/bench_todofp.py
+#   python benchmarks/bench_todofp.py --catalogo pagina.html --donde-estudiar pagina.html --curriculo pagina.html --repeticiones 20
+#Por defecto se utilizan las páginas guardadas en benchmarks/fixtures (misma estructura HTML que www.todofp.es).
+
+#Se cargan las librerías:
+import sys
+import json
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from todofp import extraer_grados, extraer_centros, extraer_curriculos
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+with open(Path(__file__).resolve().parent.parent / "config" / "ccaas.json", "r", encoding="utf-8") as f:
+    CCAAS = json.load(f)
+
+#Implementación anterior del catálogo de grados (copiada de main.py):
+def legacy_grados(contenido):
+    soup = BeautifulSoup(contenido, 'html.parser')
+    contenedor_div = soup.find('div', {'id': 'contenedor'})
+    content={}
+    df = pd.DataFrame()
+    if contenedor_div:
+        table = contenedor_div.find('table')
+        if table:
+            rows = table.find_all('tr')
+            for row in rows:
+                cells = row.find_all('td')
+                if cells:
+                    for cell in cells:
+                        links = cell.find_all('a')
+                        if links:
+                            link_array = []
+                            for link in links:
+                                if link['href'].startswith('http'):
+                                    link_url = link['href']
+                                else:
+                                    link_url = 'https://www.todofp.es' + link['href']
+                                if cell.get("headers", [])[0] == "real-decreto":
+                                    if link.get_text() == "":
+                                        link_array.append({"BOE":link_url})
+                                    else:
+                                        link_array.append({link.get_text():link_url})
+                                link_array.append(link_url)
+                            content[cell.get("headers", [])[0]]=link_array
+                if content != {}:
+                    df_json = pd.json_normalize(content)
+                    df = pd.concat([df.reset_index(drop=True), df_json.reset_index(drop=True)], axis=0)
+    df=df.reset_index(drop=True)
+    for columna in ["titulacion", "curriculo-mecd", "curriculo-ccaa", "perfiles-profesionales", "donde-estudiar"]:
+        df[columna] = df[columna].apply(lambda x: x[0] if isinstance(x, list) and len(x) > 0 else None)
+    return df
+
+#Implementación anterior de la expansión de centros (copiada de main.py; solo se sustituye la descarga por el contenido de la página
+#y PROVINCIAS[PROVINCIA]/MODALIDAD por los parámetros provincias/modalidad):
+def legacy_centros(contenido, row, provincias, modalidad):
+    df_expanded=pd.DataFrame()
+    soup = BeautifulSoup(contenido, 'html.parser')
+    table = soup.find('table')
+    if table:
+        rows_table = table.find_all('tr')
+        for row_table in rows_table:
+            cells = row_table.find_all('td')
+            if cells:
+                if cells[0].get_text(strip=True) in provincias and cells[5].get_text(strip=True) in modalidad:
+                    if cells[2].get_text() != "" and cells[3].get_text() != "":
+                        centro = cells[2].get_text() + ' ' + cells[3].get_text()
+                    elif cells[2].get_text() != "":
+                        centro = cells[2].get_text()
+                    elif cells[3].get_text() != "":
+                        centro = cells[3].get_text()
+                    df_json = pd.json_normalize({"real-decreto":row["real-decreto"],"curriculo-mecd":row["curriculo-mecd"],"curriculo-ccaa":row["curriculo-ccaa"],"perfiles-profesionales":row["perfiles-profesionales"], "ccaa": CCAAS[cells[0].get_text()], "provincia": cells[0].get_text(),"localidad": cells[1].get_text(),"centro": centro})
+                    df_expanded = pd.concat([df_expanded.reset_index(drop=True), df_json.reset_index(drop=True)], axis=0)
+    df_expanded=df_expanded.reset_index(drop=True)
+    return df_expanded
+
+#El mismo trabajo con todofp.py: se extraen todos los centros de la página y se filtran por provincia y modalidad:
+def nuevo_centros(contenido, row, provincias, modalidad):
+    df = pd.DataFrame(extraer_centros(contenido))
+    df = df[df["provincia"].isin(provincias) & df["modalidad"].isin(modalidad)].reset_index(drop=True)
+    columnas = {columna: [row[columna]] * len(df) for columna in ["real-decreto", "curriculo-mecd", "curriculo-ccaa", "perfiles-profesionales"]}
+    columnas["ccaa"] = df["provincia"].map(CCAAS).tolist()
+    return pd.DataFrame(columnas).join(df[["provincia", "localidad", "centro"]])
+
+#Implementación anterior de los currículos autonómicos:
+def legacy_curriculos(contenido, curriculum_ccaa):
+    pd_curriculumns_ccaa=pd.DataFrame()
+    soup = BeautifulSoup(contenido, 'html.parser')
+    for elemento in soup.find_all('div', class_='elemento'):
+        ccaa = elemento.find('p', class_='titulo')
+        if ccaa:
+            for bloque in elemento.find_all('div', class_='cte'):
+                links=[]
+                for enlace in bloque.find_all('a'):
+                    href = enlace.get('href')
+                    if not href.startswith('http'):
+                        href = 'https://www.todofp.es' + href
+                    links.append({enlace.get_text():href})
+                if links != []:
+                    df_json = pd.json_normalize({"curriculo-ccaa":curriculum_ccaa, "ccaa_alt":ccaa.getText(), "links-curriculo-ccaa":links})
+                    pd_curriculumns_ccaa = pd.concat([pd_curriculumns_ccaa.reset_index(drop=True), df_json.reset_index(drop=True)], axis=0)
+    return pd_curriculumns_ccaa.reset_index(drop=True)
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1000, resultado
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark del parser de tablas de www.todofp.es.")
+    parser.add_argument("--catalogo", default=FIXTURES / "catalogo.html", type=Path)
+    parser.add_argument("--donde-estudiar", default=FIXTURES / "donde_estudiar.html", type=Path)
+    parser.add_argument("--curriculo", default=FIXTURES / "curriculo_ccaa.html", type=Path)
+    parser.add_argument("--modalidad", nargs="+", default=["Centro público", "Centro privado concertado", "Centro privado"])
+    parser.add_argument("--repeticiones", default=10, type=int)
+    args = parser.parse_args()
+
+    catalogo = args.catalogo.read_bytes()
+    donde_estudiar = args.donde_estudiar.read_bytes()
+    curriculo = args.curriculo.read_bytes()
+    #Se expanden los centros del primer grado del catálogo en todas las provincias con comunidad autónoma en config/ccaas.json:
+    grado = legacy_grados(catalogo).iloc[0]
+    provincias = list(CCAAS)
+
+    casos = [
+        ("catalogo", lambda: legacy_grados(catalogo), lambda: extraer_grados(catalogo)),
+        ("donde-estudiar", lambda: legacy_centros(donde_estudiar, grado, provincias, args.modalidad), lambda: nuevo_centros(donde_estudiar, grado, provincias, args.modalidad)),
+        ("curriculo-ccaa", lambda: legacy_curriculos(curriculo, "fixture"), lambda: pd.DataFrame(extraer_curriculos(curriculo, "fixture"))),
+    ]
+
+    print(f"{'Página':<16}{'Filas':>7}{'Anterior (ms)':>16}{'todofp.py (ms)':>16}{'Mejora':>9}")
+    for nombre, anterior, nuevo in casos:
+        ms_anterior, df_anterior = medir(anterior, args.repeticiones)
+        ms_nuevo, df_nuevo = medir(nuevo, args.repeticiones)
+        #Se comprueba que ambas implementaciones extraen lo mismo:
+        pd.testing.assert_frame_equal(df_anterior[df_nuevo.columns].reset_index(drop=True), df_nuevo, check_dtype=False)
+        print(f"{nombre:<16}{len(df_nuevo):>7}{ms_anterior:>16.1f}{ms_nuevo:>16.1f}{ms_anterior/ms_nuevo:>8.1f}x")
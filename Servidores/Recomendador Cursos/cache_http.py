@@ -0,0 +1,104 @@
+#Se cargan las librerías:
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+CACHE_FOLDER_NAME = os.getenv("CACHE_FOLDER_NAME", "cache")
+CACHE_TTL_HORAS = float(os.getenv("CACHE_TTL_HORAS", "24"))
+SCRAPING_OFFLINE = os.getenv("SCRAPING_OFFLINE", "false").strip().lower() in ("1", "true", "si", "sí", "yes")
+
+class PaginaNoDisponibleOffline(Exception):
+    pass
+
+#Caché HTTP en disco: cada URL se guarda como <hash>.body (contenido) y <hash>.json (cabeceras de validación y fecha de descarga):
+class CacheHTTP:
+
+    def __init__(self, carpeta=CACHE_FOLDER_NAME, ttl_horas=CACHE_TTL_HORAS, offline=SCRAPING_OFFLINE):
+        self.carpeta = Path(carpeta) / "http"
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        self.ttl_segundos = ttl_horas * 3600
+        self.offline = offline
+
+    def _rutas(self, url):
+        clave = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.carpeta / f"{clave}.body", self.carpeta / f"{clave}.json"
+
+    def leer(self, url):
+        ruta_body, ruta_meta = self._rutas(url)
+        try:
+            meta = json.loads(ruta_meta.read_text(encoding="utf-8"))
+            return ruta_body.read_bytes(), meta
+        except (FileNotFoundError, ValueError):
+            return None, None
+
+    #Se escribe primero en un fichero temporal (propio de cada proceso e hilo) y después se renombra para que otros hilos/procesos
+    #nunca lean un fichero a medias ni escriban en el mismo temporal:
+    def _escribir_atomico(self, ruta, datos):
+        tmp = ruta.with_name(f"{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(datos)
+        os.replace(tmp, ruta)
+
+    def guardar(self, url, contenido, headers):
+        ruta_body, ruta_meta = self._rutas(url)
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "descargado": time.time(),
+        }
+        self._escribir_atomico(ruta_body, contenido)
+        self._escribir_atomico(ruta_meta, json.dumps(meta).encode("utf-8"))
+
+    def renovar(self, url, meta):
+        _, ruta_meta = self._rutas(url)
+        meta = dict(meta, descargado=time.time())
+        self._escribir_atomico(ruta_meta, json.dumps(meta).encode("utf-8"))
+
+    def vigente(self, meta):
+        return (time.time() - meta.get("descargado", 0)) < self.ttl_segundos
+
+    #Se construyen las cabeceras para la petición condicional (ETag/Last-Modified):
+    @staticmethod
+    def cabeceras_condicionales(meta):
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    #Se descarga una URL a través de la caché:
+    #   - Si la copia local está vigente (TTL) se devuelve sin salir a la red.
+    #   - En modo offline solo se usa la copia local (la última descarga correcta).
+    #   - Si ha caducado se revalida con una petición condicional (304 -> se reutiliza la copia local).
+    #   - Si www.todofp.es falla y existe copia local, se sirve la copia local aunque esté caducada.
+    def obtener(self, sesion, url, timeout):
+        contenido, meta = self.leer(url)
+        if contenido is not None and self.vigente(meta):
+            return contenido
+        if self.offline:
+            if contenido is None:
+                raise PaginaNoDisponibleOffline(f"No existe copia local de {url} y el modo offline está activado.")
+            return contenido
+
+        try:
+            response = sesion.get(url, timeout=timeout, headers=self.cabeceras_condicionales(meta if contenido is not None else None))
+            if response.status_code == 304 and contenido is not None:
+                self.renovar(url, meta)
+                return contenido
+            response.raise_for_status()
+        except Exception as e:
+            if contenido is not None:
+                logger.warning("No se ha podido revalidar %s (%s); se utiliza la copia local del %s.", url, e, time.strftime("%Y-%m-%d %H:%M", time.localtime(meta.get("descargado", 0))))
+                return contenido
+            raise
+
+        self.guardar(url, response.content, response.headers)
+        return response.content
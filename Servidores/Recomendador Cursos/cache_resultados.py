@@ -0,0 +1,79 @@
+#Caché en memoria (LRU con caducidad) de las respuestas completas de /salidas_profesionales.
+#La clave es un hash de los campos de la petición normalizados (espacios y mayúsculas), de forma que dos peticiones
+#equivalentes (el mismo alumno recalculado por el orientador, o el ejemplo de la documentación) comparten resultado.
+
+#Se cargan las librerías:
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+CACHE_RESULTADOS_MAX_ENTRADAS = int(os.getenv("CACHE_RESULTADOS_MAX_ENTRADAS", "256"))
+CACHE_RESULTADOS_TTL_MINUTOS = float(os.getenv("CACHE_RESULTADOS_TTL_MINUTOS", "60"))
+
+#Se normaliza un valor de la petición (espacios repetidos y mayúsculas/minúsculas):
+def normalizar(valor):
+    return " ".join(str(valor).split()).casefold()
+
+#Se calcula la clave de una petición a partir de todos sus campos normalizados (incluidos los intereses):
+def clave_peticion(campos):
+    normalizados = {nombre: normalizar(valor) for nombre, valor in sorted(campos.items())}
+    return hashlib.sha256(json.dumps(normalizados, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class CacheResultados:
+
+    def __init__(self, max_entradas=CACHE_RESULTADOS_MAX_ENTRADAS, ttl_minutos=CACHE_RESULTADOS_TTL_MINUTOS):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_minutos * 60
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.omitidas = 0
+
+    #Devuelve el resultado guardado para la clave (None si no existe o ha caducado) y actualiza los contadores:
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and time.monotonic() - entrada[0] <= self.ttl_segundos:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[1]
+            if entrada is not None:
+                del self._entradas[clave]
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, resultado):
+        if self.max_entradas <= 0:
+            return
+        with self._lock:
+            self._entradas[clave] = (time.monotonic(), resultado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    #Se registra una petición que no ha consultado la caché (se recalcula y se guarda el nuevo resultado):
+    def omitir(self):
+        with self._lock:
+            self.omitidas += 1
+
+    def vaciar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_minutos": self.ttl_segundos / 60,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "omitidas": self.omitidas,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else None,
+            }
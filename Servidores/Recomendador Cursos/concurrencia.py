@@ -0,0 +1,75 @@
+#Se cargan las librerías:
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from google.genai import errors
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+GEMINI_MAX_CONCURRENCIA = int(os.getenv("GEMINI_MAX_CONCURRENCIA", "8"))
+GEMINI_MAX_PETICIONES_MINUTO = int(os.getenv("GEMINI_MAX_PETICIONES_MINUTO", "60"))
+GEMINI_REINTENTOS = int(os.getenv("GEMINI_REINTENTOS", "3"))
+
+#Límite de llamadas simultáneas a Gemini compartido por todo el proceso (todas las peticiones, alumnos de un lote y pools de hilos):
+_semaforo_gemini = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCIA)
+
+#Excepción con la que se interrumpe el cálculo de una petición cuyo cliente ya no espera la respuesta:
+class PeticionCancelada(Exception):
+    pass
+
+#Se interrumpe el cálculo si se ha activado la señal de cancelación (threading.Event) de la petición:
+def comprobar_cancelacion(cancelado):
+    if cancelado is not None and cancelado.is_set():
+        raise PeticionCancelada()
+
+#Códigos de error de Gemini ante los que merece la pena reintentar (cuota agotada o sobrecarga del servicio):
+CODIGOS_REINTENTABLES = (429, 500, 503, 504)
+
+#Limitador de peticiones por minuto (GCRA): permite ráfagas de hasta "rafaga" peticiones y, a partir de ahí,
+#espacia las peticiones para no superar la cuota. Es seguro usarlo desde varios hilos:
+class LimitadorPeticiones:
+
+    def __init__(self, peticiones_por_minuto=GEMINI_MAX_PETICIONES_MINUTO, rafaga=GEMINI_MAX_CONCURRENCIA):
+        self.intervalo = 60.0 / peticiones_por_minuto if peticiones_por_minuto > 0 else 0.0
+        self.tolerancia = self.intervalo * max(rafaga - 1, 0)
+        self._lock = threading.Lock()
+        self._siguiente = time.monotonic()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            siguiente = max(self._siguiente, ahora)
+            espera = siguiente - ahora - self.tolerancia
+            self._siguiente = siguiente + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+#Se realiza una llamada a Gemini respetando la cuota y el límite de llamadas simultáneas del proceso (GEMINI_MAX_CONCURRENCIA),
+#reintentando (con espera exponencial) ante errores transitorios. metodo es el método de client.models a llamar (generate_content, embed_content, ...):
+def llamar_gemini(client, limitador, reintentos=GEMINI_REINTENTOS, metodo="generate_content", **kwargs):
+    for intento in range(reintentos + 1):
+        limitador.esperar()
+        try:
+            with _semaforo_gemini:
+                return getattr(client.models, metodo)(**kwargs)
+        except errors.APIError as e:
+            if e.code not in CODIGOS_REINTENTABLES or intento == reintentos:
+                raise
+            espera = (2 ** intento) + random.random()
+            logger.warning("Gemini ha devuelto %s; reintento %d/%d en %.1f s", e.code, intento + 1, reintentos, espera)
+            time.sleep(espera)
+
+#Se aplica una función a cada elemento con un número máximo de hilos; los resultados se devuelven en el mismo orden que los elementos:
+def mapear_en_paralelo(funcion, elementos, max_workers=GEMINI_MAX_CONCURRENCIA):
+    elementos = list(elementos)
+    if not elementos:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(elementos))) as executor:
+        return list(executor.map(funcion, elementos))
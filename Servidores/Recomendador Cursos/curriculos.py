@@ -0,0 +1,28 @@
+#Enriquecimiento (diferido) de los grados recomendados con los enlaces a sus currículos autonómicos.
+#Solo se descargan las páginas de currículos de los grados que llegan a la respuesta final, y cada página se guarda en el índice
+#local por URL y comunidad autónoma, de forma que las siguientes peticiones no vuelven a descargarla ni a procesarla (tampoco
+#las páginas sin ningún bloque de enlaces, que se guardan como entrada negativa).
+
+#Se cargan las librerías:
+from datetime import datetime
+
+from scraping import descargar_paginas
+from todofp import extraer_curriculos
+
+#Se añade a cada centro (fila de df) la columna "links-curriculo-ccaa" con los enlaces de su comunidad autónoma.
+#Si la página incluye varios bloques para la misma comunidad autónoma, se genera una fila por bloque (como el antiguo merge);
+#los centros cuya comunidad autónoma no aparece en la página se descartan, igual que hacía el filtro ccaa == ccaa_alt:
+def enriquecer_curriculos(indice, df):
+    urls = list(dict.fromkeys(df["curriculo-ccaa"].dropna()))
+    curriculos = indice.leer_curriculos(urls)
+    urls_cacheadas = {url for url, _ in curriculos}
+    pendientes = [url for url in urls if url not in urls_cacheadas]
+    if pendientes:
+        fecha = datetime.now().isoformat(timespec="seconds")
+        for url, contenido in descargar_paginas(pendientes).items():
+            indice.guardar_curriculos(url, extraer_curriculos(contenido, url), fecha)
+        curriculos = indice.leer_curriculos(urls)
+
+    enlaces = [curriculos.get((url, ccaa)) or [] for url, ccaa in zip(df["curriculo-ccaa"], df["ccaa"])]
+    df = df.assign(**{"links-curriculo-ccaa": enlaces}).explode("links-curriculo-ccaa")
+    return df.dropna(subset=["links-curriculo-ccaa"]).reset_index(drop=True)
@@ -0,0 +1,275 @@
+#Se cargan las librerías:
+import os
+import json
+import time
+import sqlite3
+import logging
+from pathlib import Path
+from datetime import datetime, time as hora
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import googlemaps
+from googlemaps.exceptions import ApiError, HTTPError, Timeout, TransportError
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+CACHE_FOLDER_NAME = os.getenv("CACHE_FOLDER_NAME", "cache")
+CACHE_DISTANCIAS_DIAS = float(os.getenv("CACHE_DISTANCIAS_DIAS", "30"))
+PREFILTRO_RADIO = os.getenv("PREFILTRO_RADIO", "true").lower() == "true"
+MAPS_MAX_CONCURRENCIA = int(os.getenv("MAPS_MAX_CONCURRENCIA", "8"))
+#Velocidad máxima (en línea recta) que se considera alcanzable con cada medio de transporte. Un destino más lejos que
+#velocidad * tiempo máximo no puede alcanzarse a tiempo por ninguna ruta y no se envía a la Distance Matrix API:
+VELOCIDADES_MAXIMAS_KMH = json.loads(os.getenv("VELOCIDADES_MAXIMAS_KMH", '{"driving": 140, "transit": 40, "bicycling": 35, "walking": 8}'))
+
+RADIO_TIERRA_KM = 6371.0088
+
+#Límites de la Distance Matrix API por petición (https://developers.google.com/maps/documentation/distance-matrix/usage-and-billing):
+MAX_DESTINOS_POR_PETICION = 25
+MAX_ELEMENTOS_POR_PETICION = 100
+
+HORAS_LLEGADA = {"mañana": hora(8, 0), "tarde": hora(15, 0)}
+
+#Se calcula la hora de llegada (timestamp) en función del turno:
+def hora_llegada(turno):
+    llegada = datetime.now()
+    if turno in HORAS_LLEGADA:
+        llegada = datetime.combine(llegada.date(), HORAS_LLEGADA[turno])
+    return int(llegada.timestamp())
+
+#Se calcula (vectorizado) la distancia en línea recta, en km, entre un origen (lat, lng) y una matriz de destinos [[lat, lng], ...]:
+def distancias_haversine(origen, destinos):
+    lat1, lng1 = np.radians(origen)
+    destinos = np.radians(np.asarray(destinos, dtype=np.float64).reshape(-1, 2))
+    lat2, lng2 = destinos[:, 0], destinos[:, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+#Sustituto local de googlemaps.Client (mismo formato de respuesta que distance_matrix y geocode) para pruebas y entornos sin acceso a Google Maps.
+#Los tiempos (en minutos) se leen de un JSON {"origen": {"destino": minutos}}; los destinos desconocidos devuelven NOT_FOUND.
+#Las coordenadas se leen de un JSON {"direccion": [lat, lng]}; las direcciones desconocidas no devuelven resultados:
+class ClienteMapasLocal:
+
+    def __init__(self, tiempos=None, fichero=None, coordenadas=None, fichero_coordenadas=None):
+        self.tiempos = tiempos or {}
+        if fichero:
+            with open(fichero, "r", encoding="utf-8") as f:
+                self.tiempos = json.load(f)
+        self.coordenadas = coordenadas or {}
+        if fichero_coordenadas:
+            with open(fichero_coordenadas, "r", encoding="utf-8") as f:
+                self.coordenadas = json.load(f)
+        self.peticiones = 0
+        self.geocodificaciones = 0
+
+    def geocode(self, address, region=None, language=None):
+        self.geocodificaciones += 1
+        if address not in self.coordenadas:
+            return []
+        lat, lng = self.coordenadas[address]
+        return [{"formatted_address": address, "geometry": {"location": {"lat": lat, "lng": lng}}}]
+
+    def distance_matrix(self, origins, destinations, mode=None, arrival_time=None, language=None):
+        self.peticiones += 1
+        origins = [origins] if isinstance(origins, str) else list(origins)
+        destinations = [destinations] if isinstance(destinations, str) else list(destinations)
+        rows = []
+        for origen in origins:
+            elements = []
+            for destino in destinations:
+                minutos = self.tiempos.get(origen, {}).get(destino)
+                if minutos is None:
+                    elements.append({"status": "NOT_FOUND"})
+                else:
+                    elements.append({"status": "OK", "duration": {"value": int(minutos * 60), "text": f"{minutos} min"}})
+            rows.append({"elements": elements})
+        return {"status": "OK", "origin_addresses": origins, "destination_addresses": destinations, "rows": rows}
+
+#Caché persistente (SQLite) de tiempos de desplazamiento por (origen, destino, modo, turno).
+#Se guardan también los destinos sin ruta (minutos = NULL) para no volver a consultarlos:
+class CacheTiempos:
+
+    def __init__(self, carpeta=CACHE_FOLDER_NAME, ttl_dias=CACHE_DISTANCIAS_DIAS):
+        Path(carpeta).mkdir(parents=True, exist_ok=True)
+        self.ruta = Path(carpeta) / "distancias.sqlite"
+        self.ttl_segundos = ttl_dias * 86400
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS tiempos (
+                    origen TEXT NOT NULL,
+                    destino TEXT NOT NULL,
+                    modo TEXT NOT NULL,
+                    turno TEXT NOT NULL,
+                    minutos REAL,
+                    fecha REAL NOT NULL,
+                    PRIMARY KEY (origen, destino, modo, turno)
+                )
+            """)
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta, timeout=30)
+
+    def leer(self, origen, destinos, modo, turno):
+        destinos = list(destinos)
+        limite = time.time() - self.ttl_segundos
+        resultado = {}
+        with self._conectar() as con:
+            for inicio in range(0, len(destinos), 500):
+                lote = destinos[inicio:inicio + 500]
+                filas = con.execute(
+                    f"SELECT destino, minutos FROM tiempos WHERE origen = ? AND modo = ? AND turno = ? AND fecha >= ? AND destino IN ({', '.join('?' * len(lote))})",
+                    [origen, modo, turno, limite, *lote],
+                ).fetchall()
+                resultado.update(dict(filas))
+        return resultado
+
+    def guardar(self, origen, tiempos, modo, turno):
+        ahora = time.time()
+        with self._conectar() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO tiempos VALUES (?, ?, ?, ?, ?, ?)",
+                [(origen, destino, modo, turno, minutos, ahora) for destino, minutos in tiempos.items()],
+            )
+
+#Caché persistente (en el mismo SQLite) de las coordenadas de cada dirección (localidades y centros).
+#Las coordenadas no caducan; las direcciones que no se han podido geocodificar (lat/lng = NULL) se reintentan pasado el TTL:
+class CacheCoordenadas:
+
+    def __init__(self, carpeta=CACHE_FOLDER_NAME, ttl_dias=CACHE_DISTANCIAS_DIAS):
+        Path(carpeta).mkdir(parents=True, exist_ok=True)
+        self.ruta = Path(carpeta) / "distancias.sqlite"
+        self.ttl_segundos = ttl_dias * 86400
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS coordenadas (
+                    direccion TEXT PRIMARY KEY,
+                    lat REAL,
+                    lng REAL,
+                    fecha REAL NOT NULL
+                )
+            """)
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta, timeout=30)
+
+    #Devuelve {direccion: (lat, lng)} ((None, None) si no se pudo geocodificar y todavía no ha caducado):
+    def leer(self, direcciones):
+        direcciones = list(direcciones)
+        limite = time.time() - self.ttl_segundos
+        resultado = {}
+        with self._conectar() as con:
+            for inicio in range(0, len(direcciones), 500):
+                lote = direcciones[inicio:inicio + 500]
+                filas = con.execute(
+                    f"SELECT direccion, lat, lng FROM coordenadas WHERE direccion IN ({', '.join('?' * len(lote))}) AND (lat IS NOT NULL OR fecha >= ?)",
+                    [*lote, limite],
+                ).fetchall()
+                resultado.update({direccion: (lat, lng) for direccion, lat, lng in filas})
+        return resultado
+
+    def guardar(self, coordenadas):
+        ahora = time.time()
+        with self._conectar() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO coordenadas VALUES (?, ?, ?, ?)",
+                [(direccion, lat, lng, ahora) for direccion, (lat, lng) in coordenadas.items()],
+            )
+
+#Se calculan los tiempos de desplazamiento agrupando los destinos en el menor número posible de llamadas a la Distance Matrix API:
+class CalculadoraTiempos:
+
+    def __init__(self, gmaps, cache=None, coordenadas=None):
+        self.gmaps = gmaps
+        self.cache = cache if cache is not None else CacheTiempos()
+        self.coordenadas = coordenadas if coordenadas is not None else CacheCoordenadas()
+
+    def _geocodificar(self, direccion):
+        try:
+            resultados = self.gmaps.geocode(direccion, region="es", language="es")
+        except (ApiError, HTTPError, Timeout, TransportError) as e:
+            logger.warning("Error en la Geocoding API (%s): %s", direccion, e)
+            return None
+        if not resultados:
+            return (None, None)
+        ubicacion = resultados[0]["geometry"]["location"]
+        return (ubicacion["lat"], ubicacion["lng"])
+
+    #Devuelve {direccion: (lat, lng)}; solo se geocodifican (en paralelo) las direcciones que no están en la caché:
+    def geocodificar(self, direcciones):
+        direcciones = list(dict.fromkeys(direcciones))
+        resultado = self.coordenadas.leer(direcciones)
+        pendientes = [direccion for direccion in direcciones if direccion not in resultado]
+        if pendientes:
+            with ThreadPoolExecutor(max_workers=min(MAPS_MAX_CONCURRENCIA, len(pendientes))) as executor:
+                nuevas = {direccion: coordenadas for direccion, coordenadas in zip(pendientes, executor.map(self._geocodificar, pendientes)) if coordenadas is not None}
+            self.coordenadas.guardar(nuevas)
+            resultado.update(nuevas)
+        return resultado
+
+    #Se descartan (sin llamar a la Distance Matrix API) los destinos que están más lejos, en línea recta, de lo que se puede recorrer
+    #en max_minutos a la velocidad máxima del medio de transporte. Solo se geocodifica el origen: las coordenadas de los destinos
+    #(localidades y centros) las guarda ingesta.py y aquí únicamente se leen. Los destinos sin coordenadas no se descartan:
+    def dentro_de_radio(self, origen, destinos, modo, max_minutos):
+        destinos = list(dict.fromkeys(destinos))
+        if not PREFILTRO_RADIO or modo not in VELOCIDADES_MAXIMAS_KMH or not destinos:
+            return destinos
+        coordenadas = self.geocodificar([origen])
+        if coordenadas.get(origen, (None, None))[0] is None:
+            return destinos
+        coordenadas.update(self.coordenadas.leer(destinos))
+        con_coordenadas = [destino for destino in destinos if coordenadas.get(destino, (None, None))[0] is not None]
+        if not con_coordenadas:
+            return destinos
+        radio_km = VELOCIDADES_MAXIMAS_KMH[modo] * max_minutos / 60
+        distancias = distancias_haversine(coordenadas[origen], [coordenadas[destino] for destino in con_coordenadas])
+        fuera = {destino for destino, distancia in zip(con_coordenadas, distancias) if distancia > radio_km}
+        logger.info("Prefiltro por radio (%.0f km, %s): %d de %d destinos descartados sin consultar rutas", radio_km, modo, len(fuera), len(destinos))
+        return [destino for destino in destinos if destino not in fuera]
+
+    #Devuelve {destino: minutos} (None si no existe ruta). Los destinos cuya consulta falla no aparecen en el resultado:
+    def tiempos(self, origen, destinos, modo, turno):
+        destinos = list(dict.fromkeys(destinos))
+        resultado = self.cache.leer(origen, destinos, modo, turno)
+        pendientes = [destino for destino in destinos if destino not in resultado]
+
+        tamano_lote = min(MAX_DESTINOS_POR_PETICION, MAX_ELEMENTOS_POR_PETICION)
+        llegada = hora_llegada(turno)
+        for inicio in range(0, len(pendientes), tamano_lote):
+            lote = pendientes[inicio:inicio + tamano_lote]
+            try:
+                respuesta = self.gmaps.distance_matrix(
+                        [origen],
+                        lote,
+                        mode=modo,
+                        arrival_time=llegada,
+                        language='es'
+                    )
+            except (ApiError, HTTPError, Timeout, TransportError) as e:
+                logger.warning("Error en la Distance Matrix API (%d destinos desde %s): %s", len(lote), origen, e)
+                continue
+
+            tiempos_lote = {}
+            for destino, elemento in zip(lote, respuesta['rows'][0]['elements']):
+                if elemento.get('status') == 'OK':
+                    tiempos_lote[destino] = elemento['duration']['value']/60
+                elif elemento.get('status') in ('NOT_FOUND', 'ZERO_RESULTS'):
+                    tiempos_lote[destino] = None
+                else:
+                    logger.warning("Distance Matrix API: estado %s para %s -> %s", elemento.get('status'), origen, destino)
+            self.cache.guardar(origen, tiempos_lote, modo, turno)
+            resultado.update(tiempos_lote)
+        return resultado
+
+    #Devuelve los destinos a los que se llega en como máximo max_minutos:
+    def filtrar(self, origen, destinos, modo, turno, max_minutos):
+        destinos = self.dentro_de_radio(origen, destinos, modo, max_minutos)
+        tiempos = self.tiempos(origen, destinos, modo, turno)
+        return [destino for destino, minutos in tiempos.items() if minutos is not None and minutos <= max_minutos]
+
+#Se crea el cliente de Google Maps o, si así se indica en el .env, el sustituto local:
+def crear_cliente_mapas(api_key):
+    fichero_local = os.getenv("MAPS_TIEMPOS_LOCALES")
+    if fichero_local:
+        return ClienteMapasLocal(fichero=fichero_local, fichero_coordenadas=os.getenv("MAPS_COORDENADAS_LOCALES"))
+    return googlemaps.Client(key=api_key)
@@ -0,0 +1,198 @@
+#Se cargan las librerías:
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+INDICE_FOLDER_NAME = os.getenv("INDICE_FOLDER_NAME", "indice")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS grados (
+    tipo_grado TEXT NOT NULL,
+    orden INTEGER NOT NULL,
+    titulacion TEXT,
+    real_decreto TEXT,
+    curriculo_mecd TEXT,
+    curriculo_ccaa TEXT,
+    perfiles_profesionales TEXT,
+    donde_estudiar TEXT,
+    PRIMARY KEY (tipo_grado, orden)
+);
+CREATE TABLE IF NOT EXISTS centros (
+    tipo_grado TEXT NOT NULL,
+    orden_grado INTEGER NOT NULL,
+    orden INTEGER NOT NULL,
+    provincia TEXT NOT NULL,
+    localidad TEXT NOT NULL,
+    centro TEXT NOT NULL,
+    modalidad TEXT NOT NULL,
+    PRIMARY KEY (tipo_grado, orden_grado, orden)
+);
+CREATE INDEX IF NOT EXISTS idx_centros_busqueda ON centros (tipo_grado, provincia, modalidad);
+CREATE TABLE IF NOT EXISTS embeddings (
+    perfil TEXT NOT NULL,
+    modelo TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (perfil, modelo)
+);
+CREATE TABLE IF NOT EXISTS curriculos (
+    url TEXT NOT NULL,
+    ccaa TEXT NOT NULL,
+    orden INTEGER NOT NULL,
+    enlaces TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    PRIMARY KEY (url, ccaa, orden)
+);
+CREATE TABLE IF NOT EXISTS ingestas (
+    tipo_grado TEXT PRIMARY KEY,
+    fecha TEXT NOT NULL,
+    no_grados INTEGER NOT NULL,
+    no_centros INTEGER NOT NULL
+);
+"""
+
+#Comunidad autónoma con la que se guarda la entrada negativa de una página de currículos sin ningún bloque de enlaces
+#(así la página consta como procesada y no se vuelve a descargar en cada petición):
+CCAA_SIN_CURRICULOS = ""
+
+#Índice local (SQLite) de grados y centros formativos construido por ingesta.py:
+class IndiceCentros:
+
+    def __init__(self, carpeta=INDICE_FOLDER_NAME):
+        Path(carpeta).mkdir(parents=True, exist_ok=True)
+        self.ruta = Path(carpeta) / "centros.sqlite"
+        self._lock = threading.Lock()
+        with self._conectar() as con:
+            con.executescript(ESQUEMA)
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta, timeout=30)
+
+    def tipos_grado_indexados(self):
+        with self._conectar() as con:
+            return {fila[0] for fila in con.execute("SELECT tipo_grado FROM ingestas")}
+
+    #Se obtiene la fecha de la última ingesta de un tipo de grado (None si no está indexado):
+    def fecha_ingesta(self, tipo_grado):
+        with self._conectar() as con:
+            fila = con.execute("SELECT fecha FROM ingestas WHERE tipo_grado = ?", (tipo_grado,)).fetchone()
+        return datetime.fromisoformat(fila[0]) if fila else None
+
+    #Se sustituye (en una única transacción) todo el contenido de un tipo de grado:
+    def guardar(self, tipo_grado, df_grados, centros_por_grado, fecha):
+        filas_grados = []
+        filas_centros = []
+        for orden, row in enumerate(df_grados.to_dict(orient="records")):
+            filas_grados.append((
+                tipo_grado, orden, row.get("titulacion"), json.dumps(row.get("real-decreto"), ensure_ascii=False),
+                row.get("curriculo-mecd"), row.get("curriculo-ccaa"), row.get("perfiles-profesionales"), row.get("donde-estudiar"),
+            ))
+            centros = centros_por_grado.get(orden)
+            if centros:
+                for jdx, (provincia, localidad, centro, modalidad) in enumerate(zip(centros["provincia"], centros["localidad"], centros["centro"], centros["modalidad"])):
+                    filas_centros.append((tipo_grado, orden, jdx, provincia, localidad, centro, modalidad))
+
+        with self._lock, self._conectar() as con:
+            #Los currículos autonómicos cacheados del tipo de grado se vuelven a descargar tras cada ingesta:
+            con.execute("DELETE FROM curriculos WHERE url IN (SELECT curriculo_ccaa FROM grados WHERE tipo_grado = ?)", (tipo_grado,))
+            con.execute("DELETE FROM centros WHERE tipo_grado = ?", (tipo_grado,))
+            con.execute("DELETE FROM grados WHERE tipo_grado = ?", (tipo_grado,))
+            con.executemany("INSERT INTO grados VALUES (?, ?, ?, ?, ?, ?, ?, ?)", filas_grados)
+            con.executemany("INSERT INTO centros VALUES (?, ?, ?, ?, ?, ?, ?)", filas_centros)
+            con.execute("INSERT OR REPLACE INTO ingestas VALUES (?, ?, ?, ?)", (tipo_grado, fecha, len(filas_grados), len(filas_centros)))
+
+    #Se obtienen los centros que imparten un tipo de grado en las provincias y modalidades indicadas (mismo formato que el antiguo df_expanded):
+    def consultar_centros(self, tipo_grado, provincias, modalidades):
+        provincias = list(provincias)
+        modalidades = list(modalidades)
+        columnas = ["real-decreto", "curriculo-mecd", "curriculo-ccaa", "perfiles-profesionales", "provincia", "localidad", "centro"]
+        if not provincias or not modalidades:
+            return pd.DataFrame(columns=columnas)
+        consulta = f"""
+            SELECT g.real_decreto, g.curriculo_mecd, g.curriculo_ccaa, g.perfiles_profesionales, c.provincia, c.localidad, c.centro
+            FROM centros c
+            JOIN grados g ON g.tipo_grado = c.tipo_grado AND g.orden = c.orden_grado
+            WHERE c.tipo_grado = ?
+              AND c.provincia IN ({", ".join("?" * len(provincias))})
+              AND c.modalidad IN ({", ".join("?" * len(modalidades))})
+            ORDER BY c.orden_grado, c.orden
+        """
+        with self._conectar() as con:
+            filas = con.execute(consulta, [tipo_grado, *provincias, *modalidades]).fetchall()
+        df = pd.DataFrame(filas, columns=columnas)
+        df["real-decreto"] = df["real-decreto"].apply(json.loads)
+        return df
+
+    #Se obtienen los centros (sin repetir) de un tipo de grado -> [(provincia, localidad, centro)]:
+    def ubicaciones_centros(self, tipo_grado):
+        with self._conectar() as con:
+            return con.execute(
+                "SELECT DISTINCT provincia, localidad, centro FROM centros WHERE tipo_grado = ? ORDER BY provincia, localidad, centro",
+                (tipo_grado,),
+            ).fetchall()
+
+    #Se obtienen los perfiles profesionales indexados que todavía no tienen embedding para el modelo indicado:
+    def perfiles_sin_embedding(self, modelo):
+        with self._conectar() as con:
+            filas = con.execute(
+                "SELECT DISTINCT perfiles_profesionales FROM grados WHERE perfiles_profesionales IS NOT NULL "
+                "AND perfiles_profesionales NOT IN (SELECT perfil FROM embeddings WHERE modelo = ?)",
+                (modelo,),
+            ).fetchall()
+        return [fila[0] for fila in filas]
+
+    def guardar_embeddings(self, vectores, modelo):
+        with self._lock, self._conectar() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(perfil, modelo, np.asarray(vector, dtype=np.float32).tobytes()) for perfil, vector in vectores.items()],
+            )
+
+    #Se leen los embeddings de los perfiles indicados -> {perfil: vector}:
+    def leer_embeddings(self, perfiles, modelo):
+        perfiles = list(perfiles)
+        if not perfiles:
+            return {}
+        with self._conectar() as con:
+            filas = con.execute(
+                f"SELECT perfil, vector FROM embeddings WHERE modelo = ? AND perfil IN ({', '.join('?' * len(perfiles))})",
+                [modelo, *perfiles],
+            ).fetchall()
+        return {perfil: np.frombuffer(vector, dtype=np.float32) for perfil, vector in filas}
+
+    #Se guardan los bloques de enlaces de una página de currículos autonómicos (todas sus comunidades autónomas a la vez).
+    #Si la página no tiene ningún bloque se guarda una entrada negativa (comunidad CCAA_SIN_CURRICULOS y lista de enlaces vacía):
+    def guardar_curriculos(self, url, curriculos, fecha):
+        filas = []
+        ordenes = {}
+        for ccaa, enlaces in zip(curriculos["ccaa_alt"], curriculos["links-curriculo-ccaa"]):
+            orden = ordenes.get(ccaa, 0)
+            ordenes[ccaa] = orden + 1
+            filas.append((url, ccaa, orden, json.dumps(enlaces, ensure_ascii=False), fecha))
+        if not filas:
+            filas.append((url, CCAA_SIN_CURRICULOS, 0, "[]", fecha))
+        with self._lock, self._conectar() as con:
+            con.execute("DELETE FROM curriculos WHERE url = ?", (url,))
+            con.executemany("INSERT INTO curriculos VALUES (?, ?, ?, ?, ?)", filas)
+
+    #Se leen los currículos cacheados de las páginas indicadas -> {(url, ccaa): [enlaces de cada bloque]}.
+    #Las páginas sin bloques aparecen solo con la clave (url, CCAA_SIN_CURRICULOS):
+    def leer_curriculos(self, urls):
+        urls = list(urls)
+        if not urls:
+            return {}
+        with self._conectar() as con:
+            filas = con.execute(
+                f"SELECT url, ccaa, enlaces FROM curriculos WHERE url IN ({', '.join('?' * len(urls))}) ORDER BY url, ccaa, orden",
+                urls,
+            ).fetchall()
+        curriculos = {}
+        for url, ccaa, enlaces in filas:
+            curriculos.setdefault((url, ccaa), []).append(json.loads(enlaces))
+        return curriculos
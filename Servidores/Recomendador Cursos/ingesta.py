@@ -0,0 +1,158 @@
+#Ingesta offline del catálogo de www.todofp.es en el índice local de centros.
+#Uso:
+#   python ingesta.py                              (todos los tipos de grado de config/enlaces.json)
+#   python ingesta.py --tipo-grado "Grado Medio"
+#   python ingesta.py --revalidar                  (ignora el TTL de la caché y revalida todas las páginas)
+#   python ingesta.py --sin-embeddings             (no calcula los embeddings de los perfiles profesionales)
+#   python ingesta.py --sin-coordenadas            (no geocodifica las localidades y centros)
+
+#Se cargan las librerías:
+import os
+import json
+import argparse
+import logging
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from google import genai
+
+#Se lee el fichero .env (antes de cargar los módulos propios, que leen su configuración al importarse):
+load_dotenv()
+
+from scraping import descargar_pagina, descargar_paginas, obtener_cache
+from cache_http import CACHE_TTL_HORAS
+from todofp import extraer_grados, extraer_centros
+from indice import IndiceCentros
+from perfiles import AlmacenPerfiles
+from prefiltro import embeber_perfiles, EMBEDDINGS_MODELO
+from distancias import CalculadoraTiempos, crear_cliente_mapas
+
+#Se cargan los JSON de configuración:
+with open("config/enlaces.json", "r", encoding="utf-8") as f:
+    ENLACES = json.load(f)
+
+with open("config/ccaas.json", "r", encoding="utf-8") as f:
+    CCAAS = json.load(f)
+
+logger = logging.getLogger(__name__)
+
+#Se descargan el catálogo de un tipo de grado y todas sus páginas "donde-estudiar" y se guardan en el índice:
+def ingestar_tipo_grado(indice, tipo_grado):
+    df_grados = extraer_grados(descargar_pagina(ENLACES[tipo_grado]))
+    paginas_donde_estudiar = descargar_paginas(df_grados["donde-estudiar"].tolist())
+    centros_por_grado = {}
+    for orden, url in enumerate(df_grados["donde-estudiar"]):
+        if url:
+            centros_por_grado[orden] = extraer_centros(paginas_donde_estudiar[url])
+    indice.guardar(tipo_grado, df_grados, centros_por_grado, datetime.now().isoformat(timespec="seconds"))
+    return len(df_grados), sum(len(centros["centro"]) for centros in centros_por_grado.values())
+
+#Se calculan (una sola vez) los embeddings del texto de los PDFs de perfiles profesionales que todavía no lo tengan (los PDFs quedan guardados en el almacén local):
+def calcular_embeddings(indice, client, limitador=None):
+    perfiles = indice.perfiles_sin_embedding(EMBEDDINGS_MODELO)
+    if not perfiles:
+        return 0
+    vectores = embeber_perfiles(client, AlmacenPerfiles().textos(perfiles), limitador)
+    indice.guardar_embeddings(vectores, EMBEDDINGS_MODELO)
+    return len(vectores)
+
+#Se geocodifican (una sola vez) las localidades y centros de un tipo de grado, con el mismo formato de dirección que usa main.py:
+def geocodificar_centros(indice, calculadora, tipo_grado):
+    direcciones = []
+    for provincia, localidad, centro in indice.ubicaciones_centros(tipo_grado):
+        ccaa = CCAAS.get(provincia, "")
+        direcciones.append(localidad + ', ' + provincia + ', ' + ccaa + ' (ES)')
+        direcciones.append(centro + ', ' + localidad + ', ' + provincia + ', ' + ccaa + ' (ES)')
+    coordenadas = calculadora.geocodificar(direcciones)
+    return sum(1 for lat, _ in coordenadas.values() if lat is not None)
+
+#Un lock por tipo de grado (las ingestas de tipos distintos no se esperan entre sí) y los tipos con una actualización en curso:
+_locks = {}
+_actualizando = set()
+_locks_lock = threading.Lock()
+
+def _lock_tipo_grado(tipo_grado):
+    with _locks_lock:
+        return _locks.setdefault(tipo_grado, threading.Lock())
+
+#Se comprueba si la ingesta de un tipo de grado sigue vigente (con el mismo TTL que la caché HTTP de las páginas):
+def ingesta_vigente(indice, tipo_grado):
+    fecha = indice.fecha_ingesta(tipo_grado)
+    return fecha is not None and datetime.now() - fecha < timedelta(hours=CACHE_TTL_HORAS)
+
+#Se actualiza un tipo de grado con los mismos pasos que la ingesta completa: catálogo y centros (si ingestar es True),
+#coordenadas (si se indica la calculadora) y embeddings de los perfiles (si se indica el cliente de Gemini):
+def actualizar_tipo_grado(indice, tipo_grado, calculadora=None, client=None, limitador=None, ingestar=True):
+    try:
+        with _lock_tipo_grado(tipo_grado):
+            if ingestar and not ingesta_vigente(indice, tipo_grado):
+                no_grados, no_centros = ingestar_tipo_grado(indice, tipo_grado)
+                logger.info("%s: %d grados y %d centros indexados en %s", tipo_grado, no_grados, no_centros, indice.ruta)
+            if calculadora is not None:
+                no_coordenadas = geocodificar_centros(indice, calculadora, tipo_grado)
+                logger.info("%s: %d localidades y centros con coordenadas", tipo_grado, no_coordenadas)
+            if client is not None:
+                no_embeddings = calcular_embeddings(indice, client, limitador)
+                logger.info("%d perfiles profesionales embebidos con %s", no_embeddings, EMBEDDINGS_MODELO)
+    except Exception:
+        logger.exception("No se ha podido actualizar el índice de %s; se sigue usando la ingesta anterior", tipo_grado)
+    finally:
+        with _locks_lock:
+            _actualizando.discard(tipo_grado)
+
+#Se lanza la actualización de un tipo de grado en segundo plano (salvo que ya haya una en curso para ese tipo de grado):
+def actualizar_en_segundo_plano(indice, tipo_grado, calculadora=None, client=None, limitador=None, ingestar=True):
+    with _locks_lock:
+        if tipo_grado in _actualizando:
+            return
+        _actualizando.add(tipo_grado)
+    threading.Thread(
+        target=actualizar_tipo_grado,
+        args=(indice, tipo_grado, calculadora, client, limitador, ingestar),
+        name=f"ingesta-{tipo_grado}",
+        daemon=True,
+    ).start()
+
+#Se asegura que un tipo de grado está en el índice:
+#   - Si todavía no se ha ingestado, se ingesta ahora (evitando que dos peticiones lo hagan a la vez) y sus coordenadas y
+#     embeddings se calculan después, en segundo plano.
+#   - Si su ingesta ha caducado, se sigue usando la existente y se actualiza en segundo plano (sin bloquear la petición).
+def asegurar_tipo_grado(indice, tipo_grado, calculadora=None, client=None, limitador=None):
+    if ingesta_vigente(indice, tipo_grado):
+        return
+    if indice.fecha_ingesta(tipo_grado) is not None:
+        actualizar_en_segundo_plano(indice, tipo_grado, calculadora, client, limitador)
+        return
+    with _lock_tipo_grado(tipo_grado):
+        ingestado = indice.fecha_ingesta(tipo_grado) is None
+        if ingestado:
+            ingestar_tipo_grado(indice, tipo_grado)
+    if ingestado:
+        actualizar_en_segundo_plano(indice, tipo_grado, calculadora, client, limitador, ingestar=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construye el índice local de grados y centros formativos a partir de www.todofp.es.")
+    parser.add_argument("--tipo-grado", choices=list(ENLACES.keys()), action="append", help="Tipo de grado a ingestar (por defecto, todos).")
+    parser.add_argument("--revalidar", action="store_true", help="Revalida todas las páginas aunque su copia en caché siga vigente.")
+    parser.add_argument("--sin-embeddings", action="store_true", help="No calcula los embeddings de los perfiles profesionales.")
+    parser.add_argument("--sin-coordenadas", action="store_true", help="No geocodifica las localidades y centros.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.revalidar:
+        obtener_cache().ttl_segundos = 0
+
+    indice = IndiceCentros()
+    if not args.sin_coordenadas:
+        calculadora = CalculadoraTiempos(crear_cliente_mapas(os.getenv("GOOGLE_CLOUD_MAPS_API_KEY")))
+    for tipo_grado in args.tipo_grado or list(ENLACES.keys()):
+        no_grados, no_centros = ingestar_tipo_grado(indice, tipo_grado)
+        logging.info("%s: %d grados y %d centros indexados en %s", tipo_grado, no_grados, no_centros, indice.ruta)
+        if not args.sin_coordenadas:
+            no_coordenadas = geocodificar_centros(indice, calculadora, tipo_grado)
+            logging.info("%s: %d localidades y centros con coordenadas", tipo_grado, no_coordenadas)
+
+    if not args.sin_embeddings:
+        client = genai.Client(vertexai=True,api_key=os.getenv("GOOGLE_CLOUD_GEMINI_API_KEY"))
+        no_embeddings = calcular_embeddings(indice, client)
+        logging.info("%d perfiles profesionales embebidos con %s", no_embeddings, EMBEDDINGS_MODELO)
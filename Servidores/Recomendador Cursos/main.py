@@ -1,29 +1,37 @@
 #Se cargan las librerías:
 import os
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-import requests
-from bs4 import BeautifulSoup
-import requests
 import pandas as pd
 from google import genai
-from google.genai import types
-import googlemaps
-from datetime import datetime, time
-import time as time_lib
 import json
-import random
-import base64
-from pathlib import Path
-from pptx import Presentation
+import queue
+import asyncio
+import logging
+import threading
 from typing import List
 
 #Se lee el fichero .env:
 load_dotenv()
 
+#Se cargan los módulos propios del servicio (leen su configuración del .env al importarse):
+from scraping import InformeTiempos
+from indice import IndiceCentros
+from ingesta import asegurar_tipo_grado
+from distancias import CalculadoraTiempos, crear_cliente_mapas
+from concurrencia import LimitadorPeticiones, GEMINI_MAX_CONCURRENCIA, mapear_en_paralelo, comprobar_cancelacion, PeticionCancelada
+from afinidad import puntuar_perfiles
+from prefiltro import prefiltrar
+from torneo import clasificar
+from perfiles import AlmacenPerfiles
+from curriculos import enriquecer_curriculos
+from cache_resultados import CacheResultados, clave_peticion
+
+logger = logging.getLogger(__name__)
+
 #Se inicializa FastAPI:
 app = FastAPI(title="Mi API")
 
@@ -53,12 +61,17 @@ class DegreesRequest(BaseModel):
         }
     }
 
+#Petición por lotes (por ejemplo, todos los alumnos de una clase):
+class BatchDegreesRequest(BaseModel):
+    alumnos: List[DegreesRequest] = Field(..., alias="alumnos")
+
 #Se cargan las variables necesarias:
 GOOGLE_CLOUD_GEMINI_API_KEY=os.getenv("GOOGLE_CLOUD_GEMINI_API_KEY")
 GOOGLE_CLOUD_MAPS_API_KEY=os.getenv("GOOGLE_CLOUD_MAPS_API_KEY")
 FACTOR_DISTANCIA_1=int(os.getenv("FACTOR_DISTANCIA_1"))
 NO_ITERACIONES_INTERESES_PERFILES = int(os.getenv("NO_ITERACIONES_INTERESES_PERFILES"))
 MAX_DISTANCIA_MINUTOS = int(os.getenv("MAX_DISTANCIA_MINUTOS"))
+LOTE_MAX_ALUMNOS_PARALELO = int(os.getenv("LOTE_MAX_ALUMNOS_PARALELO", "4"))
 
 #Se cargan lso diferentes JSON de configuración:
 with open("config/ccaas.json", "r", encoding="utf-8") as f:
@@ -70,15 +83,31 @@ with open("config/enlaces.json", "r", encoding="utf-8") as f:
 with open("config/provincias.json", "r", encoding="utf-8") as f:
     PROVINCIAS = json.load(f)
 
-#Se establece la conexión con Google Maps:
-gmaps = googlemaps.Client(key=GOOGLE_CLOUD_MAPS_API_KEY)
+#Se abre el índice local de grados y centros formativos:
+indice = IndiceCentros()
+
+#Se establece la conexión con Google Maps (o con el sustituto local si se ha configurado MAPS_TIEMPOS_LOCALES):
+gmaps = crear_cliente_mapas(GOOGLE_CLOUD_MAPS_API_KEY)
+calculadora_tiempos = CalculadoraTiempos(gmaps)
 
 #Se establece la conexión con VertexAI (Google Cloud Platform):
 client = genai.Client(vertexai=True,api_key=GOOGLE_CLOUD_GEMINI_API_KEY)
 
-# Se realiza la llamada principal
-@app.post("/salidas_profesionales")
-def salidas_profesionales(req: DegreesRequest):
+#Se abre el almacén local de PDFs de perfiles profesionales (se descargan una sola vez y, si se envían como PDF, se suben una sola vez a Gemini):
+almacen_perfiles = AlmacenPerfiles(client=client)
+
+#Se crea un limitador compartido por todas las peticiones para respetar la cuota de Gemini:
+limitador_gemini = LimitadorPeticiones()
+
+#Se crea la caché de respuestas completas (peticiones idénticas, una vez normalizadas, no se vuelven a calcular):
+cache_resultados = CacheResultados()
+
+#Campos de la petición de los que dependen los centros candidatos (todo salvo los intereses del alumno):
+CAMPOS_UBICACION = ("tipo_grado", "localidad", "provincia", "modalidad", "turno", "vehiculo")
+
+#Se obtienen los centros que imparten el tipo de grado y a los que el alumno puede llegar a tiempo (no depende de sus intereses).
+#Si se activa cancelado (threading.Event), no se realizan las consultas a Google Maps que queden pendientes:
+def centros_cercanos(req, informe, cancelado=None):
      
      #Se pasan las variables:
     TIPO_GRADO = req.tipo_grado 
@@ -87,327 +116,261 @@ def salidas_profesionales(req: DegreesRequest):
     MODALIDAD = [req.modalidad]
     TURNO = req.turno
     VEHICULO = req.vehiculo
-    INTERESES = req.intereses
-
-    #Se extrae, mediante WebScrapping, lso diferentes grados disponibles del Ministerio de Cultura (www.todofp.es):
-    url = ENLACES[TIPO_GRADO]
-    response = requests.get(url)
-    response.raise_for_status()
-    soup = BeautifulSoup(response.content, 'html.parser')
-
-    #Se genera un dataframe en pandas con todo el contenido en formato tabla:
-    contenedor_div = soup.find('div', {'id': 'contenedor'})
-    content={}
-    df = pd.DataFrame()
-    if contenedor_div:
-        table = contenedor_div.find('table')
-        if table:
-            rows = table.find_all('tr')
-            for row in rows:
-                cells = row.find_all('td')
-                if cells:
-                    for cell in cells:
-                        links = cell.find_all('a')
-                        if links:                            
-                            link_array = []
-                            for link in links:
-                                if link['href'].startswith('http'):
-                                    link_url = link['href']
-                                else:
-                                    link_url = 'https://www.todofp.es' + link['href']
-                                if cell.get("headers", [])[0] == "real-decreto":
-                                    if link.get_text() == "":
-                                        link_array.append({"BOE":link_url})
-                                    else:
-                                        link_array.append({link.get_text():link_url})
-                                link_array.append(link_url)
-                            content[cell.get("headers", [])[0]]=link_array
-                if content != {}:
-                    df_json = pd.json_normalize(content)
-                    df = pd.concat([df.reset_index(drop=True), df_json.reset_index(drop=True)], axis=0)
-    df=df.reset_index(drop=True)
-    df["titulacion"] = df["titulacion"].apply(lambda x: x[0] if isinstance(x, list) and len(x) > 0 else None)
-    df["curriculo-mecd"] = df["curriculo-mecd"].apply(lambda x: x[0] if isinstance(x, list) and len(x) > 0 else None)
-    df["curriculo-ccaa"] = df["curriculo-ccaa"].apply(lambda x: x[0] if isinstance(x, list) and len(x) > 0 else None)
-    df["perfiles-profesionales"] = df["perfiles-profesionales"].apply(lambda x: x[0] if isinstance(x, list) and len(x) > 0 else None)
-    df["donde-estudiar"] = df["donde-estudiar"].apply(lambda x: x[0] if isinstance(x, list) and len(x) > 0 else None)
-
-    #Se expande el dataframe para obtener los centros en lso que se imparten las formaciones y se verifica si concuerdan con lso intereses del usuario:
-    df_expanded=pd.DataFrame()
-    for idx, row in df.iterrows():
-        if len(row["donde-estudiar"])>0:
-            response = requests.get(row["donde-estudiar"])
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            table = soup.find('table')
-            if table:
-                rows_table = table.find_all('tr')
-                for row_table in rows_table:
-                    cells = row_table.find_all('td')
-                    if cells:
-                        if cells[0].get_text(strip=True) in PROVINCIAS[PROVINCIA] and cells[5].get_text(strip=True) in MODALIDAD:
-                            if cells[2].get_text() != "" and cells[3].get_text() != "":
-                                centro = cells[2].get_text() + ' ' + cells[3].get_text()
-                            elif cells[2].get_text() != "":
-                                centro = cells[2].get_text()
-                            elif cells[3].get_text() != "":
-                                centro = cells[3].get_text()
-                            df_json = pd.json_normalize({"real-decreto":row["real-decreto"],"curriculo-mecd":row["curriculo-mecd"],"curriculo-ccaa":row["curriculo-ccaa"],"perfiles-profesionales":row["perfiles-profesionales"], "ccaa": CCAAS[cells[0].get_text()], "provincia": cells[0].get_text(),"localidad": cells[1].get_text(),"centro": centro})
-                            df_expanded = pd.concat([df_expanded.reset_index(drop=True), df_json.reset_index(drop=True)], axis=0)
-    df_expanded=df_expanded.reset_index(drop=True)
 
-    #Se filtran las localidades cercanas al usuario en base a sus medios de desplazamiento:
-    llegada = datetime.now()
-    if TURNO == "mañana":
-        llegada = datetime.combine(llegada.date(), time(8, 0))
-    elif TURNO == "tarde":
-        llegada = datetime.combine(llegada.date(), time(15, 0))
-    llegada = int(llegada.timestamp())
+    #Se obtienen del índice local los centros que imparten el tipo de grado en las provincias y modalidad indicadas.
+    #Si el tipo de grado todavía no se ha ingestado (ver ingesta.py) se construye ahora a partir de www.todofp.es; si su ingesta
+    #ha caducado, se usa la existente y se actualiza en segundo plano:
+    asegurar_tipo_grado(indice, TIPO_GRADO, calculadora_tiempos, client, limitador_gemini)
+    informe.marcar("catalogo")
+
+    df_expanded = indice.consultar_centros(TIPO_GRADO, PROVINCIAS[PROVINCIA], MODALIDAD)
+    df_expanded.insert(4, "ccaa", df_expanded["provincia"].map(CCAAS))
+    #Los centros de provincias que no están en config/ccaas.json no tienen comunidad autónoma con la que construir su dirección, así que se descartan:
+    sin_ccaa = df_expanded["ccaa"].isna()
+    if sin_ccaa.any():
+        logger.warning("Provincias sin comunidad autónoma en config/ccaas.json (se descartan %d centros): %s", int(sin_ccaa.sum()), sorted(df_expanded.loc[sin_ccaa, "provincia"].unique()))
+        df_expanded = df_expanded[~sin_ccaa]
+    df_expanded=df_expanded.reset_index(drop=True)
+    informe.marcar("consulta_centros")
 
+    #Se filtran las localidades cercanas al usuario en base a sus medios de desplazamiento (una sola llamada a Google Maps por cada 25 destinos no cacheados):
     places_tmp=[]
-    places=[]
     for idx, row in df_expanded.iterrows():
         places_tmp.append(row["localidad"]+', ' + row["provincia"] +', ' + row["ccaa"] + ' (ES)')
-    places_tmp=list(set(places_tmp))
-
-    for place in places_tmp:
-        try:
-            distance=gmaps.distance_matrix(
-                    LOCALIDAD,
-                    place, 
-                    mode=VEHICULO,      
-                    arrival_time=llegada,
-                    language='es'
-                )
-            distance=distance['rows'][0]['elements'][0]['duration']['value']/60
-            if distance <= MAX_DISTANCIA_MINUTOS*(1+FACTOR_DISTANCIA_1/100):
-                places.append(place)
-        except:
-            pass
+    places = calculadora_tiempos.filtrar(LOCALIDAD, places_tmp, VEHICULO, TURNO, MAX_DISTANCIA_MINUTOS*(1+FACTOR_DISTANCIA_1/100))
 
     concatFields = (df_expanded["localidad"].astype(str) + ", " + df_expanded["provincia"].astype(str) + ", " + df_expanded["ccaa"].astype(str) + " (ES)")
     mask = concatFields.isin(places)
     df_filtrado = df_expanded[mask].copy() 
     df_filtrado=df_filtrado.reset_index(drop=True)
+    informe.marcar("distancias_localidades")
 
+    comprobar_cancelacion(cancelado)
     places_tmp=[]
-    places=[]
     for idx, row in df_filtrado.iterrows():
         places_tmp.append(row["centro"]+', ' +row["localidad"]+', ' + row["provincia"] +', ' + row["ccaa"] + ' (ES)')
-    places_tmp=list(set(places_tmp))
-    places_tmp
-
-    for place in places_tmp:
-        try:
-            distance=gmaps.distance_matrix(
-                    LOCALIDAD,
-                    place, 
-                    mode=VEHICULO,      
-                    arrival_time=llegada,
-                    language='es'
-                )
-            distance=distance['rows'][0]['elements'][0]['duration']['value']/60
-            if distance <= MAX_DISTANCIA_MINUTOS:
-                places.append(place)
-        except:
-            pass
+    places = calculadora_tiempos.filtrar(LOCALIDAD, places_tmp, VEHICULO, TURNO, MAX_DISTANCIA_MINUTOS)
 
     concatFields = (df_filtrado["centro"].astype(str) + ", " + df_filtrado["localidad"].astype(str) + ", " + df_filtrado["provincia"].astype(str) + ", " + df_filtrado["ccaa"].astype(str) + " (ES)")
     mask = concatFields.isin(places)
     df_filtrado = df_filtrado[mask].copy() 
     df_filtrado=df_filtrado.reset_index(drop=True)
-    df_filtrado
-  
-    #Se extraen los curriculos de las comunidades autónomas:
-    curriculos_ccaa=[]
-    for idx, row in df_filtrado.iterrows():
-        curriculos_ccaa.append(row["curriculo-ccaa"])
-    curriculums_ccaa=list(set(curriculos_ccaa))
-    curriculums_ccaa
-
-    pd_curriculumns_ccaa=pd.DataFrame()
-    for curriculum_ccaa in curriculums_ccaa:
-        response = requests.get(curriculum_ccaa)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        elementos = soup.find_all('div', class_='elemento')    
-        for elemento in elementos:
-            ccaa = elemento.find('p', class_='titulo')
-            if ccaa:
-                bloque_enlaces = elemento.find_all('div', class_='cte') 
-                if bloque_enlaces:
-                    for bloque in bloque_enlaces:
-                        links=[]
-                        enlaces = bloque.find_all('a')
-                        for enlace in enlaces:
-                            href = enlace.get('href')
-                            if not href.startswith('http'):
-                                href = 'https://www.todofp.es' + href
-                            links.append({enlace.get_text():href})
-                        if links != []:
-                            df_json = pd.json_normalize({"curriculo-ccaa":curriculum_ccaa, "ccaa_alt":ccaa.getText(), "links-curriculo-ccaa":links})
-                            pd_curriculumns_ccaa = pd.concat([pd_curriculumns_ccaa.reset_index(drop=True), df_json.reset_index(drop=True)], axis=0)
-
-    df_final = df_filtrado.merge(pd_curriculumns_ccaa,how="left",on="curriculo-ccaa")
-    df_final = df_final[df_final["ccaa"].eq(df_final["ccaa_alt"])].copy()
-    df_final = df_final.drop(columns=["ccaa", "ccaa_alt", "curriculo-ccaa","provincia"])
-    df_final = df_final.rename(columns={"links-curriculo-ccaa": "curriculo-ccaa"})
-    df_final=df_final.reset_index(drop=True)
-    df_final
-
-    #Se evalua el potencial interés que podría tener un curso para el usuario mediante Inteligencia Artificial:
-    pd_eval = pd.DataFrame()
-    for idx, row in df_final.iterrows():
-
-        model = "gemini-2.5-flash"
-
-        document = types.Part.from_uri(
-            file_uri=row["perfiles-profesionales"],
-            mime_type="application/pdf",
-        )
-
-        contents = [
-            types.Content(
-                role="user",
-                parts=[
-                    types.Part.from_text(text="Actúa como un orientador vocacional experto en formación profesional y análisis de perfiles laborales."),
-                    types.Part.from_text(text="Mi perfil: Soy un estudiante con los siguientes intereses y habilidades:"),
-                    types.Part.from_text(text=INTERESES),
-                    types.Part.from_text(text="Tu tarea:"),
-                    types.Part.from_text(text="\t 1. Accede y analiza el contenido del siguiente documento sobre las salidas profesionales de un Grado Formativo:"),
-                    document,
-                    types.Part.from_text(text="\t 2. Comparte una puntuación de 0 a 100 que represente el nivel de afinidad entre mis intereses y lo que este grado ofrece profesionalmente."),
-                    types.Part.from_text(text="Para tu análisis, utiliza estos criterios:"),
-                    types.Part.from_text(text="\t · Afinidad Directa: ¿Las tareas del trabajo coinciden con lo que me gusta hacer?"),
-                    types.Part.from_text(text="\t · Proyección de Futuro: ¿Este perfil profesional me permitirá desarrollar mis intereses a largo plazo?"),
-                    types.Part.from_text(text="\t · Puntos de Fricción: Identifica qué partes del perfil profesional podrían NO gustarme según mis intereses."),
-                    types.Part.from_text(text="Formato de respuesta: Por favor, y muy importante, proporciona solo la puntuación (número entero del 0 a 100)."),
-                ]
-            )
-        ]
-
-        generate_content_config = types.GenerateContentConfig(
-            temperature = 1,
-            top_p = 0.95,
-            seed = 0,
-            max_output_tokens = 65535,
-            safety_settings = [
-                types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
-            ],
-            #thinking_config=types.ThinkingConfig(thinking_level="HIGH"),
-            response_mime_type = "application/json",
-            response_schema = {"type":"OBJECT","properties":{"puntuacion_afinidad":{"type":"INTEGER","description":"Un valor entero de 0 a 100 que representa el grado de coincidencia entre los intereses del usuario y los perfiles profesionales del grado."}},"required":["puntuacion_afinidad"]},
-        )
-        
-
-        for iter in range(1):
-
-            response = client.models.generate_content(
-                model=model,
-                contents=contents,
-                config=generate_content_config
-            )
-
-            output=response.candidates[0].content.parts[0].text
-            output = json.loads(output)
-            puntuacion = output.get("puntuacion_afinidad")
-
-            df_json = pd.json_normalize({"perfiles-profesionales":row["perfiles-profesionales"], "puntuacion":puntuacion})
-            pd_eval = pd.concat([pd_eval.reset_index(drop=True), df_json.reset_index(drop=True)], axis=0)
-            #time_lib.sleep(60)
+    informe.marcar("distancias_centros")
+    return df_filtrado
+
+#Se evalúan los centros candidatos según los intereses del alumno y se devuelven los 3 grados recomendados:
+def evaluar_intereses(df_filtrado, intereses, informe, emitir=None, cancelado=None):
+
+    INTERESES = intereses
+    emitir = emitir or (lambda evento, datos: None)
+
+    #Los currículos autonómicos no se descargan todavía: solo se necesitan para los grados recomendados (ver más abajo).
+    df_final = df_filtrado
+
+    #Se evalua el potencial interés que podría tener un curso para el usuario mediante Inteligencia Artificial.
+    #Cada perfil profesional (grado) se puntúa una sola vez, aunque se imparta en varios centros, y la puntuación se asigna después a todos sus centros.
+    #Las llamadas se realizan en paralelo (GEMINI_MAX_CONCURRENCIA) respetando la cuota (GEMINI_MAX_PETICIONES_MINUTO) y se recogen en el orden de df_final:
+    #Antes, se descartan los grados menos similares a los intereses del alumno (embeddings precalculados, ver prefiltro.py) y solo los PREFILTRO_TOP_K más similares se evalúan con Gemini:
+    perfiles = list(dict.fromkeys(df_final["perfiles-profesionales"].dropna()))
+    perfiles = prefiltrar(client, indice, INTERESES, perfiles, limitador=limitador_gemini)
+    informe.marcar("prefiltro")
+    puntuaciones = puntuar_perfiles(
+        client, limitador_gemini, almacen_perfiles, INTERESES, perfiles, GEMINI_MAX_CONCURRENCIA,
+        al_puntuar=lambda perfil, puntuacion: emitir("puntuacion", {"perfiles-profesionales": perfil, "puntuacion": puntuacion}),
+        cancelado=cancelado,
+    )
+    pd_eval = pd.DataFrame({"perfiles-profesionales": perfiles, "puntuacion": puntuaciones})
+    df_final = df_final.merge(pd_eval, how="inner", on="perfiles-profesionales")
 
     pd_eval=pd_eval.reset_index(drop=True)
-    pd_eval
-
-    #Tomamos los 5 valroes con un posible mayr impacto para el usuario y volvemos a evaluarlos:
-    pd_eval = pd_eval.sort_values(by='puntuacion', ascending=False).head(5)
-    pd_eval2 = pd.DataFrame()
-    for idx, rowi in pd_eval.iterrows():
-        for jdx, rowj in pd_eval.iterrows():
-            if idx > jdx:
-                
-
-                model = "gemini-2.5-flash"
-
-                document1 = types.Part.from_uri(
-                    file_uri=rowi["perfiles-profesionales"],
-                    mime_type="application/pdf",
-                )
-
-                document2 = types.Part.from_uri(
-                    file_uri=rowj["perfiles-profesionales"],
-                    mime_type="application/pdf",
-                )
-
-                contents = [
-                    types.Content(
-                        role="user",
-                        parts=[
-                            types.Part.from_text(text="Actúa como un orientador vocacional experto en formación profesional y análisis de perfiles laborales."),
-                            types.Part.from_text(text="Mi perfil: Soy un estudiante con los siguientes intereses y habilidades:"),
-                            types.Part.from_text(text=INTERESES),
-                            types.Part.from_text(text="Tu tarea:"),
-                            types.Part.from_text(text="\t 1. Accede y analiza el contenido del siguiente documento sobre las salidas profesionales de un Grado Formativo:"),
-                            document1,
-                            types.Part.from_text(text="\t 2. Accede y analiza el contenido del siguiente documento sobre las salidas profesionales de otro Grado Formativo:"),
-                            document2,
-                            types.Part.from_text(text="\t 3. Indica qué curso tiene un mayor grado de afinidad en relación a mis intereses y lo que ambos grados ofrecen profesionalmente."),
-                            types.Part.from_text(text="Para tu análisis, utiliza estos criterios:"),
-                            types.Part.from_text(text="\t · Afinidad Directa: ¿Las tareas del trabajo coinciden con lo que me gusta hacer?"),
-                            types.Part.from_text(text="\t · Proyección de Futuro: ¿Este perfil profesional me permitirá desarrollar mis intereses a largo plazo?"),
-                            types.Part.from_text(text="\t · Puntos de Fricción: Identifica qué partes del perfil profesional podrían NO gustarme según mis intereses."),
-                            types.Part.from_text(text="Formato de respuesta: Por favor, y muy importante, dependiendo si el grado de mayor afinidad es el indicado en el punto 1 o en el punto 2, proporciona solo el número del grado que me puede generar un mayor interés."),
-                        ]
-                    )
-                ]
-
-        generate_content_config = types.GenerateContentConfig(
-            temperature = 0.5,
-            top_p = 0.95,
-            seed = random.randint(0,100000),
-            max_output_tokens = 65535,
-            safety_settings = [
-                types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
-            ],
-            #thinking_config=types.ThinkingConfig(thinking_level="HIGH"),
-            response_mime_type = "application/json",
-            response_schema = {"type":"OBJECT","properties":{"grado_de_mayor_interes":{"type":"INTEGER","description":"Un valor entero que admite solo los valores 1 o 2, devolviendo 1 en aquellos casos que el documento citado en el primer punto me pueda resultar más interesante o en caso contrario 2 si el documento en el segundo punto es más interesante en base a mis intereses."}},"required":["grado_de_mayor_interes"]},
-        )
-        
-
-        for iter in range(NO_ITERACIONES_INTERESES_PERFILES):
-
-            response = client.models.generate_content(
-                model=model,
-                contents=contents,
-                config=generate_content_config
-            )
-
-            output=response.candidates[0].content.parts[0].text
-            output = json.loads(output)
-            grado_de_mayor_interes = str(output.get("grado_de_mayor_interes"))
-
-            if grado_de_mayor_interes == "1":
-                df_json = pd.json_normalize({"perfiles-profesionales":rowi["perfiles-profesionales"]})
-            else:
-                df_json = pd.json_normalize({"perfiles-profesionales":rowj["perfiles-profesionales"]})
-
-            pd_eval2 = pd.concat([pd_eval2.reset_index(drop=True), df_json.reset_index(drop=True)], axis=0)
-            #time_lib.sleep(60)
-
-    pd_eval2=pd_eval2.reset_index(drop=True)
-    top_vals = (pd_eval2["perfiles-profesionales"].value_counts(dropna=False).head(3).index)
-    df_final_applied = df_final[df_final["perfiles-profesionales"].isin(top_vals)]
+    informe.marcar("afinidad")
+
+    #Tomamos los 5 grados (distintos) con un posible mayr impacto para el usuario y volvemos a evaluarlos mediante un torneo por parejas (ver torneo.py).
+    #Se realizan como máximo NO_ITERACIONES_INTERESES_PERFILES rondas, deteniéndose antes si el top 3 ya está resuelto:
+    pd_eval = pd_eval.sort_values(by='puntuacion', ascending=False, kind="stable").head(5)
+    top_vals = clasificar(client, limitador_gemini, almacen_perfiles, INTERESES, pd_eval["perfiles-profesionales"].tolist(), 3, NO_ITERACIONES_INTERESES_PERFILES, GEMINI_MAX_CONCURRENCIA, cancelado=cancelado)
+    df_final_applied = df_final[df_final["perfiles-profesionales"].isin(top_vals)].copy()
+    df_final_applied = df_final_applied.sort_values(by="perfiles-profesionales", key=lambda perfiles: perfiles.map(top_vals.index), kind="stable")
     df_final_applied=df_final_applied.reset_index(drop=True)
-    df_final_applied
+    informe.marcar("torneo")
+    comprobar_cancelacion(cancelado)
+
+    #Se extraen los curriculos de las comunidades autónomas solo de los grados recomendados (las páginas ya procesadas se leen del índice local, por URL y comunidad autónoma):
+    df_final_applied = enriquecer_curriculos(indice, df_final_applied)
+    #La puntuación de afinidad solo se usa para ordenar: la respuesta mantiene las mismas columnas que antes:
+    df_final_applied = df_final_applied.drop(columns=["ccaa", "curriculo-ccaa","provincia","puntuacion"])
+    df_final_applied = df_final_applied.rename(columns={"links-curriculo-ccaa": "curriculo-ccaa"})
+    df_final_applied=df_final_applied.reset_index(drop=True)
+    informe.marcar("curriculos")
+
+    return df_final_applied.to_dict(orient="records")
+
+#Se calculan las recomendaciones de una petición. Si se indica emitir(evento, datos), se notifican los resultados intermedios
+#("candidatos" tras el filtrado por distancia y "puntuacion" por cada grado evaluado) a medida que están disponibles.
+#Si se activa cancelado (threading.Event), el cálculo se interrumpe con PeticionCancelada antes de la siguiente llamada a Gemini o Google Maps:
+def recomendar(req, informe, emitir=None, cancelado=None):
+    emitir = emitir or (lambda evento, datos: None)
+    df_filtrado = centros_cercanos(req, informe, cancelado)
+    emitir("candidatos", df_filtrado.drop(columns=["ccaa", "provincia"]).to_dict(orient="records"))
+    comprobar_cancelacion(cancelado)
+    return evaluar_intereses(df_filtrado, req.intereses, informe, emitir, cancelado)
+
+#Se consulta la caché de respuestas -> (clave, resultado guardado o None, estado "HIT"/"MISS"/"BYPASS").
+#Se omite la caché con el parámetro ?sin_cache=true o con la cabecera "Cache-Control: no-cache" (el nuevo resultado sí se guarda):
+def consultar_cache(req, request, sin_cache):
+    clave = clave_peticion(req.model_dump())
+    if sin_cache or "no-cache" in request.headers.get("cache-control", ""):
+        cache_resultados.omitir()
+        return clave, None, "BYPASS"
+    resultado = cache_resultados.obtener(clave)
+    return clave, resultado, "HIT" if resultado is not None else "MISS"
+
+def tiempos_ms(informe):
+    return {nombre: round(segundos*1000, 1) for nombre, segundos in informe.etapas.items()}
 
-    #Porporcionamos la respuesta:
-    data = df_final_applied.to_dict(orient="records")
+# Se realiza la llamada principal
+@app.post("/salidas_profesionales")
+def salidas_profesionales(req: DegreesRequest, request: Request, sin_cache: bool = False):
+
+    #Se inicializa el informe de tiempos por etapa:
+    informe = InformeTiempos()
+    clave, resultado, estado = consultar_cache(req, request, sin_cache)
+    if resultado is None:
+        data = recomendar(req, informe)
+        cache_resultados.guardar(clave, {"data": data, "tiempos": tiempos_ms(informe)})
+    else:
+        data = resultado["data"]
+        informe.marcar("cache")
+    informe.registrar(f"/salidas_profesionales ({estado})")
 
-    return JSONResponse(content={"data": data})
+    #Porporcionamos la respuesta:
+    return JSONResponse(content={"data": data}, headers={"Server-Timing": informe.server_timing(), "X-Cache": estado})
+
+#Se consultan los contadores de la caché de respuestas:
+@app.get("/salidas_profesionales/cache")
+def estadisticas_cache():
+    return cache_resultados.estadisticas()
+
+#Se vacía la caché de respuestas (por ejemplo, tras una nueva ingesta del catálogo):
+@app.delete("/salidas_profesionales/cache")
+def vaciar_cache():
+    cache_resultados.vaciar()
+    return cache_resultados.estadisticas()
+
+#Recomendaciones para varios alumnos a la vez. El catálogo, el filtrado de centros y los tiempos de desplazamiento se calculan
+#una sola vez por cada combinación distinta de tipo de grado, localidad, provincia, modalidad, turno y vehículo; solo la evaluación
+#de los intereses (afinidad, torneo y currículos) se realiza por alumno, con como máximo LOTE_MAX_ALUMNOS_PARALELO alumnos a la vez.
+#Las llamadas a Gemini de todos los alumnos comparten el límite del proceso (GEMINI_MAX_CONCURRENCIA, ver concurrencia.py), así
+#que evaluar varios alumnos en paralelo no multiplica el número de llamadas simultáneas.
+#Los alumnos cuya respuesta ya está en la caché no se recalculan y los alumnos con la misma petición (misma clave de caché) se calculan
+#una sola vez. Las respuestas se devuelven en el mismo orden que los alumnos:
+@app.post("/salidas_profesionales/lote")
+def salidas_profesionales_lote(req: BatchDegreesRequest, request: Request, sin_cache: bool = False):
+
+    informe = InformeTiempos()
+    alumnos = req.alumnos
+    consultas = [consultar_cache(alumno, request, sin_cache) for alumno in alumnos]
+    respuestas = [{"data": resultado["data"], "cache": estado} if resultado is not None else None for _, resultado, estado in consultas]
+    pendientes = [idx for idx, respuesta in enumerate(respuestas) if respuesta is None]
+    informe.marcar("cache")
+
+    #Los alumnos pendientes con la misma clave de caché se calculan una sola vez (el primero de ellos) y comparten la respuesta:
+    repetidos = {}
+    for idx in pendientes:
+        repetidos.setdefault(consultas[idx][0], []).append(idx)
+    calculados = [indices[0] for indices in repetidos.values()]
+
+    #Se calculan en paralelo los centros candidatos, una sola vez por ubicación:
+    grupos = {}
+    for idx in calculados:
+        grupos.setdefault(tuple(getattr(alumnos[idx], campo) for campo in CAMPOS_UBICACION), []).append(idx)
+
+    def candidatos_ubicacion(ubicacion):
+        try:
+            return centros_cercanos(alumnos[grupos[ubicacion][0]], InformeTiempos())
+        except Exception as e:
+            logger.exception("Error obteniendo los centros candidatos de %s", ubicacion)
+            return e
+
+    candidatos = dict(zip(grupos, mapear_en_paralelo(candidatos_ubicacion, grupos, LOTE_MAX_ALUMNOS_PARALELO)))
+    informe.marcar("centros")
+    logger.info("Lote: %d alumnos, %d en caché, %d peticiones distintas, %d ubicaciones distintas", len(alumnos), len(alumnos) - len(pendientes), len(calculados), len(grupos))
+
+    #Se evalúan en paralelo los intereses de cada alumno sobre los candidatos de su ubicación:
+    def evaluar(idx):
+        clave, _, estado = consultas[idx]
+        df_filtrado = candidatos[tuple(getattr(alumnos[idx], campo) for campo in CAMPOS_UBICACION)]
+        if isinstance(df_filtrado, Exception):
+            return {"error": str(df_filtrado), "cache": estado}
+        informe_alumno = InformeTiempos()
+        try:
+            data = evaluar_intereses(df_filtrado, alumnos[idx].intereses, informe_alumno)
+        except Exception as e:
+            logger.exception("Error evaluando los intereses del alumno %d del lote", idx)
+            return {"error": str(e), "cache": estado}
+        cache_resultados.guardar(clave, {"data": data, "tiempos": tiempos_ms(informe_alumno)})
+        return {"data": data, "cache": estado}
+
+    for indices, respuesta in zip(repetidos.values(), mapear_en_paralelo(evaluar, calculados, LOTE_MAX_ALUMNOS_PARALELO)):
+        for idx in indices:
+            respuestas[idx] = dict(respuesta, cache=consultas[idx][2])
+    informe.marcar("intereses")
+    informe.registrar(f"/salidas_profesionales/lote ({len(alumnos)} alumnos)")
+
+    return JSONResponse(content={"data": respuestas}, headers={"Server-Timing": informe.server_timing()})
+
+#Se formatea un evento del flujo de resultados como NDJSON (una línea JSON por evento) o como Server-Sent Events:
+def formatear_evento(evento, datos, sse):
+    if sse:
+        return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+    return json.dumps({"evento": evento, "data": datos}, ensure_ascii=False, default=str) + "\n"
+
+#Variante progresiva de /salidas_profesionales: se envían los centros candidatos tras el filtrado por distancia, las puntuaciones
+#de afinidad a medida que llegan y, al final, el top 3 (evento "resultado", con los tiempos por etapa).
+#Por defecto la respuesta es NDJSON; con la cabecera "Accept: text/event-stream" se envía como Server-Sent Events:
+@app.post("/salidas_profesionales/stream")
+def salidas_profesionales_stream(req: DegreesRequest, request: Request, sin_cache: bool = False):
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    cola = queue.Queue()
+    clave, resultado, estado = consultar_cache(req, request, sin_cache)
+    headers = {"Cache-Control": "no-cache", "X-Cache": estado}
+
+    #Si la respuesta ya está en la caché se envía directamente el resultado final:
+    if resultado is not None:
+        return StreamingResponse(iter([formatear_evento("resultado", resultado, sse)]), media_type="text/event-stream" if sse else "application/x-ndjson", headers=headers)
+
+    #Si el cliente se desconecta se activa la señal de cancelación, y el cálculo se detiene antes de la siguiente llamada a Gemini o Google Maps:
+    cancelado = threading.Event()
+
+    def calcular():
+        informe = InformeTiempos()
+        try:
+            data = recomendar(req, informe, emitir=lambda evento, datos: cola.put((evento, datos)), cancelado=cancelado)
+            informe.registrar(f"/salidas_profesionales/stream ({estado})")
+            resultado = {"data": data, "tiempos": tiempos_ms(informe)}
+            cache_resultados.guardar(clave, resultado)
+            cola.put(("resultado", resultado))
+        except PeticionCancelada:
+            logger.info("El cliente se ha desconectado; se cancela el cálculo de las recomendaciones")
+        except Exception as e:
+            logger.exception("Error calculando las recomendaciones")
+            cola.put(("error", {"detalle": str(e)}))
+        finally:
+            cola.put(None)
+
+    threading.Thread(target=calcular, daemon=True).start()
+
+    async def eventos():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    elemento = await asyncio.to_thread(cola.get, timeout=1)
+                except queue.Empty:
+                    continue
+                if elemento is None:
+                    return
+                yield formatear_evento(*elemento, sse)
+        finally:
+            cancelado.set()
+
+    return StreamingResponse(eventos(), media_type="text/event-stream" if sse else "application/x-ndjson", headers=headers)
@@ -0,0 +1,126 @@
+#Almacén local de los PDFs de perfiles profesionales de www.todofp.es.
+#Cada PDF se descarga una sola vez y se guarda en disco junto con una versión compacta de su texto, que es lo que se
+#envía a Gemini (en lugar de que el modelo tenga que descargar y procesar el PDF en cada llamada). Si el PDF no tiene texto
+#extraíble (por ejemplo, un PDF escaneado) o se indica PERFILES_MODO="pdf", se envía el PDF: se sube una sola vez a la Files API
+#de Gemini y las llamadas siguientes reutilizan el archivo subido (si la subida no está disponible, se envía el PDF en línea).
+
+#Se cargan las librerías:
+import os
+import hashlib
+import logging
+import threading
+from io import BytesIO
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from pypdf import PdfReader
+from google.genai import types
+
+from scraping import descargar_paginas
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+PERFILES_FOLDER_NAME = os.getenv("PERFILES_FOLDER_NAME", "perfiles")
+PERFILES_MAX_CARACTERES = int(os.getenv("PERFILES_MAX_CARACTERES", "20000"))
+#"texto": se envía el texto extraído del PDF; "pdf": se envía el PDF guardado en local (sin depender de www.todofp.es):
+PERFILES_MODO = os.getenv("PERFILES_MODO", "texto")
+
+#Se extrae el texto de un PDF de perfiles profesionales (normalizando los espacios en blanco):
+def extraer_texto(pdf):
+    reader = PdfReader(BytesIO(pdf))
+    texto = "\n".join(page.extract_text() or "" for page in reader.pages)
+    return " ".join(texto.split())
+
+class AlmacenPerfiles:
+
+    #client (opcional) es el cliente de Gemini con el que se suben los PDFs; sin él, los PDFs se envían en línea:
+    def __init__(self, carpeta=PERFILES_FOLDER_NAME, modo=PERFILES_MODO, client=None):
+        self.carpeta = Path(carpeta)
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        self.modo = modo
+        self.client = client
+        self._textos = {}
+        self._archivos = {}
+        self._locks_subida = {}
+        self._lock = threading.Lock()
+
+    def _rutas(self, url):
+        clave = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.carpeta / f"{clave}.pdf", self.carpeta / f"{clave}.txt"
+
+    def _guardar(self, url, pdf):
+        ruta_pdf, ruta_txt = self._rutas(url)
+        texto = extraer_texto(pdf)[:PERFILES_MAX_CARACTERES]
+        for ruta, datos in ((ruta_pdf, pdf), (ruta_txt, texto.encode("utf-8"))):
+            tmp = ruta.with_name(f"{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(datos)
+            os.replace(tmp, ruta)
+        return texto
+
+    #Se descargan (en paralelo) los PDFs que todavía no están en el almacén. No pasan por la caché HTTP: el almacén ya los guarda
+    #y, si no, cada PDF quedaría guardado dos veces en disco:
+    def precargar(self, urls):
+        pendientes = [url for url in dict.fromkeys(urls) if url and not self._rutas(url)[1].exists()]
+        for url, pdf in descargar_paginas(pendientes, usar_cache=False).items():
+            self._guardar(url, pdf)
+
+    def texto(self, url):
+        with self._lock:
+            if url in self._textos:
+                return self._textos[url]
+        ruta_pdf, ruta_txt = self._rutas(url)
+        if not ruta_txt.exists():
+            self.precargar([url])
+        texto = ruta_txt.read_text(encoding="utf-8")
+        with self._lock:
+            self._textos[url] = texto
+        return texto
+
+    def pdf(self, url):
+        ruta_pdf, _ = self._rutas(url)
+        if not ruta_pdf.exists():
+            self.precargar([url])
+        return ruta_pdf.read_bytes()
+
+    def textos(self, urls):
+        self.precargar(urls)
+        return {url: self.texto(url) for url in dict.fromkeys(urls) if url}
+
+    #Se sube el PDF de un perfil a la Files API (una sola vez mientras el archivo no caduque). Devuelve None si no se puede subir
+    #(sin cliente o con un cliente de Vertex AI, que no tiene Files API), en cuyo caso no se vuelve a intentar:
+    def _archivo(self, url):
+        if self.client is None:
+            return None
+        with self._lock:
+            lock = self._locks_subida.setdefault(url, threading.Lock())
+        with lock:
+            archivo = self._archivos.get(url)
+            caducado = archivo is not None and archivo.expiration_time is not None and archivo.expiration_time <= datetime.now(timezone.utc) + timedelta(minutes=5)
+            if archivo is None or caducado:
+                ruta_pdf, _ = self._rutas(url)
+                if not ruta_pdf.exists():
+                    self.precargar([url])
+                try:
+                    archivo = self.client.files.upload(file=ruta_pdf, config=types.UploadFileConfig(mime_type="application/pdf"))
+                except Exception as e:
+                    logger.warning("No se ha podido subir el PDF de %s a la Files API; se envía en línea: %s", url, e)
+                    self.client = None
+                    return None
+                self._archivos[url] = archivo
+        return archivo
+
+    def parte_pdf(self, url):
+        archivo = self._archivo(url)
+        if archivo is not None:
+            return types.Part.from_uri(file_uri=archivo.uri, mime_type=archivo.mime_type or "application/pdf")
+        return types.Part.from_bytes(data=self.pdf(url), mime_type="application/pdf")
+
+    #Se construye la parte del prompt con el contenido del perfil profesional (el PDF si no tiene texto extraíble):
+    def parte(self, url):
+        if self.modo == "pdf":
+            return self.parte_pdf(url)
+        texto = self.texto(url)
+        if not texto:
+            return self.parte_pdf(url)
+        return types.Part.from_text(text=f"[Documento: {url}]\n{texto}")
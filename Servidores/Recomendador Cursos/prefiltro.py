@@ -0,0 +1,72 @@
+#Prefiltro de grados por similitud (embeddings) entre los intereses del alumno y el texto de sus perfiles profesionales.
+#Los embeddings de los perfiles se calculan una sola vez (ver ingesta.py) y se guardan en el índice local; en cada petición
+#solo se calcula el embedding de los intereses y se ordenan los candidatos con un producto escalar de NumPy.
+
+#Se cargan las librerías:
+import os
+import logging
+
+import numpy as np
+from google.genai import types
+
+from concurrencia import llamar_gemini, LimitadorPeticiones
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+EMBEDDINGS_MODELO = os.getenv("EMBEDDINGS_MODELO", "text-multilingual-embedding-002")
+EMBEDDINGS_MAX_CARACTERES = int(os.getenv("EMBEDDINGS_MAX_CARACTERES", "8000"))
+EMBEDDINGS_LOTE = int(os.getenv("EMBEDDINGS_LOTE", "16"))
+PREFILTRO_TOP_K = int(os.getenv("PREFILTRO_TOP_K", "15"))
+
+#Se calculan los embeddings (normalizados) de una lista de textos, en lotes. Las llamadas pasan por llamar_gemini (cuota, límite
+#de llamadas simultáneas y reintentos); sin limitador (por ejemplo, en ingesta.py) no se limita la cuota por minuto:
+def embeber(client, textos, task_type, limitador=None):
+    limitador = limitador or LimitadorPeticiones(peticiones_por_minuto=0)
+    vectores = []
+    for inicio in range(0, len(textos), EMBEDDINGS_LOTE):
+        lote = [texto[:EMBEDDINGS_MAX_CARACTERES] for texto in textos[inicio:inicio + EMBEDDINGS_LOTE]]
+        response = llamar_gemini(
+            client,
+            limitador,
+            metodo="embed_content",
+            model=EMBEDDINGS_MODELO,
+            contents=lote,
+            config=types.EmbedContentConfig(task_type=task_type),
+        )
+        vectores += [embedding.values for embedding in response.embeddings]
+    matriz = np.asarray(vectores, dtype=np.float32)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.where(normas == 0, 1, normas)
+
+#Se calculan los embeddings de los documentos (perfiles profesionales) -> {perfil: vector}:
+def embeber_perfiles(client, textos_por_perfil, limitador=None):
+    perfiles = [perfil for perfil, texto in textos_por_perfil.items() if texto]
+    if not perfiles:
+        return {}
+    matriz = embeber(client, [textos_por_perfil[perfil] for perfil in perfiles], "RETRIEVAL_DOCUMENT", limitador)
+    return dict(zip(perfiles, matriz))
+
+#Se seleccionan los top_k perfiles más similares a los intereses del alumno.
+#Los perfiles sin embedding (todavía no ingestados) no se descartan. Se mantiene el orden original de los perfiles.
+#Si no se puede calcular el embedding de los intereses, no se filtra (todos los perfiles pasan a la evaluación):
+def prefiltrar(client, indice, intereses, perfiles, top_k=PREFILTRO_TOP_K, limitador=None):
+    perfiles = list(perfiles)
+    if top_k <= 0 or len(perfiles) <= top_k:
+        return perfiles
+    vectores = indice.leer_embeddings(perfiles, EMBEDDINGS_MODELO)
+    con_vector = [perfil for perfil in perfiles if perfil in vectores]
+    if len(con_vector) <= top_k:
+        return perfiles
+
+    try:
+        consulta = embeber(client, [intereses], "RETRIEVAL_QUERY", limitador)[0]
+    except Exception:
+        logger.exception("Prefiltro: no se ha podido calcular el embedding de los intereses; se evalúan los %d perfiles", len(perfiles))
+        return perfiles
+    similitudes = np.stack([vectores[perfil] for perfil in con_vector]) @ consulta
+    seleccionados = {con_vector[i] for i in np.argsort(-similitudes, kind="stable")[:top_k]}
+    sin_vector = [perfil for perfil in perfiles if perfil not in vectores]
+    if sin_vector:
+        logger.info("Prefiltro: %d perfiles sin embedding (ejecuta ingesta.py); se envían directamente a la evaluación.", len(sin_vector))
+    return [perfil for perfil in perfiles if perfil in seleccionados or perfil not in vectores]
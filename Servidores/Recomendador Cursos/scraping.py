@@ -0,0 +1,101 @@
+#Se cargan las librerías:
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache_http import CacheHTTP, PaginaNoDisponibleOffline, SCRAPING_OFFLINE
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+SCRAPING_MAX_WORKERS = int(os.getenv("SCRAPING_MAX_WORKERS", "8"))
+SCRAPING_TIMEOUT_SEGUNDOS = float(os.getenv("SCRAPING_TIMEOUT_SEGUNDOS", "20"))
+SCRAPING_REINTENTOS = int(os.getenv("SCRAPING_REINTENTOS", "2"))
+
+#Se crea una única sesión compartida para reutilizar las conexiones (keep-alive) con www.todofp.es:
+def crear_sesion(max_conexiones=SCRAPING_MAX_WORKERS):
+    sesion = requests.Session()
+    reintentos = Retry(
+        total=SCRAPING_REINTENTOS,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+    )
+    adaptador = HTTPAdapter(pool_connections=max_conexiones, pool_maxsize=max_conexiones, max_retries=reintentos)
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    return sesion
+
+_sesion = None
+_sesion_lock = threading.Lock()
+
+def obtener_sesion():
+    global _sesion
+    with _sesion_lock:
+        if _sesion is None:
+            _sesion = crear_sesion()
+        return _sesion
+
+_cache = None
+
+def obtener_cache():
+    global _cache
+    with _sesion_lock:
+        if _cache is None:
+            _cache = CacheHTTP()
+        return _cache
+
+#Se descarga una página (a través de la caché en disco) y se devuelve su contenido en bytes.
+#Con usar_cache=False se descarga directamente con la sesión compartida, para los ficheros que ya guarda otro almacén (PDFs de perfiles):
+def descargar_pagina(url, sesion=None, usar_cache=True):
+    sesion = sesion or obtener_sesion()
+    if usar_cache:
+        return obtener_cache().obtener(sesion, url, SCRAPING_TIMEOUT_SEGUNDOS)
+    if SCRAPING_OFFLINE:
+        raise PaginaNoDisponibleOffline(f"No se puede descargar {url}: el modo offline está activado.")
+    response = sesion.get(url, timeout=SCRAPING_TIMEOUT_SEGUNDOS)
+    response.raise_for_status()
+    return response.content
+
+#Se descargan varias páginas de forma concurrente con un número máximo de hilos.
+#Devuelve un diccionario url -> contenido (las URLs repetidas solo se descargan una vez):
+def descargar_paginas(urls, max_workers=SCRAPING_MAX_WORKERS, sesion=None, usar_cache=True):
+    urls_unicas = list(dict.fromkeys(url for url in urls if url))
+    if not urls_unicas:
+        return {}
+    sesion = sesion or obtener_sesion()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls_unicas))) as executor:
+        contenidos = list(executor.map(lambda url: descargar_pagina(url, sesion, usar_cache), urls_unicas))
+    return dict(zip(urls_unicas, contenidos))
+
+#Se registran los tiempos de cada una de las etapas de la llamada:
+class InformeTiempos:
+
+    def __init__(self):
+        self.etapas = {}
+        self._ultima_marca = time.perf_counter()
+
+    #Se cierra la etapa actual (tiempo transcurrido desde la marca anterior) y se abre la siguiente:
+    def marcar(self, nombre):
+        ahora = time.perf_counter()
+        self.etapas[nombre] = self.etapas.get(nombre, 0.0) + (ahora - self._ultima_marca)
+        self._ultima_marca = ahora
+
+    def total(self):
+        return sum(self.etapas.values())
+
+    def resumen(self):
+        return " | ".join(f"{nombre}: {segundos*1000:.0f} ms" for nombre, segundos in self.etapas.items())
+
+    #Formato de la cabecera estándar Server-Timing (https://www.w3.org/TR/server-timing/):
+    def server_timing(self):
+        return ", ".join(f"{nombre};dur={segundos*1000:.1f}" for nombre, segundos in self.etapas.items())
+
+    def registrar(self, titulo):
+        logger.info("%s -> %s (total: %.0f ms)", titulo, self.resumen(), self.total()*1000)
@@ -0,0 +1,5 @@
+#Se añade la carpeta del servicio al path para importar sus módulos desde las pruebas:
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,97 @@
+#Pruebas de distancias.py con el sustituto local de Google Maps (ClienteMapasLocal) y las cachés en una carpeta temporal:
+import pytest
+
+from distancias import (
+    CacheCoordenadas,
+    CacheTiempos,
+    CalculadoraTiempos,
+    ClienteMapasLocal,
+    MAX_DESTINOS_POR_PETICION,
+    distancias_haversine,
+)
+
+MADRID = (40.4168, -3.7038)
+GETAFE = (40.3057, -3.7329)
+TOLEDO = (39.8628, -4.0273)
+BARCELONA = (41.3874, 2.1686)
+
+#Sustituto local que además registra el número de destinos de cada llamada a distance_matrix:
+class ClienteMapasRegistro(ClienteMapasLocal):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lotes = []
+
+    def distance_matrix(self, origins, destinations, **kwargs):
+        self.lotes.append(len(destinations))
+        return super().distance_matrix(origins, destinations, **kwargs)
+
+def crear_calculadora(tmp_path, tiempos=None, coordenadas=None):
+    gmaps = ClienteMapasRegistro(tiempos=tiempos, coordenadas=coordenadas)
+    return CalculadoraTiempos(gmaps, CacheTiempos(carpeta=tmp_path), CacheCoordenadas(carpeta=tmp_path))
+
+def test_tiempos_agrupa_destinos_en_lotes(tmp_path):
+    destinos = [f"Localidad {i}" for i in range(60)]
+    calculadora = crear_calculadora(tmp_path, tiempos={"Origen": {destino: i for i, destino in enumerate(destinos)}})
+
+    tiempos = calculadora.tiempos("Origen", destinos, "driving", "mañana")
+
+    assert calculadora.gmaps.lotes == [MAX_DESTINOS_POR_PETICION, MAX_DESTINOS_POR_PETICION, 10]
+    assert tiempos == {destino: i for i, destino in enumerate(destinos)}
+
+def test_tiempos_reutiliza_la_cache(tmp_path):
+    destinos = [f"Localidad {i}" for i in range(30)]
+    calculadora = crear_calculadora(tmp_path, tiempos={"Origen": {destino: 10 for destino in destinos[:20]}})
+
+    primera = calculadora.tiempos("Origen", destinos, "transit", "tarde")
+    segunda = calculadora.tiempos("Origen", destinos + destinos, "transit", "tarde")
+
+    #Los destinos sin ruta se guardan como None y tampoco se vuelven a consultar:
+    assert calculadora.gmaps.peticiones == 2
+    assert primera == segunda
+    assert sum(minutos is None for minutos in segunda.values()) == 10
+
+def test_tiempos_cache_por_modo_y_turno(tmp_path):
+    calculadora = crear_calculadora(tmp_path, tiempos={"Origen": {"Destino": 15}})
+
+    calculadora.tiempos("Origen", ["Destino"], "driving", "mañana")
+    calculadora.tiempos("Origen", ["Destino"], "driving", "tarde")
+    calculadora.tiempos("Origen", ["Destino"], "walking", "mañana")
+    calculadora.tiempos("Origen", ["Destino"], "driving", "mañana")
+
+    assert calculadora.gmaps.peticiones == 3
+
+def test_distancias_haversine():
+    distancias = distancias_haversine(MADRID, [MADRID, TOLEDO, BARCELONA])
+
+    assert distancias[0] == pytest.approx(0, abs=1e-9)
+    assert distancias[1] == pytest.approx(67, abs=3)
+    assert distancias[2] == pytest.approx(505, abs=5)
+
+def test_dentro_de_radio_descarta_destinos_lejanos(tmp_path):
+    coordenadas = {"Madrid": MADRID, "Getafe": GETAFE, "Toledo": TOLEDO, "Barcelona": BARCELONA}
+    calculadora = crear_calculadora(tmp_path, coordenadas=coordenadas)
+    #Las coordenadas de los destinos las guarda la ingesta; aquí solo se geocodifica el origen:
+    calculadora.coordenadas.guardar({destino: coordenadas[destino] for destino in ("Getafe", "Toledo", "Barcelona")})
+
+    #En transporte público (40 km/h) se llega como mucho a 40 km en una hora; los destinos sin coordenadas no se descartan:
+    destinos = calculadora.dentro_de_radio("Madrid", ["Getafe", "Toledo", "Barcelona", "Sin coordenadas"], "transit", 60)
+    assert destinos == ["Getafe", "Sin coordenadas"]
+    assert calculadora.gmaps.geocodificaciones == 1
+
+    #En coche (140 km/h) Toledo sí entra en el radio:
+    assert calculadora.dentro_de_radio("Madrid", ["Getafe", "Toledo", "Barcelona"], "driving", 60) == ["Getafe", "Toledo"]
+
+def test_dentro_de_radio_sin_coordenadas_del_origen(tmp_path):
+    calculadora = crear_calculadora(tmp_path, coordenadas={"Barcelona": BARCELONA})
+    calculadora.coordenadas.guardar({"Barcelona": BARCELONA})
+
+    assert calculadora.dentro_de_radio("Desconocido", ["Barcelona"], "transit", 60) == ["Barcelona"]
+
+def test_filtrar_no_consulta_destinos_fuera_de_radio(tmp_path):
+    coordenadas = {"Madrid": MADRID, "Getafe": GETAFE, "Barcelona": BARCELONA}
+    calculadora = crear_calculadora(tmp_path, tiempos={"Madrid": {"Getafe": 35, "Barcelona": 50}}, coordenadas=coordenadas)
+    calculadora.coordenadas.guardar({"Getafe": GETAFE, "Barcelona": BARCELONA})
+
+    assert calculadora.filtrar("Madrid", ["Getafe", "Barcelona"], "transit", "mañana", 60) == ["Getafe"]
+    assert calculadora.gmaps.lotes == [1]
@@ -0,0 +1,92 @@
+#Extracción de las tablas de www.todofp.es.
+#Se utiliza lxml (parser en C) y cada tabla se recorre una única vez acumulando los valores por columnas;
+#el DataFrame se construye una sola vez al final (sin pd.concat fila a fila).
+
+#Se cargan las librerías:
+from lxml import html as lxml_html
+import pandas as pd
+
+TODOFP_URL = 'https://www.todofp.es'
+
+#Columnas del catálogo de grados de las que solo interesa el primer enlace:
+COLUMNAS_PRIMER_ENLACE = ["titulacion", "curriculo-mecd", "curriculo-ccaa", "perfiles-profesionales", "donde-estudiar"]
+
+COLUMNAS_CENTROS = ["provincia", "localidad", "centro", "modalidad"]
+COLUMNAS_CURRICULOS = ["curriculo-ccaa", "ccaa_alt", "links-curriculo-ccaa"]
+
+def url_absoluta(href):
+    if href.startswith('http'):
+        return href
+    return TODOFP_URL + href
+
+def parsear(contenido):
+    return lxml_html.fromstring(contenido)
+
+#Se extrae la tabla del catálogo de grados (una fila por grado y una columna por cabecera de la tabla):
+def extraer_grados(contenido):
+    doc = parsear(contenido)
+    tablas = doc.xpath('//div[@id="contenedor"]//table')
+    columnas = {}
+    no_filas = 0
+    if tablas:
+        for row in tablas[0].iter('tr'):
+            valores = {}
+            for cell in row.iter('td'):
+                links = cell.xpath('.//a')
+                if links:
+                    header = (cell.get("headers") or "").split()[0]
+                    link_array = []
+                    for link in links:
+                        link_url = url_absoluta(link.get('href'))
+                        if header == "real-decreto":
+                            texto = link.text_content()
+                            if texto == "":
+                                link_array.append({"BOE":link_url})
+                            else:
+                                link_array.append({texto:link_url})
+                        link_array.append(link_url)
+                    valores[header] = link_array
+            if valores:
+                for header, valor in valores.items():
+                    columnas.setdefault(header, [None] * no_filas).append(valor)
+                no_filas += 1
+                for columna in columnas.values():
+                    if len(columna) < no_filas:
+                        columna.append(None)
+
+    for columna in COLUMNAS_PRIMER_ENLACE:
+        valores = columnas.get(columna, [None] * no_filas)
+        columnas[columna] = [x[0] if isinstance(x, list) and len(x) > 0 else None for x in valores]
+    return pd.DataFrame(columnas)
+
+#Se extraen todos los centros de una página "donde-estudiar" (sin filtrar), como columnas:
+def extraer_centros(contenido):
+    doc = parsear(contenido)
+    columnas = {columna: [] for columna in COLUMNAS_CENTROS}
+    tablas = doc.xpath('//table')
+    if tablas:
+        for row_table in tablas[0].iter('tr'):
+            cells = row_table.xpath('.//td')
+            if len(cells) > 5:
+                textos = [cell.text_content() for cell in cells[:6]]
+                columnas["provincia"].append(textos[0].strip())
+                columnas["localidad"].append(textos[1])
+                columnas["centro"].append(" ".join(texto for texto in (textos[2], textos[3]) if texto != ""))
+                columnas["modalidad"].append(textos[5].strip())
+    return columnas
+
+#Se extraen, como columnas, los enlaces a los currículos de cada comunidad autónoma de una página "curriculo-ccaa":
+def extraer_curriculos(contenido, curriculum_ccaa):
+    doc = parsear(contenido)
+    columnas = {columna: [] for columna in COLUMNAS_CURRICULOS}
+    for elemento in doc.xpath('//div[contains(concat(" ", normalize-space(@class), " "), " elemento ")]'):
+        titulos = elemento.xpath('.//p[contains(concat(" ", normalize-space(@class), " "), " titulo ")]')
+        if titulos:
+            ccaa = titulos[0].text_content()
+            for bloque in elemento.xpath('.//div[contains(concat(" ", normalize-space(@class), " "), " cte ")]'):
+                links = [{enlace.text_content():url_absoluta(enlace.get('href'))} for enlace in bloque.xpath('.//a')]
+                if links != []:
+                    columnas["curriculo-ccaa"].append(curriculum_ccaa)
+                    columnas["ccaa_alt"].append(ccaa)
+                    columnas["links-curriculo-ccaa"].append(links)
+    return columnas
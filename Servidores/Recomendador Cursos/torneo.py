@@ -0,0 +1,162 @@
+#Torneo de comparaciones por parejas entre los grados mejor puntuados.
+#   - Se comparan todas las parejas (i < j) de los candidatos.
+#   - Cada comparación pide a Gemini varias respuestas en una única llamada (candidate_count), que se cuentan como votos.
+#   - Los votos se agregan con un modelo de Bradley-Terry.
+#   - Tras cada ronda se comprueba si el top-k está estadísticamente resuelto; si no, solo se vuelven a comparar las parejas dudosas de la frontera del top-k.
+
+#Se cargan las librerías:
+import os
+import json
+import random
+import logging
+from itertools import combinations
+
+import numpy as np
+from google.genai import types
+
+from concurrencia import llamar_gemini, mapear_en_paralelo, comprobar_cancelacion
+
+logger = logging.getLogger(__name__)
+
+#Se cargan las variables necesarias (con valores por defecto si no se indican en el .env):
+TORNEO_VOTOS_POR_PAR = int(os.getenv("TORNEO_VOTOS_POR_PAR", "3"))
+TORNEO_Z = float(os.getenv("TORNEO_Z", "1.96"))
+
+#Se pregunta a Gemini cuál de los dos grados es más afín a los intereses del alumno. Devuelve (votos al primero, votos al segundo):
+def comparar_perfiles(client, limitador, almacen, intereses, perfil1, perfil2, votos, semilla):
+
+    model = "gemini-2.5-flash"
+
+    #Se alterna (de forma reproducible) el orden de presentación para compensar el posible sesgo por posición:
+    invertir = random.Random(f"{perfil1}|{perfil2}|{semilla}").random() < 0.5
+    primero, segundo = (perfil2, perfil1) if invertir else (perfil1, perfil2)
+
+    document1 = almacen.parte(primero)
+    document2 = almacen.parte(segundo)
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text="Actúa como un orientador vocacional experto en formación profesional y análisis de perfiles laborales."),
+                types.Part.from_text(text="Mi perfil: Soy un estudiante con los siguientes intereses y habilidades:"),
+                types.Part.from_text(text=intereses),
+                types.Part.from_text(text="Tu tarea:"),
+                types.Part.from_text(text="\t 1. Accede y analiza el contenido del siguiente documento sobre las salidas profesionales de un Grado Formativo:"),
+                document1,
+                types.Part.from_text(text="\t 2. Accede y analiza el contenido del siguiente documento sobre las salidas profesionales de otro Grado Formativo:"),
+                document2,
+                types.Part.from_text(text="\t 3. Indica qué curso tiene un mayor grado de afinidad en relación a mis intereses y lo que ambos grados ofrecen profesionalmente."),
+                types.Part.from_text(text="Para tu análisis, utiliza estos criterios:"),
+                types.Part.from_text(text="\t · Afinidad Directa: ¿Las tareas del trabajo coinciden con lo que me gusta hacer?"),
+                types.Part.from_text(text="\t · Proyección de Futuro: ¿Este perfil profesional me permitirá desarrollar mis intereses a largo plazo?"),
+                types.Part.from_text(text="\t · Puntos de Fricción: Identifica qué partes del perfil profesional podrían NO gustarme según mis intereses."),
+                types.Part.from_text(text="Formato de respuesta: Por favor, y muy importante, dependiendo si el grado de mayor afinidad es el indicado en el punto 1 o en el punto 2, proporciona solo el número del grado que me puede generar un mayor interés."),
+            ]
+        )
+    ]
+
+    generate_content_config = types.GenerateContentConfig(
+        temperature = 0.5,
+        top_p = 0.95,
+        seed = semilla,
+        candidate_count = votos,
+        max_output_tokens = 65535,
+        safety_settings = [
+            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",threshold="OFF")
+        ],
+        #thinking_config=types.ThinkingConfig(thinking_level="HIGH"),
+        response_mime_type = "application/json",
+        response_schema = {"type":"OBJECT","properties":{"grado_de_mayor_interes":{"type":"INTEGER","description":"Un valor entero que admite solo los valores 1 o 2, devolviendo 1 en aquellos casos que el documento citado en el primer punto me pueda resultar más interesante o en caso contrario 2 si el documento en el segundo punto es más interesante en base a mis intereses."}},"required":["grado_de_mayor_interes"]},
+    )
+
+    response = llamar_gemini(
+        client,
+        limitador,
+        model=model,
+        contents=contents,
+        config=generate_content_config
+    )
+
+    votos_primero = votos_segundo = 0
+    for candidate in response.candidates or []:
+        try:
+            grado_de_mayor_interes = str(json.loads(candidate.content.parts[0].text).get("grado_de_mayor_interes"))
+        except (AttributeError, IndexError, TypeError, ValueError):
+            continue
+        if grado_de_mayor_interes == "1":
+            votos_primero += 1
+        elif grado_de_mayor_interes == "2":
+            votos_segundo += 1
+
+    return (votos_segundo, votos_primero) if invertir else (votos_primero, votos_segundo)
+
+#Se ajusta un modelo de Bradley-Terry (algoritmo MM) a partir de la matriz de victorias (victorias[i, j] = votos de i frente a j).
+#Se añade un pequeño número de victorias ficticias en cada sentido para que el modelo esté definido aunque un grado lo gane (o pierda) todo:
+def bradley_terry(victorias, prior=0.5, iteraciones=200, tolerancia=1e-9):
+    n = victorias.shape[0]
+    w = victorias + prior * (1 - np.eye(n))
+    partidas = w + w.T
+    total_victorias = w.sum(axis=1)
+    fuerza = np.ones(n)
+    for _ in range(iteraciones):
+        denominador = (partidas / (fuerza[:, None] + fuerza[None, :])).sum(axis=1)
+        nueva = total_victorias / denominador
+        nueva /= nueva.sum()
+        if np.max(np.abs(nueva - fuerza)) < tolerancia:
+            fuerza = nueva
+            break
+        fuerza = nueva
+    theta = np.log(fuerza)
+
+    #Matriz de covarianzas de theta (inversa generalizada de la información de Fisher):
+    p = fuerza[:, None] / (fuerza[:, None] + fuerza[None, :])
+    informacion = -partidas * p * p.T
+    np.fill_diagonal(informacion, 0)
+    np.fill_diagonal(informacion, -informacion.sum(axis=1))
+    covarianza = np.linalg.pinv(informacion)
+    return theta, covarianza
+
+#Se obtienen las parejas (dentro del top-k, fuera del top-k) cuya diferencia no es todavía estadísticamente significativa:
+def parejas_dudosas(theta, covarianza, k, z=TORNEO_Z):
+    orden = list(np.argsort(-theta, kind="stable"))
+    dentro, fuera = orden[:k], orden[k:]
+    dudosas = []
+    for a in dentro:
+        for b in fuera:
+            varianza = covarianza[a, a] + covarianza[b, b] - 2 * covarianza[a, b]
+            if (theta[a] - theta[b]) / np.sqrt(max(varianza, 1e-12)) < z:
+                dudosas.append((min(a, b), max(a, b)))
+    return dudosas
+
+#Se clasifican los perfiles y se devuelven los k mejores (ordenados), deteniéndose en cuanto el top-k está resuelto o tras max_rondas rondas.
+#Si se activa cancelado (threading.Event), las comparaciones pendientes no llegan a llamar a Gemini:
+def clasificar(client, limitador, almacen, intereses, perfiles, k, max_rondas, max_workers, votos=TORNEO_VOTOS_POR_PAR, cancelado=None):
+    perfiles = list(perfiles)
+    n = len(perfiles)
+    if n <= k:
+        return perfiles
+
+    victorias = np.zeros((n, n))
+    parejas = list(combinations(range(n), 2))
+    for ronda in range(max(max_rondas, 1)):
+        resultados = mapear_en_paralelo(
+            lambda pareja: comprobar_cancelacion(cancelado) or comparar_perfiles(client, limitador, almacen, intereses, perfiles[pareja[0]], perfiles[pareja[1]], votos, ronda),
+            parejas,
+            max_workers,
+        )
+        for (i, j), (votos_i, votos_j) in zip(parejas, resultados):
+            victorias[i, j] += votos_i
+            victorias[j, i] += votos_j
+
+        theta, covarianza = bradley_terry(victorias)
+        parejas = parejas_dudosas(theta, covarianza, k)
+        logger.info("Torneo: ronda %d, %d votos, %d parejas dudosas en la frontera del top-%d", ronda + 1, int(victorias.sum()), len(parejas), k)
+        if not parejas:
+            break
+
+    orden = np.argsort(-theta, kind="stable")
+    return [perfiles[i] for i in orden[:k]]